@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from .db import SQLiteDatabase
+from .llm import LLMProvider
+from .schemas import ChatMessage
+
+_WS = re.compile(r"\s+")
+
+
+def cache_key(
+    model: Optional[str],
+    messages: List[ChatMessage],
+    temperature: float,
+    max_output_tokens: int,
+    extra: Optional[Dict[str, Any]] = None,
+) -> str:
+    payload = {
+        "model": model,
+        "messages": [[m.role, _WS.sub(" ", m.content).strip()] for m in messages],
+        "temperature": round(temperature, 3),
+        "max_output_tokens": max_output_tokens,
+        "extra": extra or {},
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # LRU в памяти процесса; при заданном path ответы дополнительно пишутся
+    # в SQLite, переживают рестарт и видны другим воркерам.
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        created_at REAL NOT NULL,
+        text TEXT NOT NULL,
+        meta TEXT NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at);
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        path: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+        prune_every: int = 256,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.prune_every = prune_every
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._puts = 0
+        self.db = SQLiteDatabase(path) if path else None
+        if self.db is not None:
+            self.db.conn().executescript(self.SCHEMA)
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        now = time.time()
+        entry = self._cached(key, now)
+        if entry is None and self.db is not None:
+            entry = self._load(key, now)
+        return self._result(key, entry)
+
+    async def aget(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        # LRU трогаем на event loop, в поток уходит только чтение из SQLite
+        now = time.time()
+        entry = self._cached(key, now)
+        if entry is None and self.db is not None:
+            entry = await asyncio.to_thread(self._load, key, now)
+        return self._result(key, entry)
+
+    def put(self, key: str, text: str, meta: Dict[str, Any]) -> None:
+        entry = (time.time(), text, dict(meta))
+        self._remember(key, entry)
+        if self.db is not None:
+            self._save(key, entry, self._count_put())
+
+    async def aput(self, key: str, text: str, meta: Dict[str, Any]) -> None:
+        entry = (time.time(), text, dict(meta))
+        self._remember(key, entry)
+        if self.db is not None:
+            await asyncio.to_thread(self._save, key, entry, self._count_put())
+
+    def prune(self) -> None:
+        if self.db is None:
+            return
+        with self.db.write() as conn:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_disk_entries:
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY created_at LIMIT ?)",
+                    (count - self.max_disk_entries,),
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remember(self, key: str, entry: Tuple[float, str, Dict[str, Any]]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _cached(self, key: str, now: float) -> Optional[Tuple[float, str, Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[0] > self.ttl:
+            self._entries.pop(key, None)
+            entry = None
+        return entry
+
+    def _load(self, key: str, now: float) -> Optional[Tuple[float, str, Dict[str, Any]]]:
+        row = self.db.conn().execute(
+            "SELECT created_at, text, meta FROM responses WHERE key = ? AND created_at >= ?",
+            (key, now - self.ttl),
+        ).fetchone()
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def _result(
+        self, key: str, entry: Optional[Tuple[float, str, Dict[str, Any]]]
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        if entry is None:
+            self.misses += 1
+            return None
+        self._remember(key, entry)
+        self.hits += 1
+        return entry[1], dict(entry[2])
+
+    def _count_put(self) -> bool:
+        # -> пора ли чистить диск после этой записи
+        self._puts += 1
+        return self._puts % self.prune_every == 0
+
+    def _save(self, key: str, entry: Tuple[float, str, Dict[str, Any]], prune: bool) -> None:
+        with self.db.write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, created_at, text, meta) VALUES (?, ?, ?, ?)",
+                (key, entry[0], entry[1], json.dumps(entry[2], ensure_ascii=False)),
+            )
+        if prune:
+            self.prune()
+
+
+class CachedProvider(LLMProvider):
+    # accept отсеивает ответы, которые нельзя повторять из кэша (например, битый JSON оценки)
+    def __init__(self, inner: LLMProvider, cache: ResponseCache, accept: Optional[Callable[[str], bool]] = None):
+        self.inner = inner
+        self.cache = cache
+        self.accept = accept
+        self.model = getattr(inner, "model", None)
+        self.json_mode = getattr(inner, "json_mode", None)
+
+    def generate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        key = cache_key(self.model, messages, temperature, max_output_tokens, extra)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit[0], {**hit[1], "cache": "hit"}
+        text, meta = self.inner.generate_text(
+            messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+        )
+        if self._cacheable(text):
+            self.cache.put(key, text, meta)
+        return text, {**meta, "cache": "miss"}
+
+    async def agenerate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        key = cache_key(self.model, messages, temperature, max_output_tokens, extra)
+        hit = await self.cache.aget(key)
+        if hit is not None:
+            return hit[0], {**hit[1], "cache": "hit"}
+        text, meta = await self.inner.agenerate_text(
+            messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+        )
+        if self._cacheable(text):
+            await self.cache.aput(key, text, meta)
+        return text, {**meta, "cache": "miss"}
+
+    async def astream_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        key = cache_key(self.model, messages, temperature, max_output_tokens, extra)
+        hit = await self.cache.aget(key)
+        if hit is not None:
+            yield hit[0], {}
+            yield "", {**hit[1], "cache": "hit"}
+            return
+        parts: List[str] = []
+        meta: Dict[str, Any] = {}
+        async for delta, chunk_meta in self.inner.astream_text(
+            messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+        ):
+            if delta:
+                parts.append(delta)
+                yield delta, {}
+            elif chunk_meta:
+                meta = chunk_meta
+        if self._cacheable("".join(parts)):
+            await self.cache.aput(key, "".join(parts), meta)
+        yield "", {**meta, "cache": "miss"}
+
+    def _cacheable(self, text: str) -> bool:
+        return self.accept is None or self.accept(text)
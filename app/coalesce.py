@@ -0,0 +1,217 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from .cache import cache_key
+from .llm import LLMProvider
+from .schemas import ChatMessage
+
+
+class _Flight:
+    # Один запрос к апстриму и все, кто ждёт его результат. Для стрима чанки
+    # копятся в chunks: поздно подключившийся подписчик сначала получает уже
+    # пришедшие, потом — новые.
+    def __init__(self):
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.chunks: List[Tuple[str, Dict[str, Any]]] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def push(self, chunk: Tuple[str, Dict[str, Any]]) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    # Общий на процесс реестр запросов в полёте; провайдеры создаются на каждый
+    # HTTP-запрос, поэтому реестр живёт отдельно от них.
+    def __init__(self):
+        self.flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def call(
+        self, key: str, fn: Callable[[], Awaitable[Tuple[str, Dict[str, Any]]]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        flight = self.flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = self.flights[key] = _Flight()
+            flight.task = asyncio.ensure_future(fn())
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.leaders += 1
+        else:
+            self.joined += 1
+        flight.subscribers += 1
+        try:
+            text, meta = await asyncio.shield(flight.task)
+        finally:
+            flight.subscribers -= 1
+            # все подписчики ушли — апстрим больше никому не нужен
+            if flight.subscribers == 0 and not flight.task.done():
+                flight.task.cancel()
+        return text, {**meta, "coalesced": shared}
+
+    async def stream(
+        self, key: str, fn: Callable[[], AsyncIterator[Tuple[str, Dict[str, Any]]]]
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        flight = self.flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = self.flights[key] = _Flight()
+            flight.task = asyncio.ensure_future(self._pump(fn, flight))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.leaders += 1
+        else:
+            self.joined += 1
+        flight.subscribers += 1
+        try:
+            i = 0
+            while True:
+                while i < len(flight.chunks):
+                    delta, meta = flight.chunks[i]
+                    i += 1
+                    yield delta, ({**meta, "coalesced": shared} if not delta and meta else meta)
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def _pump(self, fn: Callable[[], AsyncIterator[Tuple[str, Dict[str, Any]]]], flight: _Flight) -> None:
+        try:
+            async for chunk in fn():
+                flight.push(chunk)
+        except asyncio.CancelledError:
+            flight.finish(RuntimeError("upstream stream cancelled"))
+            raise
+        except Exception as e:
+            flight.finish(e)
+            return
+        flight.finish()
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        # новый запрос после завершения идёт в апстрим заново (повторы — забота кэша)
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+
+class CoalescingProvider(LLMProvider):
+    # scope ограничивает склейку: для диалога это session_id, иначе одинаковый
+    # "старт" из разных сессий получил бы один и тот же вопрос.
+    def __init__(self, inner: LLMProvider, flights: SingleFlight, scope: Optional[str] = None):
+        self.inner = inner
+        self.flights = flights
+        self.scope = scope
+        self.model = getattr(inner, "model", None)
+        self.json_mode = getattr(inner, "json_mode", None)
+
+    def for_action(self, action: str) -> LLMProvider:
+        for_action = getattr(self.inner, "for_action", None)
+        return CoalescingProvider(for_action(action), self.flights, self.scope) if for_action is not None else self
+
+    def _key(self, *parts: Any) -> str:
+        return f"{self.scope or ''}:{cache_key(self.model, *parts)}"
+
+    def generate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        # синхронный путь сервером не используется — без склейки
+        return self.inner.generate_text(
+            messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+        )
+
+    async def agenerate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        key = self._key(messages, temperature, max_output_tokens, extra)
+        return await self.flights.call(
+            key,
+            lambda: self.inner.agenerate_text(
+                messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+            ),
+        )
+
+    async def astream_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        # "stream:" — чтобы обычный вызов не подписался на стрим и наоборот
+        key = "stream:" + self._key(messages, temperature, max_output_tokens, extra)
+        async for chunk in self.flights.stream(
+            key,
+            lambda: self.inner.astream_text(
+                messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+            ),
+        ):
+            yield chunk
+
+
+class IdempotencyConflict(ValueError):
+    pass
+
+
+class IdempotencyCache:
+    # Повтор POST с тем же Idempotency-Key получает уже посчитанный ответ, а пока
+    # первый запрос ещё идёт — ждёт его же. Ключ привязан к телу запроса:
+    # тот же ключ с другим телом — ошибка клиента. Только в памяти процесса.
+    def __init__(self, ttl_seconds: float = 600, max_entries: int = 10_000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.replays = 0
+        self._entries: "OrderedDict[str, Tuple[float, str, asyncio.Task]]" = OrderedDict()
+
+    async def run(self, key: str, fingerprint: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[0] > self.ttl:
+            self._entries.pop(key, None)
+            entry = None
+        if entry is not None:
+            if entry[1] != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key was already used with a different request body")
+            self.replays += 1
+            return await asyncio.shield(entry[2]), True
+
+        task = asyncio.ensure_future(fn())
+        self._entries[key] = (now, fingerprint, task)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        # неудачный запрос не запоминаем: клиент должен иметь возможность повторить
+        task.add_done_callback(lambda t: self._drop_failed(key, t))
+        # клиент отвалился — запрос всё равно досчитается, и повтор его получит
+        return await asyncio.shield(task), False
+
+    def _drop_failed(self, key: str, task: asyncio.Task) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is task and (task.cancelled() or task.exception() is not None):
+            del self._entries[key]
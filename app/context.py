@@ -0,0 +1,103 @@
+import re
+from collections import OrderedDict
+from typing import List, Optional
+from .schemas import ChatMessage
+
+# Грубая оценка без токенизатора модели: слово режется на куски по 4 символа,
+# знаки препинания считаются отдельными токенами.
+_PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    def __init__(self, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+
+    def count_text(self, text: str) -> int:
+        n = self._cache.get(text)
+        if n is not None:
+            self._cache.move_to_end(text)
+            return n
+        n = len(_PIECE.findall(text))
+        self._cache[text] = n
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return n
+
+    def count(self, message: ChatMessage) -> int:
+        return self.count_text(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+    def count_all(self, messages: List[ChatMessage]) -> int:
+        return sum(self.count(m) for m in messages)
+
+
+class ContextWindow:
+    # Оставляет системный промпт, последние реплики и текущий вопрос интервьюера;
+    # более старые реплики заменяются короткой заметкой со списком заданных вопросов.
+    def __init__(self, max_tokens: int = 6000, counter: Optional[TokenCounter] = None, summary_tokens: int = 300):
+        self.max_tokens = max_tokens
+        self.counter = counter or TokenCounter()
+        self.summary_tokens = summary_tokens
+
+    def fit(self, system: List[ChatMessage], messages: List[ChatMessage]) -> List[ChatMessage]:
+        budget = self.max_tokens - self.counter.count_all(system)
+        if self.counter.count_all(messages) <= budget:
+            return [*system, *messages]
+
+        budget -= self.summary_tokens
+        pinned = self._current_question(messages)
+        if pinned is not None:
+            budget -= self.counter.count(messages[pinned])
+
+        start = len(messages)
+        while start > 0:
+            if start - 1 == pinned:
+                start -= 1
+                continue
+            cost = self.counter.count(messages[start - 1])
+            # последнюю реплику пользователя оставляем всегда, даже сверх бюджета
+            if cost > budget and start < len(messages):
+                break
+            budget -= cost
+            start -= 1
+
+        if start == 0:
+            return [*system, *messages]
+
+        kept = messages[start:]
+        if pinned is not None and pinned < start:
+            kept = [messages[pinned], *kept]
+        dropped = [m for i, m in enumerate(messages[:start]) if i != pinned]
+        if not dropped:
+            return [*system, *kept]
+        return [*system, self._summary(dropped), *kept]
+
+    def _current_question(self, messages: List[ChatMessage]) -> Optional[int]:
+        for i in range(len(messages) - 1, -1, -1):
+            m = messages[i]
+            if m.role == "assistant" and "?" in m.content:
+                return i
+        return None
+
+    def _summary(self, dropped: List[ChatMessage]) -> ChatMessage:
+        header = f"Ранее в диалоге было ещё {len(dropped)} сообщений, они опущены. Уже заданные вопросы:"
+        lines = [header]
+        used = self.counter.count_text(header)
+        for m in reversed(dropped):
+            if m.role != "assistant" or "?" not in m.content:
+                continue
+            question = _question_line(m.content)
+            cost = self.counter.count_text(question)
+            if used + cost > self.summary_tokens - MESSAGE_OVERHEAD_TOKENS:
+                break
+            lines.insert(1, "- " + question)
+            used += cost
+        return ChatMessage(role="system", content="\n".join(lines))
+
+
+def _question_line(text: str) -> str:
+    for line in text.splitlines():
+        if "?" in line:
+            return line.strip().strip("*").strip()
+    return text.strip()
@@ -0,0 +1,77 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+START = "start"
+HINT = "hint"
+REFERENCE = "reference"
+EVALUATE = "evaluate"
+TRACK = "track"
+CHAT = "chat"
+
+# Команда — короткая реплика; длинное сообщение со словом "пример" скорее ответ кандидата.
+MAX_COMMAND_WORDS = 12
+MAX_TRACK_WORDS = 4
+
+_COMMANDS = (
+    (EVALUATE, re.compile(r"\b(оцени\w*|оценк\w*|evaluate|score)\b", re.I)),
+    (REFERENCE, re.compile(r"\b(эталон\w*|образцов\w* ответ\w*|пример ответа|sample answer|reference)\b", re.I)),
+    (HINT, re.compile(r"\b(подсказ\w*|намекни|hint)\b", re.I)),
+    (START, re.compile(r"(\bстарт\b|\bstart\b|следующий вопрос|ещё вопрос|еще вопрос|задай вопрос|начн[её]м)", re.I)),
+)
+
+# Пока на заданный вопрос нет ответа, реплика — почти всегда ответ кандидата
+# ("Через Docker volumes", "Передача по reference"). Тогда командой считаем
+# только текст кнопки фронтенда или команду целиком, без слов вокруг.
+_EXACT_COMMANDS = (
+    (EVALUATE, re.compile(r"оцени( мой( последний)? ответ.*)?|оценить|оценка|evaluate|score")),
+    (REFERENCE, re.compile(r"(покажи )?эталон(ный ответ)?( к последнему вопросу)?|reference|sample answer")),
+    (HINT, re.compile(r"(дай )?подсказк[аиу]( к последнему вопросу)?|намекни|hint")),
+    (START, re.compile(r"старт|start|следующий вопрос|еще вопрос|задай вопрос")),
+)
+
+# те же направления, что угадывает демо-режим фронтенда (pickTrackFromText)
+_TRACKS = (
+    ("Frontend", re.compile(r"(frontend|фронтенд|react|\bjs\b|javascript|typescript|html|css)", re.I)),
+    ("Python", re.compile(r"(python|питон|django|flask)", re.I)),
+    ("Java", re.compile(r"(\bjava\b|джава|spring)", re.I)),
+    ("DevOps", re.compile(r"(devops|k8s|kubernetes|docker|ci/cd)", re.I)),
+    ("System Design", re.compile(r"(system design|архитектур\w*|масштаб\w*)", re.I)),
+)
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    track: Optional[str] = None
+
+
+def guess_track(text: str) -> Optional[str]:
+    for track, pattern in _TRACKS:
+        if pattern.search(text):
+            return track
+    return None
+
+
+def classify(text: str, awaiting_answer: bool = False) -> Intent:
+    # Регулярки вместо модели: команды приходят с кнопок фронтенда или
+    # набираются парой слов, а ошибка классификации дешёвая — реплика просто
+    # уходит в обычный диалог. awaiting_answer — вопрос задан, ответа ещё нет:
+    # трек тогда не угадываем, а команды узнаём только целиком.
+    words = len(text.split())
+    if words == 0 or words > MAX_COMMAND_WORDS:
+        return Intent(CHAT)
+    if awaiting_answer:
+        phrase = " ".join(text.casefold().replace("ё", "е").strip(" .!?…").split())
+        for name, pattern in _EXACT_COMMANDS:
+            if pattern.fullmatch(phrase):
+                return Intent(name)
+        return Intent(CHAT)
+    for name, pattern in _COMMANDS:
+        if pattern.search(text):
+            return Intent(name, guess_track(text) if name == START else None)
+    if words <= MAX_TRACK_WORDS:
+        track = guess_track(text)
+        if track is not None:
+            return Intent(TRACK, track)
+    return Intent(CHAT)
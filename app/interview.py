@@ -1,35 +1,286 @@
 import json
-from typing import Any, Dict, List
+import logging
+from dataclasses import replace
+from typing import Any, AsyncIterator, Callable, Dict, Generator, List, Tuple
 from .schemas import ChatMessage, EvaluateResponse
+from .cache import CachedProvider, ResponseCache
+from .context import ContextWindow
+from .intents import CHAT, EVALUATE, HINT, REFERENCE, START, TRACK, Intent, classify
 from .llm import LLMProvider
+from .parsing import coerce_score, evaluation_stats, extract_json_object
+from .precompute import PrecomputedAnswers
+from .prescore import Prescore, Prescorer
+from .prompts import SYSTEM_PROMPT, system_prefix
+from .questions import QuestionBank, format_question, record_score
 
-SYSTEM_PROMPT = """Ты — ассистент для подготовки к собеседованиям.
-Цели:
-- снижать тревогу и вести диалог дружелюбно;
-- задавать вопросы от простого к сложному;
-- по запросу давать подсказку / эталонный ответ / оценку.
+logger = logging.getLogger(__name__)
 
-Правила:
-- Если пользователь пишет "старт" — задай 1 вопрос и попроси ответить.
-- Если пользователь просит "подсказку" — дай 3–5 пунктов, не раскрывая весь ответ.
-- Если пользователь просит "эталонный ответ" — дай структурированный полный ответ.
-- Если пользователь просит "оценить" — верни балл 0–10, объясни почему и предложи улучшенную версию.
-"""
+EVALUATION_SCHEMA_HINT = {"score": 0, "feedback": "string", "improved_answer": "string"}
+HINT_TASK = "Дай подсказку к вопросу: 3–5 коротких пунктов, не раскрывая весь ответ."
+REFERENCE_TASK = "Дай эталонный ответ на вопрос: структурированно и полно, с примером."
+FALLBACK_IMPROVED_ANSWER = "Определи суть → шаги/причины → пример → ограничения → итог."
+NO_QUESTION_REPLY = "Сначала нажми «Старт», чтобы я задал вопрос 🙂"
+NO_ANSWER_REPLY = "Мне нужен твой ответ на вопрос. Ответь — потом я оценю."
 
 
 class InterviewCoachService:
-    def __init__(self, llm: LLMProvider):
+    def __init__(
+        self,
+        llm: LLMProvider,
+        context: ContextWindow | None = None,
+        cache: ResponseCache | None = None,
+        precomputed: PrecomputedAnswers | None = None,
+        prescorer: Prescorer | None = None,
+        bank: QuestionBank | None = None,
+    ):
         self.llm = llm
+        self.context = context or ContextWindow()
+        # Диалог не кэшируем: одинаковый "старт" в разных сессиях должен давать разные вопросы.
+        # Кэш — только для детерминированных действий (оценка, подсказка, эталон).
+        self.cache = cache
+        # подсказки и эталоны к вопросам банка, посчитанные заранее (python -m app.precompute)
+        self.precomputed = precomputed
+        self.prescorer = prescorer
+        self.bank = bank
+
+    def _llm(self, action: str) -> LLMProvider:
+        # RoutingProvider выбирает модель под действие, обычный провайдер — одна модель на всё.
+        for_action = getattr(self.llm, "for_action", None)
+        return for_action(action) if for_action is not None else self.llm
+
+    def _cached_llm(self, action: str, accept: Callable[[str], bool] | None = None) -> LLMProvider:
+        llm = self._llm(action)
+        return CachedProvider(llm, self.cache, accept) if self.cache is not None else llm
+
+    def _prompt(self, user_messages: List[ChatMessage], meta: Dict[str, Any] | None = None) -> List[ChatMessage]:
+        system = [ChatMessage(role="system", content=text) for text in system_prefix(meta)]
+        return self.context.fit(system, user_messages)
 
     def chat(self, user_messages: List[ChatMessage], meta: Dict[str, Any] | None = None) -> tuple[str, Dict[str, Any]]:
-        full = [ChatMessage(role="system", content=SYSTEM_PROMPT), *user_messages]
-        text, llm_meta = self.llm.generate_text(full, temperature=0.3, max_output_tokens=900)
+        full = self._prompt(user_messages, meta)
+        text, llm_meta = self._llm("chat").generate_text(full, temperature=0.3, max_output_tokens=900)
+        out_meta = {**(meta or {}), **llm_meta}
+        return text, out_meta
+
+    async def achat(
+        self, user_messages: List[ChatMessage], meta: Dict[str, Any] | None = None
+    ) -> tuple[str, Dict[str, Any]]:
+        full = self._prompt(user_messages, meta)
+        text, llm_meta = await self._llm("chat").agenerate_text(full, temperature=0.3, max_output_tokens=900)
         out_meta = {**(meta or {}), **llm_meta}
         return text, out_meta
 
+    async def astream_chat(
+        self, user_messages: List[ChatMessage], meta: Dict[str, Any] | None = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        full = self._prompt(user_messages, meta)
+        async for delta, llm_meta in self._llm("chat").astream_text(full, temperature=0.3, max_output_tokens=900):
+            if delta:
+                yield delta, {}
+            elif llm_meta:
+                yield "", {**(meta or {}), **llm_meta}
+
+    async def arespond(
+        self, user_messages: List[ChatMessage], state: Dict[str, Any], meta: Dict[str, Any] | None = None
+    ) -> tuple[str, Dict[str, Any]]:
+        # Команды (старт, подсказка, эталон, оценка, выбор трека) идут дешёвыми путями:
+        # банк вопросов, предрасчёт, узкие промпты с маленьким лимитом токенов.
+        # Всё остальное — обычный диалог. state — состояние сессии из стора, меняется на месте.
+        intent = classify(self._last_user_text(user_messages), self._awaiting_answer(state))
+        routed = await self._dispatch(intent, state, meta)
+        if routed is not None:
+            return routed
+        text, out_meta = await self.achat(user_messages, meta)
+        self._after_chat(intent, user_messages, state, text)
+        return text, {**out_meta, "intent": intent.name}
+
+    async def astream_respond(
+        self, user_messages: List[ChatMessage], state: Dict[str, Any], meta: Dict[str, Any] | None = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        intent = classify(self._last_user_text(user_messages), self._awaiting_answer(state))
+        routed = await self._dispatch(intent, state, meta)
+        if routed is not None:
+            yield routed[0], {}
+            yield "", routed[1]
+            return
+        parts: List[str] = []
+        async for delta, chunk_meta in self.astream_chat(user_messages, meta):
+            if delta:
+                parts.append(delta)
+                yield delta, {}
+            elif chunk_meta:
+                yield "", {**chunk_meta, "intent": intent.name}
+        self._after_chat(intent, user_messages, state, "".join(parts))
+
+    def _awaiting_answer(self, state: Dict[str, Any]) -> bool:
+        return self.current_question(state) is not None and not state.get("answer")
+
+    def current_question(self, state: Dict[str, Any]) -> str | None:
+        qid = state.get("question_id")
+        if qid and self.bank is not None and qid in self.bank.by_id:
+            return self.bank.by_id[qid].text
+        return state.get("question_text")
+
+    async def _dispatch(
+        self, intent: Intent, state: Dict[str, Any], meta: Dict[str, Any] | None
+    ) -> tuple[str, Dict[str, Any]] | None:
+        base = {**(meta or {}), "intent": intent.name}
+        if intent.name == TRACK:
+            state["track"] = intent.track
+            return (
+                f"Ок, тренируемся по направлению **{intent.track}**.\nНапиши «старт», и я задам первый вопрос.",
+                {**base, "source": "router"},
+            )
+        if intent.name == START and self.bank is not None:
+            question = self.bank.select(state, track=intent.track)
+            if question is None:
+                return None
+            return format_question(question), {**base, "source": "bank", "question_id": question.id}
+        if intent.name in (HINT, REFERENCE):
+            question = self.current_question(state)
+            if question is None:
+                return NO_QUESTION_REPLY, {**base, "source": "router"}
+            generate = self.ahint if intent.name == HINT else self.areference_answer
+            text, llm_meta = await generate(question)
+            return text, {**base, **llm_meta}
+        if intent.name == EVALUATE:
+            question = self.current_question(state)
+            answer = state.get("answer")
+            if question is None or not answer:
+                return (NO_QUESTION_REPLY if question is None else NO_ANSWER_REPLY), {**base, "source": "router"}
+            result = await self.aevaluate(question, answer)
+            # оценка двигает уровень следующего вопроса из банка; ответ оценён один раз,
+            # повторное «оценить» без нового ответа не должно снова сдвигать уровень
+            record_score(state, result.score)
+            state.pop("answer", None)
+            return format_evaluation(result), {**base, "score": result.score}
+        return None
+
+    def _after_chat(self, intent: Intent, user_messages: List[ChatMessage], state: Dict[str, Any], reply: str) -> None:
+        if intent.name == START:
+            # банка нет — вопрос придумала модель, запоминаем его текст для подсказки и оценки
+            state.pop("question_id", None)
+            state.pop("answer", None)
+            state["question_text"] = reply
+        elif intent.name == CHAT and self.current_question(state) is not None:
+            state["answer"] = self._last_user_text(user_messages)
+
+    def _last_user_text(self, user_messages: List[ChatMessage]) -> str:
+        for m in reversed(user_messages):
+            if m.role == "user":
+                return m.content
+        return ""
+
+    def hint(self, question: str) -> tuple[str, Dict[str, Any]]:
+        ready = self._precomputed("hint", question)
+        if ready is not None:
+            return ready
+        return self._cached_llm("hint").generate_text(
+            self._task_prompt(HINT_TASK, question), temperature=0.2, max_output_tokens=300
+        )
+
+    async def ahint(self, question: str) -> tuple[str, Dict[str, Any]]:
+        ready = self._precomputed("hint", question)
+        if ready is not None:
+            return ready
+        return await self._cached_llm("hint").agenerate_text(
+            self._task_prompt(HINT_TASK, question), temperature=0.2, max_output_tokens=300
+        )
+
+    def reference_answer(self, question: str) -> tuple[str, Dict[str, Any]]:
+        ready = self._precomputed("reference", question)
+        if ready is not None:
+            return ready
+        return self._cached_llm("reference").generate_text(
+            self._task_prompt(REFERENCE_TASK, question), temperature=0.2, max_output_tokens=900
+        )
+
+    async def areference_answer(self, question: str) -> tuple[str, Dict[str, Any]]:
+        ready = self._precomputed("reference", question)
+        if ready is not None:
+            return ready
+        return await self._cached_llm("reference").agenerate_text(
+            self._task_prompt(REFERENCE_TASK, question), temperature=0.2, max_output_tokens=900
+        )
+
+    def _precomputed(self, kind: str, question: str) -> tuple[str, Dict[str, Any]] | None:
+        # свободный вопрос (не из банка) здесь не найдётся и уйдёт в LLM
+        return self.precomputed.get(kind, question) if self.precomputed is not None else None
+
+    def prescore(self, question: str, answer: str) -> Prescore | None:
+        if self.prescorer is None:
+            return None
+        found = self._precomputed("reference", question)
+        reference = found[0] if found else None
+        return replace(self.prescorer.score(question, answer, reference), reference=reference)
+
+    def prescored_result(self, question: str, pre: Prescore) -> EvaluateResponse:
+        # пустой ответ или "не знаю": лучшая улучшенная версия — эталон, если он посчитан
+        improved = pre.reference or FALLBACK_IMPROVED_ANSWER
+        return EvaluateResponse(score=pre.score, feedback=pre.feedback, improved_answer=improved)
+
     def evaluate(self, question: str, answer: str) -> EvaluateResponse:
-        schema_hint = {"score": 0, "feedback": "string", "improved_answer": "string"}
-        prompt = [
+        pre = self.prescore(question, answer)
+        if pre is not None and pre.final:
+            return self.prescored_result(question, pre)
+        llm = self._evaluation_llm()
+        steps = self._evaluation_steps(question, answer)
+        try:
+            prompt, temperature = next(steps)
+            while True:
+                reply = llm.generate_text(
+                    prompt, temperature=temperature, max_output_tokens=600, **self._json_mode(llm)
+                )
+                prompt, temperature = steps.send(reply)
+        except StopIteration as done:
+            return done.value
+
+    async def aevaluate(self, question: str, answer: str) -> EvaluateResponse:
+        pre = self.prescore(question, answer)
+        if pre is not None and pre.final:
+            return self.prescored_result(question, pre)
+        llm = self._evaluation_llm()
+        steps = self._evaluation_steps(question, answer)
+        try:
+            prompt, temperature = next(steps)
+            while True:
+                reply = await llm.agenerate_text(
+                    prompt, temperature=temperature, max_output_tokens=600, **self._json_mode(llm)
+                )
+                prompt, temperature = steps.send(reply)
+        except StopIteration as done:
+            return done.value
+
+    def _evaluation_llm(self) -> LLMProvider:
+        # неразобранный ответ в кэш не кладём: иначе повтор на сутки отдавал бы запасную пятёрку
+        return self._cached_llm("evaluate", accept=lambda text: self._parse_evaluation(text) is not None)
+
+    def _evaluation_steps(
+        self, question: str, answer: str
+    ) -> Generator[Tuple[List[ChatMessage], float], Tuple[str, Dict[str, Any]], EvaluateResponse]:
+        # Общая логика evaluate/aevaluate: отдаёт (промпт, temperature), получает ответ LLM.
+        # Статистика разбора — только по ответам апстрима, повторы из кэша её не трогают.
+        text, meta = yield self._evaluation_prompt(question, answer), 0.2
+        result = self._parse_evaluation(text)
+        if result is not None:
+            if meta.get("cache") != "hit":
+                evaluation_stats.parsed += 1
+            return result
+        repaired, repair_meta = yield self._repair_prompt(text), 0.0
+        return self._after_repair(text, self._parse_evaluation(repaired), repair_meta.get("cache") != "hit")
+
+    def _json_mode(self, llm: LLMProvider) -> Dict[str, Any]:
+        json_mode = getattr(llm, "json_mode", None)
+        return {"extra": json_mode} if json_mode else {}
+
+    def _task_prompt(self, task: str, question: str) -> List[ChatMessage]:
+        return [
+            ChatMessage(role="system", content=SYSTEM_PROMPT),
+            ChatMessage(role="user", content=f"{task}\n\nВопрос:\n{question}"),
+        ]
+
+    def _evaluation_prompt(self, question: str, answer: str) -> List[ChatMessage]:
+        return [
             ChatMessage(role="system", content="Отвечай только валидным JSON без лишнего текста."),
             ChatMessage(
                 role="user",
@@ -38,13 +289,46 @@ class InterviewCoachService:
                     f"Вопрос:\n{question}\n\n"
                     f"Ответ:\n{answer}\n\n"
                     "Формат ответа — JSON:\n"
-                    f"{json.dumps(schema_hint, ensure_ascii=False)}"
+                    f"{json.dumps(EVALUATION_SCHEMA_HINT, ensure_ascii=False)}"
                 ),
             ),
         ]
-        text, _ = self.llm.generate_text(prompt, temperature=0.2, max_output_tokens=600)
+
+    def _repair_prompt(self, broken: str) -> List[ChatMessage]:
+        # Повтор без вопроса и ответа кандидата: только исправить формат уже полученной оценки.
+        return [
+            ChatMessage(role="system", content="Отвечай только валидным JSON без лишнего текста."),
+            ChatMessage(
+                role="user",
+                content=(
+                    "Приведи оценку к JSON ровно такого вида, score — целое от 0 до 10:\n"
+                    f"{json.dumps(EVALUATION_SCHEMA_HINT, ensure_ascii=False)}\n\n"
+                    f"Оценка:\n{broken}"
+                ),
+            ),
+        ]
+
+    def _parse_evaluation(self, text: str) -> EvaluateResponse | None:
+        data = extract_json_object(text)
+        if data is None:
+            return None
         try:
-            data = json.loads(text)
-        except Exception:
-            data = {"score": 5, "feedback": text.strip(), "improved_answer": "Определи суть → шаги/причины → пример → ограничения → итог."}
-        return EvaluateResponse(**data)
+            return EvaluateResponse(**coerce_score(data))
+        except (TypeError, ValueError):
+            return None
+
+    def _after_repair(self, original: str, result: EvaluateResponse | None, upstream: bool) -> EvaluateResponse:
+        if upstream:
+            evaluation_stats.retries += 1
+        if result is not None:
+            if upstream:
+                evaluation_stats.repaired += 1
+            return result
+        if upstream:
+            evaluation_stats.failed += 1
+        logger.warning("evaluation is not valid JSON after repair: %.200s", original)
+        return EvaluateResponse(score=5, feedback=original.strip(), improved_answer=FALLBACK_IMPROVED_ANSWER)
+
+
+def format_evaluation(result: EvaluateResponse) -> str:
+    return f"Оценка: **{result.score}/10**\n\n{result.feedback}\n\n**Как улучшить:**\n{result.improved_answer}"
@@ -1,11 +1,52 @@
+import asyncio
 import os
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Tuple
-from openai import OpenAI
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
 from .schemas import ChatMessage
 
 
+def build_async_http_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "1000")),
+        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "200")),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+    )
+    timeout = httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "120")), connect=10.0)
+    return DefaultAsyncHttpxClient(limits=limits, timeout=timeout)
+
+
+_shared_http_client: Optional[httpx.AsyncClient] = None
+
+
+def shared_async_http_client() -> httpx.AsyncClient:
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        _shared_http_client = build_async_http_client()
+    return _shared_http_client
+
+
+def usage_meta(usage: Any) -> Dict[str, Any]:
+    # chat.completions: prompt_tokens_details.cached_tokens, responses: input_tokens_details.cached_tokens
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None) or getattr(usage, "input_tokens_details", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    return {
+        "prompt_tokens": prompt_tokens if prompt_tokens is not None else getattr(usage, "input_tokens", None),
+        "completion_tokens": (
+            completion_tokens if completion_tokens is not None else getattr(usage, "output_tokens", None)
+        ),
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+    }
+
+
 class LLMProvider(ABC):
+    # extra-параметры, включающие у провайдера ответ строго в JSON (None — не умеет)
+    json_mode: Optional[Dict[str, Any]] = None
+
     @abstractmethod
     def generate_text(
         self,
@@ -17,14 +58,57 @@ class LLMProvider(ABC):
     ) -> Tuple[str, Dict[str, Any]]:
         raise NotImplementedError
 
+    async def agenerate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        return await asyncio.to_thread(
+            self.generate_text,
+            messages,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            extra=extra,
+        )
+
+    async def astream_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        text, meta = await self.agenerate_text(
+            messages,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            extra=extra,
+        )
+        yield text, {}
+        yield "", meta
+
 
 class OpenAIResponsesProvider(LLMProvider):
+    json_mode = {"text": {"format": {"type": "json_object"}}}
+
     def __init__(self, model: str = "Free_GPT_KEY", api_key: Optional[str] = None):
         api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY is not set")
         self.client = OpenAI(api_key=api_key)
         self.model = model
+        self._api_key = api_key
+        self._async_client: Optional[AsyncOpenAI] = None
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self._api_key, http_client=shared_async_http_client())
+        return self._async_client
 
     def generate_text(
         self,
@@ -34,16 +118,160 @@ class OpenAIResponsesProvider(LLMProvider):
         max_output_tokens: int = 800,
         extra: Optional[Dict[str, Any]] = None,
     ) -> Tuple[str, Dict[str, Any]]:
-        input_payload = [{"role": m.role, "content": m.content} for m in messages]
         resp = self.client.responses.create(
-            model=self.model,
-            input=input_payload,
-            temperature=temperature,
-            max_output_tokens=max_output_tokens,
-            **(extra or {}),
+            **self._request(messages, temperature, max_output_tokens, extra),
         )
+        return self._parse(resp)
+
+    async def agenerate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        resp = await self.async_client.responses.create(
+            **self._request(messages, temperature, max_output_tokens, extra),
+        )
+        return self._parse(resp)
+
+    async def astream_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        stream = await self.async_client.responses.create(
+            **self._request(messages, temperature, max_output_tokens, extra),
+            stream=True,
+        )
+        response_id = None
+        usage: Dict[str, Any] = {}
+        async for event in stream:
+            event_type = getattr(event, "type", None)
+            if event_type == "response.output_text.delta":
+                yield event.delta, {}
+            elif event_type == "response.completed":
+                response_id = getattr(event.response, "id", None)
+                usage = usage_meta(getattr(event.response, "usage", None))
+        yield "", {"response_id": response_id, "model": self.model, **usage}
+
+    def _request(
+        self,
+        messages: List[ChatMessage],
+        temperature: float,
+        max_output_tokens: int,
+        extra: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        input_payload = [{"role": m.role, "content": m.content} for m in messages]
+        return {
+            "model": self.model,
+            "input": input_payload,
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            **(extra or {}),
+        }
+
+    def _parse(self, resp: Any) -> Tuple[str, Dict[str, Any]]:
         text = getattr(resp, "output_text", None)
         if not text:
             text = str(resp)
-        meta = {"response_id": getattr(resp, "id", None), "model": self.model}
+        meta = {
+            "response_id": getattr(resp, "id", None),
+            "model": self.model,
+            **usage_meta(getattr(resp, "usage", None)),
+        }
         return text, meta
+
+
+class OpenAIChatProvider(LLMProvider):
+    def __init__(
+        self,
+        async_client: AsyncOpenAI,
+        model: str,
+        client: Optional[OpenAI] = None,
+        json_mode: bool = True,
+    ):
+        self.async_client = async_client
+        self.client = client
+        self.model = model
+        self.json_mode = {"response_format": {"type": "json_object"}} if json_mode else None
+
+    def generate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        if self.client is None:
+            raise RuntimeError("sync OpenAI client is not configured")
+        resp = self.client.chat.completions.create(
+            **self._request(messages, temperature, max_output_tokens, extra),
+        )
+        return self._parse(resp)
+
+    async def agenerate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        resp = await self.async_client.chat.completions.create(
+            **self._request(messages, temperature, max_output_tokens, extra),
+        )
+        return self._parse(resp)
+
+    async def astream_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        stream = await self.async_client.chat.completions.create(
+            **self._request(messages, temperature, max_output_tokens, extra),
+            stream=True,
+            # usage (в том числе cached_tokens) приходит последним чанком без choices
+            stream_options={"include_usage": True},
+        )
+        response_id = None
+        usage: Dict[str, Any] = {}
+        async for chunk in stream:
+            response_id = response_id or getattr(chunk, "id", None)
+            usage = usage_meta(getattr(chunk, "usage", None)) or usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta, {}
+        yield "", {"response_id": response_id, "model": self.model, **usage}
+
+    def _request(
+        self,
+        messages: List[ChatMessage],
+        temperature: float,
+        max_output_tokens: int,
+        extra: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [{"role": m.role, "content": m.content} for m in messages],
+            "temperature": temperature,
+            "max_tokens": max_output_tokens,
+            **(extra or {}),
+        }
+
+    def _parse(self, resp: Any) -> Tuple[str, Dict[str, Any]]:
+        text = resp.choices[0].message.content if resp.choices else None
+        meta = {
+            "response_id": getattr(resp, "id", None),
+            "model": self.model,
+            **usage_meta(getattr(resp, "usage", None)),
+        }
+        return text or "", meta
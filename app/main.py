@@ -1,41 +1,579 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
 import os
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
+from .cache import ResponseCache
+from .coalesce import CoalescingProvider, IdempotencyCache, IdempotencyConflict, SingleFlight
+from .context import ContextWindow
+from .interview import InterviewCoachService
+from .llm import LLMProvider, OpenAIChatProvider, build_async_http_client
+from .metrics import MetricsMiddleware, Registry, mark_handler_start, phase, timing_meta
+from .parsing import evaluation_stats
+from .precompute import open_precomputed_from_env
+from .prescore import Prescorer
+from .prompts import PROMPT_VERSION
+from .questions import Question, build_question_bank_from_env, format_question, record_score
+from .ratelimit import AdmissionController, Limit, Rejected, build_rate_limiter_from_env
+from .resilience import Resilience, ResilientProvider, UpstreamUnavailable
+from .routing import ModelStats, RoutingProvider, parse_routes
+from .schemas import (
+    ChatMessage,
+    ChatRequest,
+    ChatResponse,
+    EvaluateBatchRequest,
+    NextQuestionRequest,
+    QuestionRequest,
+    QuestionResponse,
+    TextResponse,
+)
+from .store import build_store_from_env
+
+import_started = time.perf_counter()
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 openai_api_key = os.getenv("OPENAI_API_KEY")
 openai_model = os.getenv("OPENAI_MODEL")
+openai_base_url = os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Клиент апстрима создаётся при первом обращении, а не на импорте: с preload
+# модуль импортируется в мастере до fork, а пул соединений httpx между
+# процессами делить нельзя. Тесты подменяют client напрямую.
+client: Optional[AsyncOpenAI] = None
+# секунды по фазам старта процесса: import (модуль, банк, прекомпьют) и lifespan
+startup_seconds: Dict[str, float] = {}
+
+
+def get_client() -> AsyncOpenAI:
+    global client
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=openai_api_key,
+            base_url=openai_base_url,
+            default_headers={
+                "HTTP-Referer": "http://localhost:8000",
+                "X-Title": "final_project",
+            },
+            http_client=build_async_http_client(),
+            # повторы делает ResilientProvider, встроенные в клиент отключаем
+            max_retries=0,
+        )
+    return client
+
+
+store = build_store_from_env()
+context_window = ContextWindow(max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "6000")))
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400")),
+    path=os.getenv("RESPONSE_CACHE_PATH") or None,
+)
+
+resilience = Resilience.from_env()
+# Модель под действие: подсказки — дешёвая, эталонные ответы — большая; см. routing.parse_routes
+routes = parse_routes(os.getenv("LLM_ROUTES"), openai_model)
+model_stats = ModelStats()
+
+rate_limiter = build_rate_limiter_from_env()
+ip_limit = Limit.per_minute(
+    float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "120")), float(os.getenv("RATE_LIMIT_IP_BURST", "60"))
+)
+session_limit = Limit.per_minute(
+    float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", "30")), float(os.getenv("RATE_LIMIT_SESSION_BURST", "15"))
+)
+# за reverse proxy адрес клиента берём из X-Forwarded-For
+trust_proxy = os.getenv("TRUST_PROXY", "0") == "1"
+# лимит на процесс: при нескольких воркерах общий потолок = лимит * число воркеров
+admission = AdmissionController(
+    max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "256")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+    shares={"evaluate": float(os.getenv("ADMISSION_EVALUATE_SHARE", "0.5"))},
+)
+
+# вопросы на "старт" берутся из банка без обращения к LLM
+question_bank = build_question_bank_from_env()
+# подсказки и эталоны к вопросам банка, если пайплайн python -m app.precompute уже запускали
+precomputed = open_precomputed_from_env()
+# веса терминов для мгновенной предварительной оценки — по корпусу эталонных ответов
+prescorer = Prescorer.fit(precomputed.texts("reference") if precomputed is not None else ())
+
+# одинаковые запросы в полёте идут в апстрим один раз
+flights = SingleFlight()
+# повтор POST /api/chat с тем же Idempotency-Key отдаёт уже посчитанный ответ
+idempotency = IdempotencyCache(ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600")))
+
+evaluate_concurrency = int(os.getenv("EVALUATE_CONCURRENCY", "4"))
+# не все модели на OpenRouter принимают response_format — можно выключить
+llm_json_mode = os.getenv("LLM_JSON_MODE", "1") != "0"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    t0 = time.perf_counter()
+    get_client()
+    startup_seconds["lifespan"] = time.perf_counter() - t0
+    logger.info(
+        "worker %s ready: import %.0f ms, lifespan %.0f ms",
+        os.getpid(),
+        startup_seconds.get("import", 0.0) * 1000,
+        startup_seconds["lifespan"] * 1000,
+    )
+    yield
+    # graceful shutdown: запросы уже дождались, закрываем соединения этого воркера
+    if isinstance(client, AsyncOpenAI):
+        await client.close()
+    for resource in (store, rate_limiter):
+        close = getattr(resource, "close", None)
+        if close is not None:
+            close()
+
+
+app = FastAPI(lifespan=lifespan)
 
-client = OpenAI(
-    api_key=openai_api_key,
-    base_url="https://openrouter.ai/api/v1",
-    default_headers={
-        "HTTP-Referer": "http://localhost:8000",
-        "X-Title": "final_project",
+metrics = Registry()
+http_requests = metrics.histogram(
+    "coach_http_request_duration_seconds", "HTTP request latency by route and status", ("route", "status")
+)
+request_phases = metrics.histogram(
+    "coach_request_phase_seconds", "Request time split into queue, upstream, store and serialize", ("route", "phase")
+)
+stream_ttft = metrics.histogram("coach_stream_ttft_seconds", "Time to first streamed token").labels()
+metrics.callback(
+    "coach_llm_request_duration_seconds",
+    "Upstream LLM call latency by model",
+    "histogram",
+    lambda: {(m,): h for m, h in model_stats.histograms.items()},
+    ("model",),
+)
+metrics.callback(
+    "coach_llm_errors_total",
+    "Failed upstream LLM calls by model",
+    "counter",
+    lambda: {(m,): h.errors for m, h in model_stats.histograms.items()},
+    ("model",),
+)
+metrics.callback(
+    "coach_llm_tokens_total",
+    "LLM tokens by model and kind (prompt, completion, cached)",
+    "counter",
+    lambda: dict(model_stats.tokens),
+    ("model", "kind"),
+)
+metrics.callback(
+    "coach_circuit_open",
+    "1 if the circuit breaker for the model is not closed",
+    "gauge",
+    lambda: {(m,): int(b.state != "closed") for m, b in resilience.breakers.items()},
+    ("model",),
+)
+metrics.callback("coach_response_cache_hits_total", "Response cache hits", "counter", lambda: response_cache.hits)
+metrics.callback("coach_response_cache_misses_total", "Response cache misses", "counter", lambda: response_cache.misses)
+metrics.callback("coach_response_cache_entries", "Entries in the response cache", "gauge", lambda: len(response_cache))
+metrics.callback("coach_store_sessions", "Live sessions in the conversation store", "gauge", lambda: len(store))
+metrics.callback("coach_store_evictions_total", "Sessions evicted by TTL or size", "counter", lambda: store.evictions)
+metrics.callback("coach_store_bytes", "Estimated memory held by stored conversations", "gauge", lambda: store.nbytes)
+metrics.callback(
+    "coach_store_trimmed_messages_total",
+    "Oldest messages dropped to keep a session under its byte limit",
+    "counter",
+    lambda: store.trimmed,
+)
+metrics.callback(
+    "coach_evaluation_parse_total",
+    "Evaluation replies by parse outcome",
+    "counter",
+    lambda: {
+        ("parsed",): evaluation_stats.parsed,
+        ("repaired",): evaluation_stats.repaired,
+        ("failed",): evaluation_stats.failed,
     },
+    ("outcome",),
+)
+rejections = metrics.counter("coach_rejected_total", "Requests rejected before the upstream call", ("reason",))
+metrics.callback(
+    "coach_admission_in_flight",
+    "Upstream calls in flight by class",
+    "gauge",
+    lambda: {(kind,): n for kind, n in admission.in_flight.items()},
+    ("kind",),
+)
+metrics.callback("coach_admission_queued", "Requests waiting for an upstream slot", "gauge", lambda: admission.queued)
+metrics.callback(
+    "coach_precomputed_hits_total",
+    "Hint and reference lookups in the precomputed store by outcome",
+    "counter",
+    lambda: {("hit",): precomputed.hits, ("miss",): precomputed.misses} if precomputed is not None else {},
+    ("outcome",),
+)
+prescores = metrics.counter(
+    "coach_prescore_total", "Batch answers by pre-scorer outcome (empty, dont_know skip the LLM)", ("reason",)
+)
+intents = metrics.counter("coach_chat_intent_total", "Chat turns by detected intent", ("intent",))
+bank_questions = metrics.counter("coach_bank_questions_total", "Questions served from the bank", ("track",))
+metrics.callback(
+    "coach_llm_coalesced_total",
+    "Async LLM calls by single-flight role (leader went upstream, joined shared its result)",
+    "counter",
+    lambda: {("leader",): flights.leaders, ("joined",): flights.joined},
+    ("role",),
 )
+metrics.callback(
+    "coach_idempotent_replays_total", "Chat requests answered from the idempotency cache", "counter",
+    lambda: idempotency.replays,
+)
+metrics.callback(
+    "coach_startup_seconds",
+    "Worker startup time by phase",
+    "gauge",
+    lambda: {(name,): seconds for name, seconds in startup_seconds.items()},
+    ("phase",),
+)
+app.add_middleware(MetricsMiddleware, requests=http_requests, phases=request_phases)
+
+
+def get_llm(scope: Optional[str] = None) -> LLMProvider:
+    models = {m for route in routes.values() for m in route.models}
+    upstream = get_client()
+    providers = {
+        m: ResilientProvider(OpenAIChatProvider(async_client=upstream, model=m, json_mode=llm_json_mode), resilience)
+        for m in models
+    }
+    return CoalescingProvider(RoutingProvider(providers, routes, model_stats), flights, scope)
+
+
+def get_coach(scope: Optional[str] = None) -> InterviewCoachService:
+    return InterviewCoachService(
+        llm=get_llm(scope),
+        context=context_window,
+        cache=response_cache,
+        precomputed=precomputed,
+        prescorer=prescorer,
+        bank=question_bank,
+    )
+
+
+def client_ip(request: Request) -> str:
+    if trust_proxy:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def off_loop(blocking: bool, fn: Callable[..., T], *args: Any) -> T:
+    # SQLite-бэкенды (общие для воркеров) могут ждать чужую запись до busy_timeout,
+    # их вызовы уводим в пул потоков — соединения там и так свои у каждого потока.
+    # Стор и лимитер в памяти не потокобезопасны и быстрые: остаются на event loop.
+    if blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
 
-app = FastAPI()
 
-class ChatRequest(BaseModel):
-    messages: list[dict]
-    mode: str | None = None
+async def check_rate_limit(request: Request, session_id: Optional[str], cost: float = 1.0) -> None:
+    checks = []
+    if ip_limit is not None:
+        checks.append((f"ip:{client_ip(request)}", ip_limit))
+    if session_limit is not None and session_id:
+        checks.append((f"session:{session_id}", session_limit))
+    if checks:
+        await off_loop(rate_limiter.blocking, rate_limiter.check, checks, cost)
+
+
+def open_turn(req: ChatRequest) -> Tuple[str, List[ChatMessage], List[ChatMessage], Dict[str, Any]]:
+    # Системный промпт задаёт сервер, клиентские system-сообщения не принимаем.
+    new_messages = [m for m in req.messages if m.role != "system"]
+    if not new_messages:
+        raise HTTPException(status_code=422, detail="messages must contain at least one user or assistant message")
+    if req.session_id and not store.has(req.session_id):
+        raise HTTPException(status_code=409, detail="unknown session_id, resend the full transcript without it")
+    session_id = store.get_or_create(req.session_id)
+    history = store.get_messages(session_id) + new_messages
+    return session_id, new_messages, history, store.get_state(session_id)
+
+
+def close_turn(session_id: str, messages: List[ChatMessage], state: Dict[str, Any], before: str) -> None:
+    store.extend(session_id, messages)
+    # состояние пишем, только если роутер его поменял (вопрос, ответ, уровень)
+    if json.dumps(state, sort_keys=True) != before:
+        store.set_state(session_id, state)
+
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable(request: Request, exc: UpstreamUnavailable):
+    headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
+
+@app.exception_handler(Rejected)
+async def rejected(request: Request, exc: Rejected):
+    rejections.labels(type(exc).__name__).inc()
+    return JSONResponse(
+        status_code=429, content={"detail": str(exc)}, headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
 
 @app.get("/")
 def index():
     return FileResponse("web/index.html")
 
-@app.post("/api/chat")
-def chat(req: ChatRequest):
-    response = client.chat.completions.create(
-        model=openai_model,
-        messages=req.messages,
-        temperature=0.7,
+
+@app.get("/chat-view.js")
+def chat_view():
+    return FileResponse("web/chat-view.js", media_type="text/javascript")
+
+
+@app.get("/chat-store.js")
+def chat_store():
+    return FileResponse("web/chat-store.js", media_type="text/javascript")
+
+
+# бенчмарк рендера ленты: открыть в браузере, нажать "Запустить"
+@app.get("/bench.html")
+def render_bench():
+    return FileResponse("web/bench.html")
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # async: колбэки сбора обходят словари, которые меняются на event loop,
+    # в пуле потоков скрейп мог упасть с "dictionary changed size during iteration"
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(
+    req: ChatRequest, request: Request, response: Response, idempotency_key: Optional[str] = Header(None)
+) -> ChatResponse:
+    mark_handler_start(request.state)
+    if not idempotency_key:
+        return await run_chat(req, request)
+    fingerprint = hashlib.sha256(req.model_dump_json().encode()).hexdigest()
+    try:
+        result, replayed = await idempotency.run(idempotency_key, fingerprint, lambda: run_chat(req, request))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+def turn_meta(req: ChatRequest, state: Dict[str, Any]) -> Dict[str, Any]:
+    # Трек и уровень сессии (выбор трека, подстройка по оценкам) — в преамбулу промпта,
+    # клиент их обычно не шлёт; явные значения из req.meta важнее.
+    session = {key: state[key] for key in ("track", "level") if state.get(key) is not None}
+    return {**session, **req.meta, "prompt_version": PROMPT_VERSION}
+
+
+async def run_chat(req: ChatRequest, request: Request) -> ChatResponse:
+    with phase(request.state, "queue"):
+        await check_rate_limit(request, req.session_id)
+    with phase(request.state, "store"):
+        session_id, new_messages, history, state = await off_loop(store.blocking, open_turn, req)
+        before = json.dumps(state, sort_keys=True)
+    with phase(request.state, "queue"):
+        slot = await admission.acquire("chat")
+    try:
+        with phase(request.state, "upstream"):
+            # склейка только внутри сессии: разные сессии с одинаковым "старт" должны получить разные вопросы
+            reply, meta = await get_coach(session_id).arespond(history, state, meta=turn_meta(req, state))
+    finally:
+        slot.release()
+    intents.labels(meta.get("intent", "chat")).inc()
+    with phase(request.state, "store"):
+        messages = [*new_messages, ChatMessage(role="assistant", content=reply)]
+        await off_loop(store.blocking, close_turn, session_id, messages, state, before)
+    if req.meta.get("timing"):
+        # serialize сюда не попадает: он случается уже после формирования ответа
+        meta["timing"] = timing_meta(request.state)
+    return ChatResponse(session_id=session_id, reply=reply, meta=meta)
+
+
+def sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    started = time.perf_counter()
+    mark_handler_start(request.state)
+    with phase(request.state, "queue"):
+        await check_rate_limit(request, req.session_id)
+    with phase(request.state, "store"):
+        session_id, new_messages, history, state = await off_loop(store.blocking, open_turn, req)
+        before = json.dumps(state, sort_keys=True)
+    coach = get_coach(session_id)
+    with phase(request.state, "queue"):
+        slot = await admission.acquire("chat")
+
+    async def events():
+        ttft_ms = None
+        parts: List[str] = []
+        meta: Dict[str, Any] = {}
+        try:
+            with phase(request.state, "upstream"):
+                async for delta, chunk_meta in coach.astream_respond(history, state, meta=turn_meta(req, state)):
+                    if chunk_meta:
+                        meta = chunk_meta
+                    if not delta:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                        stream_ttft.observe(ttft_ms / 1000)
+                    parts.append(delta)
+                    yield sse("delta", {"delta": delta})
+        except Exception as e:
+            logger.exception("chat stream failed")
+            yield sse("error", {"error": str(e)})
+            return
+        finally:
+            slot.release()
+        with phase(request.state, "store"):
+            messages = [*new_messages, ChatMessage(role="assistant", content="".join(parts))]
+            await off_loop(store.blocking, close_turn, session_id, messages, state, before)
+        intents.labels(meta.get("intent", "chat")).inc()
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("chat stream ttft_ms=%s total_ms=%s", ttft_ms, total_ms)
+        yield sse("done", {"session_id": session_id, "meta": {**meta, "ttft_ms": ttft_ms, "total_ms": total_ms}})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # если генератор так и не запустился (клиент ушёл), слот освободит фоновая задача
+        background=BackgroundTask(slot.release),
+    )
+
+
+@app.post("/api/question", response_model=QuestionResponse)
+async def next_question(req: NextQuestionRequest, request: Request) -> QuestionResponse:
+    mark_handler_start(request.state)
+    with phase(request.state, "queue"):
+        await check_rate_limit(request, req.session_id)
+
+    def pick() -> Tuple[str, Question, str, Dict[str, Any]]:
+        if req.session_id and not store.has(req.session_id):
+            raise HTTPException(status_code=409, detail="unknown session_id, start a new session without it")
+        session_id = store.get_or_create(req.session_id)
+        state = store.get_state(session_id)
+        if req.level is not None:
+            state["level"] = req.level
+            state.pop("scores", None)
+        if req.score is not None:
+            record_score(state, req.score)
+        question = question_bank.select(state, track=req.track, tag=req.tag)
+        if question is None:
+            raise HTTPException(status_code=404, detail="no questions for this track")
+        reply = format_question(question)
+        store.set_state(session_id, state)
+        # вопрос попадает в историю, чтобы подсказка и оценка в чате видели, о чём речь
+        store.append(session_id, ChatMessage(role="assistant", content=reply))
+        return session_id, question, reply, state
+
+    with phase(request.state, "store"):
+        session_id, question, reply, state = await off_loop(store.blocking, pick)
+    bank_questions.labels(question.track).inc()
+    return QuestionResponse(
+        session_id=session_id,
+        reply=reply,
+        question=question.to_dict(),
+        meta={"source": "bank", "level": state.get("level", 1)},
     )
 
-    answer = response.choices[0].message.content
-    return {"reply": answer}
\ No newline at end of file
+
+@app.post("/api/hint", response_model=TextResponse)
+async def hint(req: QuestionRequest, request: Request) -> TextResponse:
+    mark_handler_start(request.state)
+    with phase(request.state, "queue"):
+        await check_rate_limit(request, None)
+        slot = await admission.acquire("chat")
+    try:
+        with phase(request.state, "upstream"):
+            text, meta = await get_coach().ahint(req.question)
+    finally:
+        slot.release()
+    return TextResponse(text=text, meta=meta)
+
+
+@app.post("/api/reference", response_model=TextResponse)
+async def reference(req: QuestionRequest, request: Request) -> TextResponse:
+    mark_handler_start(request.state)
+    with phase(request.state, "queue"):
+        await check_rate_limit(request, None)
+        slot = await admission.acquire("chat")
+    try:
+        with phase(request.state, "upstream"):
+            text, meta = await get_coach().areference_answer(req.question)
+    finally:
+        slot.release()
+    return TextResponse(text=text, meta=meta)
+
+
+@app.post("/api/evaluate/batch")
+async def evaluate_batch(req: EvaluateBatchRequest, request: Request):
+    mark_handler_start(request.state)
+    with phase(request.state, "queue"):
+        await check_rate_limit(request, None, cost=len(req.items))
+    coach = get_coach()
+    limit = asyncio.Semaphore(req.concurrency or evaluate_concurrency)
+
+    async def run(index: int, question: str, answer: str) -> Dict[str, Any]:
+        async with limit:
+            try:
+                slot = await admission.acquire("evaluate")
+                try:
+                    result = await coach.aevaluate(question, answer)
+                finally:
+                    slot.release()
+            except Exception as e:
+                logger.warning("evaluation %s failed: %s", index, e)
+                return {"index": index, "error": str(e)}
+        return {"index": index, "result": result.model_dump()}
+
+    async def lines():
+        # Сначала мгновенная эвристика: пустые ответы и "не знаю" закрываются без LLM,
+        # для остальных сразу уходит предварительный балл, а полная оценка приходит следом.
+        pending = []
+        for i, item in enumerate(req.items):
+            pre = coach.prescore(item.question, item.answer)
+            if pre is None:
+                pending.append((i, item))
+                continue
+            prescores.labels(pre.reason).inc()
+            if pre.final:
+                result = coach.prescored_result(item.question, pre).model_dump()
+                yield json.dumps({"index": i, "result": result, "source": "prescore"}, ensure_ascii=False) + "\n"
+            else:
+                pending.append((i, item))
+                yield json.dumps({"index": i, "provisional": pre.to_dict()}) + "\n"
+        tasks = [asyncio.create_task(run(i, item.question, item.answer)) for i, item in pending]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                row = await next_done
+                failed += "error" in row
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+            yield json.dumps({"done": True, "total": len(req.items), "failed": failed}) + "\n"
+        finally:
+            # клиент отключился — не тратим апстрим на оставшиеся оценки
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+startup_seconds["import"] = time.perf_counter() - import_started
@@ -0,0 +1,253 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# Границы бакетов в секундах — как у prometheus-гистограмм.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Верхняя граница бакета, в который попадает q-квантиль; для хвоста за
+        # последним бакетом — среднее, точнее по гистограмме не сказать.
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.buckets[i] if i < len(self.buckets) else max(self.buckets[-1], self.sum / self.count)
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+
+    def collect(self) -> Dict[Labels, Any]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, help, label_names)
+        self._children: Dict[Labels, _Value] = {}
+
+    def labels(self, *values: str) -> _Value:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _Value()
+        return child
+
+    def collect(self) -> Dict[Labels, Any]:
+        return {k: v.value for k, v in self._children.items()}
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, label_names)
+        self.buckets = buckets
+        self._children: Dict[Labels, LatencyHistogram] = {}
+
+    def labels(self, *values: str) -> LatencyHistogram:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = LatencyHistogram(self.buckets)
+        return child
+
+    def collect(self) -> Dict[Labels, Any]:
+        return dict(self._children)
+
+
+class CallbackMetric(Metric):
+    # Значения, которые уже считаются в другом месте (кэш, стор, брейкеры),
+    # снимаются только в момент скрейпа — на горячем пути ничего не добавляется.
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        type: str,
+        fn: Callable[[], Union[float, Dict[Labels, Any]]],
+        label_names: Tuple[str, ...] = (),
+    ):
+        super().__init__(name, help, label_names)
+        self.type = type
+        self.fn = fn
+
+    def collect(self) -> Dict[Labels, Any]:
+        value = self.fn()
+        return value if isinstance(value, dict) else {(): value}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, label_names))
+
+    def histogram(self, name: str, help: str, label_names: Tuple[str, ...] = ()) -> Histogram:
+        return self.register(Histogram(name, help, label_names))
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        type: str,
+        fn: Callable[[], Union[float, Dict[Labels, Any]]],
+        label_names: Tuple[str, ...] = (),
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, type, fn, label_names))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for values, sample in sorted(metric.collect().items()):
+                labels = list(zip(metric.label_names, values))
+                if isinstance(sample, LatencyHistogram):
+                    lines.extend(_histogram_lines(metric.name, labels, sample))
+                else:
+                    lines.append(f"{metric.name}{_labels(labels)} {_number(sample)}")
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name: str, labels: List[Tuple[str, str]], h: LatencyHistogram) -> Iterator[str]:
+    cumulative = 0
+    for bound, n in zip(h.buckets, h.counts):
+        cumulative += n
+        yield f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}"
+    yield f"{name}_bucket{_labels(labels + [('le', '+Inf')])} {h.count}"
+    yield f"{name}_sum{_labels(labels)} {_number(h.sum)}"
+    yield f"{name}_count{_labels(labels)} {h.count}"
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not float(value).is_integer() else str(int(value))
+
+
+class MetricsMiddleware:
+    # Чистый ASGI без BaseHTTPMiddleware: не буферизует стриминговые ответы.
+    # Время до входа в обработчик — queue, upstream/store отмечает сам обработчик
+    # через phase(), всё остальное (валидация ответа, сериализация, отправка) — serialize.
+    def __init__(self, app: Any, requests: Histogram, phases: Histogram):
+        self.app = app
+        self.requests = requests
+        self.phases = phases
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        state = scope.setdefault("state", {})
+        state["started"] = started
+        state["phases"] = {}
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            total = time.perf_counter() - started
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.requests.labels(path, str(status)).observe(total)
+            phases: Dict[str, float] = state["phases"]
+            if phases:
+                phases["serialize"] = max(0.0, total - sum(phases.values()))
+                for name, seconds in phases.items():
+                    self.phases.labels(path, name).observe(seconds)
+
+
+def mark_handler_start(state: Any) -> None:
+    phases = getattr(state, "phases", None)
+    if phases is not None:
+        phases["queue"] = time.perf_counter() - state.started
+
+
+@contextmanager
+def phase(state: Any, name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = getattr(state, "phases", None)
+        if phases is not None:
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def timing_meta(state: Any) -> Dict[str, float]:
+    phases = getattr(state, "phases", None) or {}
+    return {f"{name}_ms": round(seconds * 1000, 2) for name, seconds in phases.items()}
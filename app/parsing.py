@@ -0,0 +1,64 @@
+import json
+import re
+from typing import Any, Dict, Optional
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.S | re.I)
+_NUMBER = re.compile(r"-?\d+(?:[.,]\d+)?")
+_decoder = json.JSONDecoder()
+
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    # Модели часто оборачивают JSON в ```json ... ``` или добавляют текст до/после.
+    candidates = [text.strip(), *(m.strip() for m in _FENCE.findall(text))]
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = _decoder.raw_decode(text, start)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            return data
+        start = text.find("{", start + 1)
+    return None
+
+
+def coerce_score(data: Dict[str, Any]) -> Dict[str, Any]:
+    score = data.get("score")
+    if isinstance(score, str):
+        m = _NUMBER.search(score)
+        score = float(m.group().replace(",", ".")) if m else score
+    if isinstance(score, float):
+        score = int(round(score))
+    return {**data, "score": score}
+
+
+class ParseStats:
+    def __init__(self):
+        self.parsed = 0
+        self.repaired = 0
+        self.failed = 0
+        self.retries = 0
+
+    @property
+    def total(self) -> int:
+        return self.parsed + self.repaired + self.failed
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.total
+        return {
+            "parsed": self.parsed,
+            "repaired": self.repaired,
+            "failed": self.failed,
+            "retries": self.retries,
+            "failure_rate": (self.repaired + self.failed) / total if total else 0.0,
+        }
+
+
+evaluation_stats = ParseStats()
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .db import SQLiteDatabase
+from .prompts import PROMPT_VERSION
+from .questions import DEFAULT_BANK_PATH, Question, load_questions
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("hint", "reference")
+DEFAULT_PRECOMPUTED_PATH = "data/precomputed.db"
+
+Generate = Callable[[str], Awaitable[Tuple[str, Dict[str, Any]]]]
+
+
+def question_key(text: str) -> str:
+    # вопрос из банка и тот же вопрос, пришедший в /api/hint, должны совпасть
+    # с точностью до пробелов и регистра
+    return hashlib.sha256(" ".join(text.split()).casefold().encode("utf-8")).hexdigest()[:32]
+
+
+def task_version(kind: str, task: str, model: Optional[str]) -> str:
+    # меняется вместе с промптом или моделью — такие ответы пересчитываются
+    raw = json.dumps([PROMPT_VERSION, kind, task, model], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class PrecomputedAnswers:
+    # Готовые подсказки и эталонные ответы для вопросов банка: одна строка на
+    # (вопрос, вид), поиск по ключу вопроса — точечный запрос по первичному ключу.
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS answers (
+        key TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        version TEXT NOT NULL,
+        question_id TEXT NOT NULL,
+        model TEXT,
+        created_at REAL NOT NULL,
+        text TEXT NOT NULL,
+        PRIMARY KEY (key, kind)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        self.db = SQLiteDatabase(path)
+        self.db.conn().executescript(self.SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, question: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        row = self.db.conn().execute(
+            "SELECT text, model, question_id FROM answers WHERE key = ? AND kind = ?", (question_key(question), kind)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], {"model": row[1], "question_id": row[2], "source": "precomputed"}
+
+    def versions(self, kind: str) -> Dict[str, str]:
+        rows = self.db.conn().execute("SELECT key, version FROM answers WHERE kind = ?", (kind,)).fetchall()
+        return dict(rows)
+
+    def put(self, kind: str, question: Question, version: str, text: str, model: Optional[str]) -> None:
+        with self.db.write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, kind, version, question_id, model, created_at, text) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (question_key(question.text), kind, version, question.id, model, time.time(), text),
+            )
+
+    def texts(self, kind: str) -> Iterator[str]:
+        for (text,) in self.db.conn().execute("SELECT text FROM answers WHERE kind = ?", (kind,)):
+            yield text
+
+    def prune(self, keep: Iterable[str]) -> int:
+        # удаляет ответы на вопросы, которых больше нет в банке
+        keep = set(keep)
+        stale = [k for (k,) in self.db.conn().execute("SELECT DISTINCT key FROM answers") if k not in keep]
+        with self.db.write() as conn:
+            conn.executemany("DELETE FROM answers WHERE key = ?", [(k,) for k in stale])
+        return len(stale)
+
+    def __len__(self) -> int:
+        (count,) = self.db.conn().execute("SELECT COUNT(*) FROM answers").fetchone()
+        return count
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def open_precomputed_from_env() -> Optional[PrecomputedAnswers]:
+    # файла нет — значит, пайплайн не запускали: всё генерируется вживую
+    path = os.getenv("PRECOMPUTED_PATH", DEFAULT_PRECOMPUTED_PATH)
+    return PrecomputedAnswers(path) if path and os.path.exists(path) else None
+
+
+async def precompute(
+    questions: List[Question],
+    answers: PrecomputedAnswers,
+    generators: Dict[str, Tuple[Generate, str]],
+    full: bool = False,
+    concurrency: int = 4,
+) -> Dict[str, int]:
+    # generators: вид -> (функция генерации, версия задачи). Без full пересчитываются
+    # только новые вопросы, изменённые тексты и ответы устаревшей версии.
+    stats = {"generated": 0, "skipped": 0, "failed": 0}
+    jobs: List[Tuple[str, Question]] = []
+    for kind, (_, version) in generators.items():
+        have = {} if full else answers.versions(kind)
+        for q in questions:
+            if have.get(question_key(q.text)) == version:
+                stats["skipped"] += 1
+            else:
+                jobs.append((kind, q))
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(kind: str, q: Question) -> None:
+        generate, version = generators[kind]
+        async with sem:
+            try:
+                text, meta = await generate(q.text)
+            except Exception:
+                logger.exception("precompute %s failed for %s", kind, q.id)
+                stats["failed"] += 1
+                return
+        # пишем сразу: прерванный прогон при следующем запуске продолжится с места остановки
+        answers.put(kind, q, version, text, meta.get("model"))
+        stats["generated"] += 1
+
+    await asyncio.gather(*(run(kind, q) for kind, q in jobs))
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute hints and reference answers for the question bank")
+    parser.add_argument("--bank", default=os.getenv("QUESTION_BANK_PATH", DEFAULT_BANK_PATH))
+    parser.add_argument("--out", default=os.getenv("PRECOMPUTED_PATH", DEFAULT_PRECOMPUTED_PATH))
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--full", action="store_true", help="regenerate everything, not only new or changed questions")
+    parser.add_argument("--prune", action="store_true", help="drop answers for questions no longer in the bank")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # та же сборка провайдеров, что и у сервера: модели и промпты совпадают
+    from .interview import HINT_TASK, REFERENCE_TASK, InterviewCoachService
+    from .main import context_window, get_llm
+
+    llm = get_llm()
+    coach = InterviewCoachService(llm=llm, context=context_window)
+    available = {
+        "hint": (coach.ahint, HINT_TASK),
+        "reference": (coach.areference_answer, REFERENCE_TASK),
+    }
+    generators = {}
+    for kind in args.kinds.split(","):
+        generate, task = available[kind.strip()]
+        generators[kind.strip()] = (generate, task_version(kind.strip(), task, llm.for_action(kind.strip()).model))
+
+    questions = load_questions(args.bank)
+    answers = PrecomputedAnswers(args.out)
+    started = time.perf_counter()
+    stats = asyncio.run(precompute(questions, answers, generators, full=args.full, concurrency=args.concurrency))
+    if args.prune:
+        stats["pruned"] = answers.prune(question_key(q.text) for q in questions)
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+_WORD = re.compile(r"[\w-]+", re.U)
+_DONT_KNOW = re.compile(r"\b(не\s+знаю|не\s+помню|без\s+понятия|понятия\s+не\s+имею|хз|idk|don'?t\s+know)\b", re.I)
+_EXAMPLE = re.compile(r"(пример|например|потому\s+что|trade-?off|компромисс|\bcase\b)", re.I)
+
+_STOPWORDS = frozenset(
+    """
+    и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от
+    меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж
+    вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без
+    будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один
+    почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после
+    над больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+    иногда лучше чуть том нельзя такой им более всегда конечно всю между это такое также очень
+    the a an and or of to in is are be it this that for on with as by at from not
+    """.split()
+)
+
+# Сколько ключевых терминов эталона проверяем на покрытие.
+KEY_TERMS = 20
+# Короче этого ответ "не знаю" считаем пустым, длиннее — кандидат всё же рассуждает.
+DONT_KNOW_MAX_TERMS = 8
+
+
+def stem(word: str) -> str:
+    # Грубая обрезка окончаний: "потоков", "потоки", "поток" -> "поток".
+    # Для эвристики этого хватает, морфология здесь не нужна.
+    return word[:5] if len(word) > 5 else word
+
+
+def terms(text: str) -> List[str]:
+    return [stem(w) for w in _WORD.findall(text.casefold()) if w not in _STOPWORDS and not w.isdigit()]
+
+
+@dataclass
+class Prescore:
+    score: int
+    # final — оценка окончательная, LLM не нужен; иначе это предварительный балл
+    final: bool
+    reason: str
+    feedback: str = ""
+    coverage: Optional[float] = None
+    # эталон, по которому считали, — для improved_answer без повторного поиска
+    reference: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"score": self.score, "reason": self.reason, "coverage": self.coverage}
+
+
+class Prescorer:
+    # Мгновенная оценка без LLM: пустые ответы и "не знаю" закрываются сразу,
+    # для остальных — предварительный балл по длине и покрытию ключевых
+    # терминов эталона (вес термина — tf-idf по корпусу эталонов).
+    def __init__(self, idf: Optional[Dict[str, float]] = None):
+        self.idf = idf or {}
+        self.default_idf = max(self.idf.values(), default=1.0)
+
+    @classmethod
+    def fit(cls, documents: Iterable[str]) -> "Prescorer":
+        df: Counter = Counter()
+        n = 0
+        for doc in documents:
+            df.update(set(terms(doc)))
+            n += 1
+        return cls({t: math.log((1 + n) / (1 + k)) + 1 for t, k in df.items()})
+
+    def key_terms(self, reference: str) -> List[str]:
+        tf = Counter(terms(reference))
+        ranked = sorted(tf, key=lambda t: (-tf[t] * self.idf.get(t, self.default_idf), t))
+        return ranked[:KEY_TERMS]
+
+    def score(self, question: str, answer: str, reference: Optional[str] = None) -> Prescore:
+        # пустоту решаем по сырому тексту: "42", "Нет", "Да, можно" — ответы,
+        # хотя terms() без цифр и стоп-слов от них ничего не оставляет
+        answer_terms = terms(answer)
+        if not _WORD.search(answer):
+            return Prescore(
+                0,
+                True,
+                "empty",
+                "Ответа нет. Начни с определения и одного примера: даже короткий ответ лучше пустого.",
+            )
+        if _DONT_KNOW.search(answer) and len(answer_terms) <= DONT_KNOW_MAX_TERMS:
+            return Prescore(
+                1,
+                True,
+                "dont_know",
+                "Честное «не знаю» лучше выдумки, но на собеседовании стоит порассуждать вслух: "
+                "что известно о смежных понятиях и как бы ты искал(а) ответ.",
+            )
+
+        # шкала как у scoreAnswer() в демо-режиме, только по числу терминов, а не символов
+        n = len(answer_terms)
+        length_score = 3 if n < 12 else 5 if n < 30 else 7
+        if _EXAMPLE.search(answer):
+            length_score += 1
+        if not reference:
+            return Prescore(min(10, length_score), False, "heuristic")
+
+        key = self.key_terms(reference)
+        question_terms = set(terms(question))
+        # термины из самого вопроса есть почти в любом ответе — покрытия они не показывают
+        key = [t for t in key if t not in question_terms] or key
+        coverage = len(set(key) & set(answer_terms)) / len(key) if key else 0.0
+        score = round(0.4 * length_score + 0.6 * (1 + 9 * coverage))
+        return Prescore(max(0, min(10, score)), False, "coverage", coverage=round(coverage, 2))
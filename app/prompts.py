@@ -0,0 +1,56 @@
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+# Префикс запроса (системный промпт + преамбула трека) должен совпадать побайтно
+# между запросами — тогда провайдер берёт его из prompt cache. Любая правка текста
+# здесь — новая версия: поднимаем PROMPT_VERSION (тест сверяет хэш префикса).
+PROMPT_VERSION = "coach-v1"
+
+SYSTEM_PROMPT = """Ты — ассистент для подготовки к собеседованиям.
+Цели:
+- снижать тревогу и вести диалог дружелюбно;
+- задавать вопросы от простого к сложному;
+- по запросу давать подсказку / эталонный ответ / оценку.
+
+Правила:
+- Если пользователь пишет "старт" — задай 1 вопрос и попроси ответить.
+- Если пользователь просит "подсказку" — дай 3–5 пунктов, не раскрывая весь ответ.
+- Если пользователь просит "эталонный ответ" — дай структурированный полный ответ.
+- Если пользователь просит "оценить" — верни балл 0–10, объясни почему и предложи улучшенную версию.
+"""
+
+MAX_LEVEL = 5
+_MAX_TRACK_LEN = 40
+
+
+def normalize_track(meta: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[int]]:
+    # Трек и уровень приходят от клиента в meta; приводим к каноническому виду,
+    # чтобы "Python ", "python" и "PYTHON" давали один и тот же префикс.
+    meta = meta or {}
+    track = meta.get("track")
+    track = " ".join(str(track).split())[:_MAX_TRACK_LEN].capitalize() if track else None
+    level = meta.get("level")
+    try:
+        level = min(MAX_LEVEL, max(1, int(level))) if level is not None else None
+    except (TypeError, ValueError):
+        level = None
+    return track or None, level
+
+
+@lru_cache(maxsize=256)
+def track_preamble(track: Optional[str], level: Optional[int]) -> Optional[str]:
+    if track is None and level is None:
+        return None
+    lines = []
+    if track is not None:
+        lines.append(f"Направление собеседования: {track}.")
+    if level is not None:
+        lines.append(f"Уровень сложности вопросов: {level} из {MAX_LEVEL}.")
+    return "\n".join(lines)
+
+
+def system_prefix(meta: Optional[Dict[str, Any]] = None) -> Tuple[str, ...]:
+    # Сначала общий для всех SYSTEM_PROMPT, затем преамбула трека отдельным
+    # сообщением: общий кусок кэшируется у провайдера даже между разными треками.
+    preamble = track_preamble(*normalize_track(meta))
+    return (SYSTEM_PROMPT,) if preamble is None else (SYSTEM_PROMPT, preamble)
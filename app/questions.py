@@ -0,0 +1,183 @@
+import hashlib
+import json
+import math
+import os
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .prompts import MAX_LEVEL
+
+DEFAULT_TRACK = "Общее"
+DEFAULT_BANK_PATH = os.path.join(os.path.dirname(__file__), "data", "questions.json")
+# сколько последних оценок смотрим при подстройке уровня
+SCORE_WINDOW = 2
+# сколько выданных вопросов помним, чтобы не повторяться между корзинами тегов
+MAX_SEEN = 1000
+
+
+@dataclass(frozen=True)
+class Question:
+    id: str
+    track: str
+    level: int
+    text: str
+    tags: Tuple[str, ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "track": self.track, "level": self.level, "text": self.text, "tags": list(self.tags)}
+
+
+def track_key(track: str) -> str:
+    return " ".join(str(track).split()).casefold()
+
+
+def parse_question(item: Dict[str, Any]) -> Question:
+    text = str(item["text"]).strip()
+    if not text:
+        raise ValueError("question text must not be empty")
+    track = " ".join(str(item.get("track") or DEFAULT_TRACK).split())
+    level = min(MAX_LEVEL, max(1, int(item.get("level", 1))))
+    # без явного id берём хэш текста: id стабилен между перезагрузками банка
+    qid = str(item.get("id") or hashlib.sha1(f"{track}\n{text}".encode("utf-8")).hexdigest()[:12])
+    tags = tuple(sorted({str(t).strip().casefold() for t in item.get("tags") or () if str(t).strip()}))
+    return Question(id=qid, track=track, level=level, text=text, tags=tags)
+
+
+def load_questions(path: str) -> List[Question]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML is required for YAML question banks: pip install pyyaml")
+            raw = yaml.safe_load(f)
+        else:
+            raw = json.load(f)
+    items = raw.get("questions", []) if isinstance(raw, dict) else raw
+    return [parse_question(item) for item in items or []]
+
+
+def _permute(i: int, n: int, seed: int) -> int:
+    # (a*i + b) mod n при gcd(a, n) = 1 — перестановка индексов: курсор 0..n-1
+    # обходит корзину без повторов, а порядок у каждой сессии свой.
+    a = 1 + seed % n
+    while math.gcd(a, n) != 1:
+        a += 1
+    return (a * i + (seed >> 16)) % n
+
+
+def adapt_level(level: int, scores: List[int]) -> int:
+    recent = scores[-SCORE_WINDOW:]
+    if len(recent) < SCORE_WINDOW:
+        return level
+    avg = sum(recent) / len(recent)
+    if avg >= 8:
+        level += 1
+    elif avg <= 4:
+        level -= 1
+    return min(MAX_LEVEL, max(1, level))
+
+
+def record_score(state: Dict[str, Any], score: int) -> None:
+    scores = state.setdefault("scores", [])
+    scores.append(int(score))
+    level = state.get("level", 1)
+    new_level = adapt_level(level, scores)
+    if new_level != level:
+        # на новом уровне копим оценки заново, иначе одна серия поднимет уровень дважды
+        state["level"] = new_level
+        scores.clear()
+    else:
+        del scores[:-SCORE_WINDOW]
+
+
+class QuestionBank:
+    # Индекс: (трек, уровень, тег) -> корзина вопросов; тег None — все вопросы уровня.
+    # Состояние сессии (уровень, курсоры по корзинам, выданные id) — обычный dict,
+    # его хранит ConversationStore; сам банк неизменяем и общий для всех запросов.
+    def __init__(self, questions: Iterable[Question], seed: int = 0):
+        self.by_id: Dict[str, Question] = {}
+        self.tracks: Dict[str, str] = {}
+        self._levels: Dict[str, List[int]] = {}
+        self._buckets: Dict[Tuple[str, int, Optional[str]], List[Question]] = {}
+        for q in questions:
+            if q.id in self.by_id:
+                raise ValueError(f"duplicate question id: {q.id}")
+            self.by_id[q.id] = q
+            key = track_key(q.track)
+            self.tracks.setdefault(key, q.track)
+            for tag in (None, *q.tags):
+                self._buckets.setdefault((key, q.level, tag), []).append(q)
+        rng = random.Random(seed)
+        for (key, level, _), bucket in self._buckets.items():
+            bucket.sort(key=lambda q: q.id)
+            rng.shuffle(bucket)
+            levels = self._levels.setdefault(key, [])
+            if level not in levels:
+                levels.append(level)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def resolve_track(self, track: Optional[str]) -> Optional[str]:
+        key = track_key(track) if track else None
+        if key in self.tracks:
+            return key
+        default = track_key(DEFAULT_TRACK)
+        return default if default in self.tracks else next(iter(self.tracks), None)
+
+    def select(
+        self, state: Dict[str, Any], track: Optional[str] = None, tag: Optional[str] = None
+    ) -> Optional[Question]:
+        # Меняет state на месте. Сначала текущий уровень, потом ближайшие;
+        # когда трек пройден целиком — начинаем круг заново.
+        key = self.resolve_track(track or state.get("track"))
+        if key is None:
+            return None
+        tag = tag.strip().casefold() if tag else None
+        level = state.get("level", 1)
+        seed = state.setdefault("seed", random.getrandbits(32))
+        cursors: Dict[str, int] = state.setdefault("cursors", {})
+        seen = set(state.get("seen", ()))
+        levels = sorted(self._levels[key], key=lambda lvl: (abs(lvl - level), lvl))
+        for _ in range(2):
+            for lvl in levels:
+                bucket = self._buckets.get((key, lvl, tag))
+                if not bucket:
+                    continue
+                ckey = f"{key}|{lvl}|{tag or ''}"
+                cursor = cursors.get(ckey, 0)
+                while cursor < len(bucket):
+                    q = bucket[_permute(cursor, len(bucket), seed)]
+                    cursor += 1
+                    if q.id not in seen:
+                        cursors[ckey] = cursor
+                        state["track"] = self.tracks[key]
+                        state["question_id"] = q.id
+                        # новый вопрос: прежний ответ кандидата к нему не относится
+                        state.pop("question_text", None)
+                        state.pop("answer", None)
+                        state["seen"] = [*state.get("seen", ())[-(MAX_SEEN - 1):], q.id]
+                        return q
+                cursors[ckey] = cursor
+            prefix = f"{key}|"
+            for ckey in [k for k in cursors if k.startswith(prefix)]:
+                del cursors[ckey]
+            state["seen"] = [qid for qid in state.get("seen", ()) if self._track_of(qid) != key]
+            seen = set(state["seen"])
+        return None
+
+    def _track_of(self, qid: str) -> Optional[str]:
+        q = self.by_id.get(qid)
+        return track_key(q.track) if q is not None else None
+
+
+def format_question(q: Question) -> str:
+    return (
+        f"Вопрос {q.level} уровня ({q.track}):\n\n**{q.text}**\n\n"
+        "Ответь как на собеседовании: коротко, по делу, можно со структурой (пункты)."
+    )
+
+
+def build_question_bank_from_env() -> QuestionBank:
+    return QuestionBank(load_questions(os.getenv("QUESTION_BANK_PATH", DEFAULT_BANK_PATH)))
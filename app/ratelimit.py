@@ -0,0 +1,243 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+from .db import SQLiteDatabase
+
+
+class Rejected(RuntimeError):
+    # Запрос отклонён до обращения к апстриму; отдаётся как 429 с Retry-After.
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(Rejected):
+    pass
+
+
+class Overloaded(Rejected):
+    pass
+
+
+@dataclass(frozen=True)
+class Limit:
+    # rate — токенов в секунду, burst — ёмкость ведра
+    rate: float
+    burst: float
+
+    @classmethod
+    def per_minute(cls, requests: float, burst: float) -> Optional["Limit"]:
+        return cls(requests / 60, burst) if requests > 0 else None
+
+
+def refill(tokens: float, updated_at: float, now: float, limit: Limit) -> float:
+    return min(limit.burst, tokens + max(0.0, now - updated_at) * limit.rate)
+
+
+class RateLimiter(ABC):
+    # как ConversationStore.blocking: acquire ходит в файл, звать не на event loop
+    blocking = False
+
+    @abstractmethod
+    def acquire(self, checks: List[Tuple[str, Limit]], cost: float = 1.0) -> float:
+        # Все ведра списываются атомарно: либо во всех хватает токенов, либо
+        # ни одно не трогаем. Возвращает 0 или сколько секунд подождать.
+        raise NotImplementedError
+
+    def check(self, checks: List[Tuple[str, Limit]], cost: float = 1.0) -> None:
+        wait = self.acquire(checks, cost)
+        if wait > 0:
+            raise RateLimited("rate limit exceeded", retry_after=wait)
+
+
+def _decide(
+    buckets: Dict[str, Tuple[float, float]], checks: List[Tuple[str, Limit]], cost: float, now: float
+) -> Tuple[float, Dict[str, float]]:
+    # Возвращает паузу до успеха и уровни вёдер после списания.
+    # Запрос дороже ёмкости ведра (большой батч) просто выбирает его целиком.
+    levels: Dict[str, float] = {}
+    wait = 0.0
+    for key, limit in checks:
+        tokens, updated_at = buckets.get(key, (limit.burst, now))
+        level = refill(tokens, updated_at, now, limit)
+        need = min(cost, limit.burst)
+        levels[key] = level - need
+        if level < need:
+            wait = max(wait, (need - level) / limit.rate)
+    return wait, levels
+
+
+class InMemoryRateLimiter(RateLimiter):
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, checks: List[Tuple[str, Limit]], cost: float = 1.0) -> float:
+        now = time.monotonic()
+        wait, levels = _decide(self._buckets, checks, cost, now)
+        if wait > 0:
+            return wait
+        for key, level in levels.items():
+            self._buckets[key] = (level, now)
+            self._buckets.move_to_end(key)
+        # самые давно не трогавшиеся ведра уже полные — их можно просто забыть
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0
+
+
+class SQLiteRateLimiter(RateLimiter):
+    # Общие ведра для нескольких воркеров uvicorn на одной машине.
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS buckets_updated_at ON buckets (updated_at);
+    """
+    blocking = True
+
+    def __init__(self, path: str, prune_seconds: float = 3600, prune_every: int = 1000):
+        self.db = SQLiteDatabase(path)
+        self.db.conn().executescript(self.SCHEMA)
+        self.prune_seconds = prune_seconds
+        self.prune_every = prune_every
+        self._calls = 0
+
+    def acquire(self, checks: List[Tuple[str, Limit]], cost: float = 1.0) -> float:
+        # time.time, а не monotonic: часы должны совпадать между процессами
+        now = time.time()
+        keys = [key for key, _ in checks]
+        with self.db.write() as conn:
+            rows = conn.execute(
+                f"SELECT key, tokens, updated_at FROM buckets WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall()
+            wait, levels = _decide({k: (t, u) for k, t, u in rows}, checks, cost, now)
+            if wait > 0:
+                return wait
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                [(key, level, now) for key, level in levels.items()],
+            )
+        self._calls += 1
+        if self._calls % self.prune_every == 0:
+            self.prune()
+        return 0.0
+
+    def prune(self) -> None:
+        with self.db.write() as conn:
+            conn.execute("DELETE FROM buckets WHERE updated_at < ?", (time.time() - self.prune_seconds,))
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class Slot:
+    def __init__(self, controller: "AdmissionController", kind: str):
+        self.controller = controller
+        self.kind = kind
+        self.released = False
+
+    def release(self) -> None:
+        # можно звать несколько раз: стрим освобождает слот и в finally, и фоновой задачей
+        if not self.released:
+            self.released = True
+            self.controller._release(self.kind)
+
+
+class AdmissionController:
+    # Глобальный лимит одновременных запросов к апстриму внутри процесса.
+    # Сверх лимита запросы ждут в ограниченной очереди, при полной очереди сразу 429.
+    # Долгие классы (evaluate) не могут занять больше share слотов, а при
+    # освобождении слота первыми будятся короткие чат-запросы.
+    def __init__(
+        self,
+        max_in_flight: int = 64,
+        max_queue: int = 256,
+        queue_timeout: float = 10.0,
+        shares: Optional[Dict[str, float]] = None,
+        priority: Tuple[str, ...] = ("chat", "evaluate"),
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.shares = shares if shares is not None else {"evaluate": 0.5}
+        self.priority = priority
+        self.in_flight: Dict[str, int] = {kind: 0 for kind in priority}
+        self.rejected = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {kind: deque() for kind in priority}
+
+    @property
+    def total_in_flight(self) -> int:
+        return sum(self.in_flight.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
+
+    def limit(self, kind: str) -> int:
+        share = self.shares.get(kind)
+        return self.max_in_flight if share is None else max(1, int(self.max_in_flight * share))
+
+    def _can_run(self, kind: str) -> bool:
+        return self.total_in_flight < self.max_in_flight and self.in_flight[kind] < self.limit(kind)
+
+    async def acquire(self, kind: str = "chat") -> Slot:
+        if kind not in self.in_flight:
+            raise ValueError(f"unknown admission class: {kind}")
+        if not self._waiters[kind] and self._can_run(kind):
+            self.in_flight[kind] += 1
+            return Slot(self, kind)
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("server is overloaded, try again later", retry_after=1.0)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[kind].append(waiter)
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await waiter
+        except TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # слот выдан в том же тике, когда сработал таймаут: он уже наш
+                return Slot(self, kind)
+            self.rejected += 1
+            raise Overloaded("timed out waiting for a free upstream slot", retry_after=1.0)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # слот уже был выдан, но ждущий отменён — отдаём следующему
+                self._release(kind)
+            raise
+        finally:
+            if waiter in self._waiters[kind]:
+                self._waiters[kind].remove(waiter)
+        return Slot(self, kind)
+
+    def _release(self, kind: str) -> None:
+        self.in_flight[kind] -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        for kind in self.priority:
+            waiters = self._waiters[kind]
+            while waiters and self._can_run(kind):
+                waiter = waiters.popleft()
+                if waiter.done():
+                    continue
+                # слот передаётся ждущему сразу, чтобы его не перехватил новый запрос
+                self.in_flight[kind] += 1
+                waiter.set_result(None)
+
+
+def build_rate_limiter_from_env() -> RateLimiter:
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if backend == "memory":
+        return InMemoryRateLimiter()
+    if backend == "sqlite":
+        return SQLiteRateLimiter(os.getenv("RATE_LIMIT_PATH", "data/ratelimit.db"))
+    raise RuntimeError(f"unknown RATE_LIMIT_BACKEND: {backend}")
@@ -0,0 +1,375 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from .llm import LLMProvider
+from .schemas import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(RuntimeError):
+    # Апстрим не ответил за дедлайн/после всех повторов или выключен брейкером.
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # openai.APIConnectionError / APITimeoutError — без status_code
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError"}
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    # closed -> open после failure_threshold подряд неудач; через reset_seconds
+    # пропускается один пробный запрос (half-open), успех закрывает брейкер.
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self) -> None:
+        # пробный запрос отменён без результата: следующий запрос станет новой пробой
+        self._probing = False
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class Resilience:
+    # Общее на процесс состояние: брейкеры и окна латентности по моделям живут
+    # дольше одного запроса, поэтому хранятся здесь, а не в провайдере.
+    def __init__(
+        self,
+        attempt_timeout: float = 30.0,
+        deadline: float = 60.0,
+        retries: int = 2,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 20,
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, LatencyWindow] = {}
+
+    @classmethod
+    def from_env(cls) -> "Resilience":
+        return cls(
+            attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30")),
+            deadline=float(os.getenv("LLM_DEADLINE", "60")),
+            retries=int(os.getenv("LLM_RETRIES", "2")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "8")),
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+            hedge=os.getenv("LLM_HEDGE", "0") == "1",
+        )
+
+    def breaker(self, model: Optional[str]) -> CircuitBreaker:
+        key = model or ""
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = self.breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+        return breaker
+
+    def latency(self, model: Optional[str]) -> LatencyWindow:
+        key = model or ""
+        window = self.latencies.get(key)
+        if window is None:
+            window = self.latencies[key] = LatencyWindow()
+        return window
+
+    def hedge_delay(self, model: Optional[str]) -> Optional[float]:
+        if not self.hedge:
+            return None
+        window = self.latency(model)
+        if len(window) < self.hedge_min_samples:
+            return None
+        return window.percentile(self.hedge_percentile)
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        # full jitter; Retry-After от апстрима — нижняя граница паузы
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        retry_after = retry_after_seconds(exc)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class ResilientProvider(LLMProvider):
+    def __init__(self, inner: LLMProvider, resilience: Optional[Resilience] = None):
+        self.inner = inner
+        self.resilience = resilience or Resilience()
+        self.model = getattr(inner, "model", None)
+        self.json_mode = getattr(inner, "json_mode", None)
+
+    def generate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        # Синхронный путь: только повторы и брейкер, таймаут задаёт http-клиент.
+        r = self.resilience
+        breaker = self._admit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                text, meta = self.inner.generate_text(
+                    messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+                )
+            except Exception as e:
+                delay = self._on_failure(breaker, e, attempt, started)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            r.latency(self.model).add(time.monotonic() - started)
+            return text, {**meta, "attempts": attempt + 1}
+
+    async def agenerate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        def call() -> Awaitable[Tuple[str, Dict[str, Any]]]:
+            return self.inner.agenerate_text(
+                messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+            )
+
+        breaker = self._admit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_started = time.monotonic()
+            try:
+                async with asyncio.timeout(self._attempt_timeout(started)):
+                    (text, meta), hedged = await self._hedged(call)
+            except Exception as e:
+                delay = self._on_failure(breaker, e, attempt, started)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # CancelledError (ушёл подписчик single-flight, отключился клиент) —
+                # не Exception: без этого проба half-open не освобождается никогда
+                breaker.release()
+                raise
+            breaker.record_success()
+            self.resilience.latency(self.model).add(time.monotonic() - attempt_started)
+            return text, {**meta, "attempts": attempt + 1, "hedged": hedged}
+
+    async def astream_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        # Повторяем только до первого чанка: начатый ответ клиент уже видит.
+        breaker = self._admit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            stream = self.inner.astream_text(
+                messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+            )
+            try:
+                async with asyncio.timeout(self._attempt_timeout(started)):
+                    first = await stream.__anext__()
+            except StopAsyncIteration:
+                breaker.record_success()
+                return
+            except Exception as e:
+                await stream.aclose()
+                delay = self._on_failure(breaker, e, attempt, started)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                await stream.aclose()
+                raise
+            break
+
+        # время до первого чанка в окно латентности не пишем: hedge_delay берёт оттуда
+        # p95 полного ответа, а короткий TTFT стримов занизил бы его
+        try:
+            delta, meta = first
+            yield delta, ({**meta, "attempts": attempt + 1} if not delta and meta else meta)
+            async for delta, meta in stream:
+                yield delta, ({**meta, "attempts": attempt + 1} if not delta and meta else meta)
+        except Exception as e:
+            if is_retryable(e):
+                breaker.record_failure()
+            raise
+        except BaseException:
+            # клиент ушёл посреди стрима
+            breaker.release()
+            raise
+        finally:
+            await stream.aclose()
+        breaker.record_success()
+
+    def _admit(self) -> CircuitBreaker:
+        breaker = self.resilience.breaker(self.model)
+        if not breaker.allow():
+            raise UpstreamUnavailable(f"circuit open for model {self.model}", retry_after=breaker.retry_after())
+        return breaker
+
+    def _attempt_timeout(self, started: float) -> float:
+        remaining = self.resilience.deadline - (time.monotonic() - started)
+        return max(0.0, min(self.resilience.attempt_timeout, remaining))
+
+    def _on_failure(self, breaker: CircuitBreaker, exc: Exception, attempt: int, started: float) -> float:
+        # Возвращает паузу перед следующей попыткой или пробрасывает ошибку.
+        if not is_retryable(exc):
+            breaker.record_success()
+            raise exc
+        breaker.record_failure()
+        r = self.resilience
+        reason = "timeout" if isinstance(exc, asyncio.TimeoutError) else str(exc) or type(exc).__name__
+        if attempt >= r.retries or not breaker.allow():
+            raise UpstreamUnavailable(f"upstream failed after {attempt + 1} attempts: {reason}") from exc
+        delay = r.backoff(attempt, exc)
+        if time.monotonic() - started + delay >= r.deadline:
+            raise UpstreamUnavailable(
+                f"upstream deadline exceeded: {reason}", retry_after=retry_after_seconds(exc)
+            ) from exc
+        logger.warning("upstream attempt %s failed (%s), retrying in %.2fs", attempt + 1, reason, delay)
+        return delay
+
+    async def _hedged(
+        self, call: Callable[[], Awaitable[Tuple[str, Dict[str, Any]]]]
+    ) -> Tuple[Tuple[str, Dict[str, Any]], bool]:
+        # Если первый запрос не уложился в p95 — параллельно шлём второй и берём того,
+        # кто ответит первым; проигравший отменяется.
+        delay = self.resilience.hedge_delay(self.model)
+        if delay is None:
+            return await call(), False
+        tasks = [asyncio.ensure_future(call())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result(), False
+            tasks.append(asyncio.ensure_future(call()))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), True
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from .llm import LLMProvider
+from .metrics import LatencyHistogram
+from .schemas import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("chat", "hint", "reference", "evaluate")
+
+
+class ModelStats:
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.tokens: Dict[Tuple[str, str], int] = {}
+
+    def histogram(self, model: str) -> LatencyHistogram:
+        h = self.histograms.get(model)
+        if h is None:
+            h = self.histograms[model] = LatencyHistogram()
+        return h
+
+    def record_usage(self, model: str, meta: Dict[str, Any]) -> None:
+        for kind in ("prompt", "completion", "cached"):
+            n = meta.get(f"{kind}_tokens")
+            if n:
+                self.tokens[(model, kind)] = self.tokens.get((model, kind), 0) + n
+
+    def p95(self, model: str) -> Optional[float]:
+        h = self.histograms.get(model)
+        return h.quantile(0.95) if h is not None else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {model: h.snapshot() for model, h in self.histograms.items()}
+
+
+@dataclass
+class Route:
+    # models — по возрастанию цены; max_p95_ms — модели, чей наблюдаемый p95 выше,
+    # уходят в конец очереди, пока есть более быстрые кандидаты.
+    models: List[str]
+    max_p95_ms: Optional[float] = None
+
+
+def parse_routes(raw: Optional[str], default_model: str) -> Dict[str, Route]:
+    # LLM_ROUTES='{"hint": ["small", "big"], "reference": {"models": ["big"], "max_p95_ms": 20000}}'
+    routes = {action: Route([default_model]) for action in ACTIONS}
+    if not raw:
+        return routes
+    for action, spec in json.loads(raw).items():
+        if action not in ACTIONS:
+            raise ValueError(f"unknown action in LLM_ROUTES: {action}")
+        if isinstance(spec, list):
+            spec = {"models": spec}
+        if not spec.get("models"):
+            raise ValueError(f"route for {action} has no models")
+        routes[action] = Route(models=list(spec["models"]), max_p95_ms=spec.get("max_p95_ms"))
+    return routes
+
+
+class RoutingProvider(LLMProvider):
+    def __init__(
+        self,
+        providers: Dict[str, LLMProvider],
+        routes: Dict[str, Route],
+        stats: Optional[ModelStats] = None,
+        action: str = "chat",
+    ):
+        self.providers = providers
+        self.routes = routes
+        self.stats = stats or ModelStats()
+        self.action = action
+        route = routes[action]
+        missing = [m for m in route.models if m not in providers]
+        if missing:
+            raise ValueError(f"no provider for models {missing}")
+        # model участвует в ключе кэша: у маршрута он стабильный, реальная модель — в meta
+        self.model = "|".join(route.models)
+        self.json_mode = getattr(providers[route.models[0]], "json_mode", None)
+
+    def for_action(self, action: str) -> "RoutingProvider":
+        return RoutingProvider(self.providers, self.routes, self.stats, action)
+
+    def candidates(self) -> List[str]:
+        route = self.routes[self.action]
+        if route.max_p95_ms is None:
+            return list(route.models)
+        fast: List[str] = []
+        slow: List[str] = []
+        for model in route.models:
+            p95 = self.stats.p95(model)
+            (slow if p95 is not None and p95 * 1000 > route.max_p95_ms else fast).append(model)
+        return fast + slow
+
+    def generate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        errors: List[Exception] = []
+        for model in self.candidates():
+            started = time.perf_counter()
+            try:
+                text, meta = self.providers[model].generate_text(
+                    messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+                )
+            except Exception as e:
+                self._failed(model, e, errors)
+                continue
+            self.stats.histogram(model).observe(time.perf_counter() - started)
+            self.stats.record_usage(model, meta)
+            return text, self._meta(meta, model, errors)
+        raise errors[-1]
+
+    async def agenerate_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        errors: List[Exception] = []
+        for model in self.candidates():
+            started = time.perf_counter()
+            try:
+                text, meta = await self.providers[model].agenerate_text(
+                    messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+                )
+            except Exception as e:
+                self._failed(model, e, errors)
+                continue
+            self.stats.histogram(model).observe(time.perf_counter() - started)
+            self.stats.record_usage(model, meta)
+            return text, self._meta(meta, model, errors)
+        raise errors[-1]
+
+    async def astream_text(
+        self,
+        messages: List[ChatMessage],
+        *,
+        temperature: float = 0.3,
+        max_output_tokens: int = 800,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        # На другую модель переключаемся только до первого чанка.
+        errors: List[Exception] = []
+        for model in self.candidates():
+            started = time.perf_counter()
+            stream = self.providers[model].astream_text(
+                messages, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra
+            )
+            try:
+                delta, meta = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await stream.aclose()
+                self._failed(model, e, errors)
+                continue
+            try:
+                while True:
+                    if not delta and meta:
+                        self.stats.record_usage(model, meta)
+                        meta = self._meta(meta, model, errors)
+                    yield delta, meta
+                    try:
+                        delta, meta = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
+            except Exception:
+                self.stats.histogram(model).errors += 1
+                raise
+            finally:
+                await stream.aclose()
+            self.stats.histogram(model).observe(time.perf_counter() - started)
+            return
+        raise errors[-1]
+
+    def _meta(self, meta: Dict[str, Any], model: str, errors: List[Exception]) -> Dict[str, Any]:
+        return {**meta, "model": meta.get("model", model), "route": self.action, "fallbacks": len(errors)}
+
+    def _failed(self, model: str, exc: Exception, errors: List[Exception]) -> None:
+        # Все модели упали — наружу уходит ошибка последней, остальные только в логе.
+        self.stats.histogram(model).errors += 1
+        errors.append(exc)
+        logger.warning("model %s failed for %s, trying next: %s", model, self.action, exc)
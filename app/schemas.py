@@ -11,7 +11,7 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     session_id: Optional[str] = None
-    mode: str = "interview_coach"
+    mode: Optional[str] = "interview_coach"
     messages: List[ChatMessage] = Field(default_factory=list)
     meta: Dict[str, Any] = Field(default_factory=dict)
 
@@ -22,11 +22,41 @@ class ChatResponse(BaseModel):
     meta: Dict[str, Any] = Field(default_factory=dict)
 
 
+class QuestionRequest(BaseModel):
+    question: str = Field(min_length=1)
+
+
+class NextQuestionRequest(BaseModel):
+    session_id: Optional[str] = None
+    track: Optional[str] = Field(default=None, max_length=40)
+    level: Optional[int] = Field(default=None, ge=1, le=5)
+    tag: Optional[str] = Field(default=None, max_length=40)
+    # оценка ответа на предыдущий вопрос — по ней подстраивается уровень
+    score: Optional[int] = Field(default=None, ge=0, le=10)
+
+
+class QuestionResponse(BaseModel):
+    session_id: str
+    reply: str
+    question: Dict[str, Any]
+    meta: Dict[str, Any] = Field(default_factory=dict)
+
+
+class TextResponse(BaseModel):
+    text: str
+    meta: Dict[str, Any] = Field(default_factory=dict)
+
+
 class EvaluateRequest(BaseModel):
     question: str
     answer: str
 
 
+class EvaluateBatchRequest(BaseModel):
+    items: List[EvaluateRequest] = Field(min_length=1, max_length=50)
+    concurrency: Optional[int] = Field(default=None, ge=1, le=16)
+
+
 class EvaluateResponse(BaseModel):
     score: int = Field(ge=0, le=10)
     feedback: str
@@ -0,0 +1,114 @@
+import argparse
+import logging
+import os
+from typing import Any, Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+APP = "app.main:app"
+# С несколькими воркерами состояние в памяти процесса у каждого своё: сессия,
+# начатая в одном воркере, в другом не найдётся, а лимит частоты умножится на
+# число воркеров. Поэтому по умолчанию всё это переезжает в общие SQLite-файлы
+# (WAL, см. app.db); явно заданные переменные не трогаем.
+SHARED_DEFAULTS = {
+    "STORE_BACKEND": "sqlite",
+    "RATE_LIMIT_BACKEND": "sqlite",
+    "RESPONSE_CACHE_PATH": "data/responses.db",
+}
+PER_PROCESS_BACKENDS = {"STORE_BACKEND": ("memory", "sharded"), "RATE_LIMIT_BACKEND": ("memory",)}
+
+
+def shared_env(env: Mapping[str, str], workers: int) -> Dict[str, str]:
+    # -> переменные, которые надо добавить в окружение воркеров
+    if workers <= 1:
+        return {}
+    for key, local in PER_PROCESS_BACKENDS.items():
+        if env.get(key) in local:
+            logger.warning("%s=%s keeps state per process: %d workers will not share it", key, env[key], workers)
+    # пустой RESPONSE_CACHE_PATH — кэш только в памяти, это тоже явный выбор
+    return {key: value for key, value in SHARED_DEFAULTS.items() if key not in env}
+
+
+def run_uvicorn(args: argparse.Namespace) -> None:
+    # Воркеры uvicorn запускаются через spawn и импортируют приложение каждый сам.
+    # Супервизор перезапускает упавший воркер, по SIGHUP — перезапускает все по очереди.
+    import uvicorn
+
+    if args.preload:
+        logger.warning("preload needs --server gunicorn: uvicorn workers import the app themselves")
+
+    uvicorn.run(
+        APP,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+    )
+
+
+def gunicorn_options(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        # приложение, банк вопросов и прекомпьют грузятся один раз в мастере,
+        # воркеры получают их через fork готовыми (и делят страницы памяти)
+        "preload_app": args.preload is not False,
+        "graceful_timeout": args.graceful_timeout,
+        # плановый перезапуск воркеров, чтобы не копилась фрагментация памяти
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "loglevel": args.log_level,
+    }
+
+
+def run_gunicorn(args: argparse.Namespace) -> None:
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError("gunicorn is required for --server gunicorn: pip install gunicorn")
+
+    class Application(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in gunicorn_options(args).items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Any:
+            from .main import app
+
+            return app
+
+    Application().run()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the interview coach API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default=os.getenv("SERVER", "uvicorn"))
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default={"1": True, "0": False}.get(os.getenv("PRELOAD", "")),
+        help="только gunicorn, там включён по умолчанию",
+    )
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument(
+        "--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", "0")), help="только gunicorn, 0 — без лимита"
+    )
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper())
+    # до импорта приложения: и мастер с preload, и воркеры читают env на импорте
+    os.environ.update(shared_env(os.environ, args.workers))
+    if args.server == "gunicorn":
+        run_gunicorn(args)
+    else:
+        run_uvicorn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,494 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
 import time
 import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+from .db import SQLiteDatabase
 from .schemas import ChatMessage
 
 
-@dataclass
+class StoredMessage:
+    # Сообщение в памяти стора: роль интернирована (одна строка на все сессии),
+    # текст — UTF-8 bytes. Pydantic-модель с __dict__ и __pydantic_fields_set__
+    # собирается только на выдаче из get_messages.
+    __slots__ = ("role", "data")
+
+    def __init__(self, role: str, data: bytes):
+        self.role = role
+        self.data = data
+
+    @classmethod
+    def pack(cls, message: ChatMessage) -> "StoredMessage":
+        return cls(sys.intern(str(message.role)), message.content.encode("utf-8"))
+
+    def unpack(self) -> ChatMessage:
+        return ChatMessage(role=self.role, content=self.data.decode("utf-8"))
+
+    @property
+    def nbytes(self) -> int:
+        return MESSAGE_OVERHEAD_BYTES + len(self.data)
+
+
+# Оценка памяти сверх текста: объект записи, заголовок bytes и слот в списке сессии;
+# для сессии — SessionData, пустой список, id и запись в OrderedDict.
+MESSAGE_OVERHEAD_BYTES = sys.getsizeof(StoredMessage("user", b"")) + sys.getsizeof(b"") + 8
+SESSION_OVERHEAD_BYTES = 512
+
+
+@dataclass(slots=True)
 class SessionData:
     created_at: float = field(default_factory=time.time)
     updated_at: float = field(default_factory=time.time)
-    messages: List[ChatMessage] = field(default_factory=list)
+    messages: List[StoredMessage] = field(default_factory=list)
+    # служебное состояние сессии (банк вопросов и т.п.) в JSON: копия на чтение
+    # и запись бесплатна, а размер виден учёту памяти
+    state: bytes = b""
+    # оценка занимаемой памяти: накладные расходы + сообщения + state
+    nbytes: int = SESSION_OVERHEAD_BYTES
 
 
-class InMemoryConversationStore:
-    def __init__(self, ttl_seconds: int = 21600, max_sessions: int = 5000):
-        self.ttl = ttl_seconds
-        self.max_sessions = max_sessions
-        self._sessions: Dict[str, SessionData] = {}
+class ConversationStore(ABC):
+    # сессий удалено по TTL или лимиту размера — для /metrics
+    evictions = 0
+    # оценка памяти под историю и старых сообщений, отрезанных лимитом сессии;
+    # у бэкендов, которые держат историю не в памяти процесса, — нули
+    nbytes = 0
+    trimmed = 0
+    # методы ходят в файл и могут ждать чужую запись до busy_timeout —
+    # из async-кода их надо звать в пуле потоков, а не на event loop
+    blocking = False
 
     def new_session_id(self) -> str:
         return "sess_" + uuid.uuid4().hex
 
+    @abstractmethod
+    def has(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_or_create(self, session_id: Optional[str]) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_messages(self, session_id: str, messages: List[ChatMessage]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def extend(self, session_id: str, messages: List[ChatMessage]) -> None:
+        raise NotImplementedError
+
+    def append(self, session_id: str, message: ChatMessage) -> None:
+        self.extend(session_id, [message])
+
+    @abstractmethod
+    def get_messages(self, session_id: str) -> List[ChatMessage]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_state(self, session_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def reset(self, session_id: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryConversationStore(ConversationStore):
+    # Сессии лежат в порядке updated_at: запись переносит сессию в конец,
+    # поэтому истёкшие и самые старые всегда в начале и удаляются за O(1).
+    # Память ограничена в байтах: сессия дольше max_session_bytes теряет самые
+    # старые сообщения, стор больше max_bytes вытесняет самые давние сессии.
+    # Без блокировок: рассчитан на один поток (event loop); из пула потоков —
+    # ShardedConversationStore.
+    def __init__(
+        self,
+        ttl_seconds: int = 21600,
+        max_sessions: int = 5000,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_session_bytes: int = 1024 * 1024,
+    ):
+        self.ttl = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_session_bytes = max_session_bytes
+        self.nbytes = 0
+        self._sessions: "OrderedDict[str, SessionData]" = OrderedDict()
+
+    def has(self, session_id: str) -> bool:
+        self._gc()
+        return session_id in self._sessions
+
     def get_or_create(self, session_id: Optional[str]) -> str:
         self._gc()
         if session_id and session_id in self._sessions:
             return session_id
-        sid = self.new_session_id()
-        self._sessions[sid] = SessionData()
-        return sid
+        return self._create(self.new_session_id())
 
     def set_messages(self, session_id: str, messages: List[ChatMessage]) -> None:
         self._gc()
-        self._sessions[session_id] = self._sessions.get(session_id, SessionData())
-        self._sessions[session_id].messages = messages
-        self._sessions[session_id].updated_at = time.time()
+        s = self._touch(session_id)
+        self._resize(s, -sum(m.nbytes for m in s.messages))
+        s.messages = []
+        self._add(s, messages)
 
-    def append(self, session_id: str, message: ChatMessage) -> None:
+    def extend(self, session_id: str, messages: List[ChatMessage]) -> None:
         self._gc()
-        self._sessions[session_id] = self._sessions.get(session_id, SessionData())
-        self._sessions[session_id].messages.append(message)
-        self._sessions[session_id].updated_at = time.time()
+        self._add(self._touch(session_id), messages)
+
+    def append(self, session_id: str, message: ChatMessage) -> None:
+        self.extend(session_id, [message])
 
     def get_messages(self, session_id: str) -> List[ChatMessage]:
         self._gc()
         s = self._sessions.get(session_id)
-        return list(s.messages) if s else []
+        return [m.unpack() for m in s.messages] if s else []
+
+    def get_state(self, session_id: str) -> Dict[str, Any]:
+        self._gc()
+        s = self._sessions.get(session_id)
+        return json.loads(s.state) if s and s.state else {}
+
+    def set_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        self._gc()
+        s = self._touch(session_id)
+        data = json.dumps(state, ensure_ascii=False).encode("utf-8")
+        self._resize(s, len(data) - len(s.state))
+        s.state = data
+        self._evict_over_budget()
 
     def reset(self, session_id: str) -> None:
-        self._sessions.pop(session_id, None)
+        s = self._sessions.pop(session_id, None)
+        if s is not None:
+            self.nbytes -= s.nbytes
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _create(self, session_id: str) -> str:
+        now = time.time()
+        self._sessions[session_id] = SessionData(created_at=now, updated_at=now)
+        self.nbytes += SESSION_OVERHEAD_BYTES
+        return session_id
+
+    def _touch(self, session_id: str) -> SessionData:
+        now = time.time()
+        s = self._sessions.get(session_id)
+        if s is None:
+            s = self._sessions[session_id] = SessionData(created_at=now)
+            self.nbytes += s.nbytes
+        else:
+            self._sessions.move_to_end(session_id)
+        s.updated_at = now
+        return s
+
+    def _resize(self, s: SessionData, delta: int) -> None:
+        s.nbytes += delta
+        self.nbytes += delta
+
+    def _add(self, s: SessionData, messages: List[ChatMessage]) -> None:
+        packed = [StoredMessage.pack(m) for m in messages]
+        s.messages.extend(packed)
+        self._resize(s, sum(m.nbytes for m in packed))
+        if s.nbytes > self.max_session_bytes:
+            # отрезаем самые старые сообщения одним срезом, последний ход оставляем всегда
+            drop, freed = 0, 0
+            while drop < len(s.messages) - 2 and s.nbytes - freed > self.max_session_bytes:
+                freed += s.messages[drop].nbytes
+                drop += 1
+            del s.messages[:drop]
+            self._resize(s, -freed)
+            self.trimmed += drop
+        self._evict_over_budget()
+
+    def _evict_over_budget(self) -> None:
+        # только что записанная сессия — последняя в очереди, её не трогаем
+        while self.nbytes > self.max_bytes and len(self._sessions) > 1:
+            self._evict()
+
+    def _evict(self) -> None:
+        _, s = self._sessions.popitem(last=False)
+        self.nbytes -= s.nbytes
+        self.evictions += 1
 
     def _gc(self) -> None:
         now = time.time()
-        dead = [sid for sid, s in self._sessions.items() if (now - s.updated_at) > self.ttl]
-        for sid in dead:
-            self._sessions.pop(sid, None)
-        if len(self._sessions) > self.max_sessions:
-            items: List[Tuple[str, SessionData]] = sorted(self._sessions.items(), key=lambda kv: kv[1].updated_at)
-            for sid, _ in items[: len(self._sessions) - self.max_sessions]:
-                self._sessions.pop(sid, None)
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if (now - oldest.updated_at) <= self.ttl:
+                break
+            self._evict()
+        while len(self._sessions) > self.max_sessions:
+            self._evict()
+
+
+class ShardedConversationStore(ConversationStore):
+    # Сессии разложены по независимым InMemoryConversationStore по хэшу session_id,
+    # у каждого шарда свой lock и своя очередь вытеснения: ходы в разных сессиях
+    # из разных потоков не ждут друг друга. Лимит max_sessions делится между
+    # шардами поровну, так что LRU-вытеснение — в пределах шарда. Так же
+    # делится бюджет памяти max_bytes; лимит одной сессии у всех шардов общий.
+    def __init__(
+        self,
+        ttl_seconds: int = 21600,
+        max_sessions: int = 5000,
+        shards: int = 16,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_session_bytes: int = 1024 * 1024,
+    ):
+        per_shard = max(1, -(-max_sessions // shards))
+        self._shards = [
+            InMemoryConversationStore(ttl_seconds, per_shard, max_bytes // shards, max_session_bytes)
+            for _ in range(shards)
+        ]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    @property
+    def evictions(self) -> int:
+        return sum(shard.evictions for shard in self._shards)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(shard.nbytes for shard in self._shards)
+
+    @property
+    def trimmed(self) -> int:
+        return sum(shard.trimmed for shard in self._shards)
+
+    def _shard(self, session_id: str) -> Tuple[InMemoryConversationStore, threading.Lock]:
+        # hash() строки стабилен в пределах процесса, а стор в памяти дальше процесса не живёт
+        i = hash(session_id) % len(self._shards)
+        return self._shards[i], self._locks[i]
+
+    def has(self, session_id: str) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            return shard.has(session_id)
+
+    def get_or_create(self, session_id: Optional[str]) -> str:
+        if session_id:
+            shard, lock = self._shard(session_id)
+            with lock:
+                if shard.has(session_id):
+                    return session_id
+        # шард новой сессии определяется её id, поэтому id генерируем здесь, а не в шарде
+        sid = self.new_session_id()
+        shard, lock = self._shard(sid)
+        with lock:
+            shard._create(sid)
+            # уборка после вставки: шард не превышает свою долю лимита даже на одну сессию
+            shard._gc()
+            return sid
+
+    def set_messages(self, session_id: str, messages: List[ChatMessage]) -> None:
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard.set_messages(session_id, messages)
+
+    def extend(self, session_id: str, messages: List[ChatMessage]) -> None:
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard.extend(session_id, messages)
+
+    def append(self, session_id: str, message: ChatMessage) -> None:
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard.append(session_id, message)
+
+    def get_messages(self, session_id: str) -> List[ChatMessage]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            return shard.get_messages(session_id)
+
+    def get_state(self, session_id: str) -> Dict[str, Any]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            return shard.get_state(session_id)
+
+    def set_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard.set_state(session_id, state)
+
+    def reset(self, session_id: str) -> None:
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard.reset(session_id)
+
+    def __len__(self) -> int:
+        total = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                total += len(shard)
+        return total
+
+
+class SQLiteConversationStore(ConversationStore):
+    # Сообщения кластеризованы по (session_id, seq), истёкшие сессии не видны
+    # сразу, а физически удаляются периодической уборкой.
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+    CREATE TABLE IF NOT EXISTS messages (
+        session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (session_id, seq)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS session_state (
+        session_id TEXT PRIMARY KEY REFERENCES sessions (id) ON DELETE CASCADE,
+        data TEXT NOT NULL
+    ) WITHOUT ROWID;
+    """
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: int = 21600,
+        max_sessions: int = 5000,
+        gc_interval_seconds: float = 60.0,
+        busy_timeout_ms: int = 5000,
+    ):
+        self.path = path
+        self.ttl = ttl_seconds
+        self.max_sessions = max_sessions
+        self.gc_interval = gc_interval_seconds
+        self.db = SQLiteDatabase(path, busy_timeout_ms=busy_timeout_ms)
+        self._last_gc = 0.0
+        self.db.conn().executescript(self.SCHEMA)
+
+    def has(self, session_id: str) -> bool:
+        row = self.db.conn().execute(
+            "SELECT 1 FROM sessions WHERE id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl),
+        ).fetchone()
+        return row is not None
+
+    def get_or_create(self, session_id: Optional[str]) -> str:
+        self._maybe_gc()
+        if session_id and self.has(session_id):
+            return session_id
+        sid = self.new_session_id()
+        now = time.time()
+        with self.db.write() as conn:
+            conn.execute("INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?)", (sid, now, now))
+        return sid
+
+    def set_messages(self, session_id: str, messages: List[ChatMessage]) -> None:
+        self._maybe_gc()
+        with self.db.write() as conn:
+            self._touch(conn, session_id)
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._insert(conn, session_id, 0, messages)
+
+    def extend(self, session_id: str, messages: List[ChatMessage]) -> None:
+        self._maybe_gc()
+        with self.db.write() as conn:
+            self._touch(conn, session_id)
+            (last,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            self._insert(conn, session_id, last + 1, messages)
+
+    def get_messages(self, session_id: str) -> List[ChatMessage]:
+        if not self.has(session_id):
+            return []
+        rows = self.db.conn().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [ChatMessage(role=role, content=content) for role, content in rows]
+
+    def get_state(self, session_id: str) -> Dict[str, Any]:
+        if not self.has(session_id):
+            return {}
+        row = self.db.conn().execute("SELECT data FROM session_state WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def set_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        self._maybe_gc()
+        with self.db.write() as conn:
+            self._touch(conn, session_id)
+            conn.execute(
+                "INSERT OR REPLACE INTO session_state (session_id, data) VALUES (?, ?)",
+                (session_id, json.dumps(state, ensure_ascii=False)),
+            )
+
+    def reset(self, session_id: str) -> None:
+        with self.db.write() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        (count,) = self.db.conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (time.time() - self.ttl,)
+        ).fetchone()
+        return count
+
+    def gc(self) -> None:
+        now = time.time()
+        self._last_gc = now
+        with self.db.write() as conn:
+            removed = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,)).rowcount
+            (count,) = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            if count > self.max_sessions:
+                removed += conn.execute(
+                    "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated_at LIMIT ?)",
+                    (count - self.max_sessions,),
+                ).rowcount
+        self.evictions += removed
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _maybe_gc(self) -> None:
+        if time.time() - self._last_gc >= self.gc_interval:
+            self.gc()
+
+    def _touch(self, conn: sqlite3.Connection, session_id: str) -> None:
+        now = time.time()
+        conn.execute(
+            "INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at",
+            (session_id, now, now),
+        )
+
+    def _insert(self, conn: sqlite3.Connection, session_id: str, start: int, messages: List[ChatMessage]) -> None:
+        conn.executemany(
+            "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [(session_id, start + i, m.role, m.content) for i, m in enumerate(messages)],
+        )
+
+
+def build_store_from_env() -> ConversationStore:
+    ttl = int(os.getenv("SESSION_TTL_SECONDS", "21600"))
+    max_sessions = int(os.getenv("SESSION_MAX", "5000"))
+    backend = os.getenv("STORE_BACKEND", "memory")
+    budget = {
+        "max_bytes": int(os.getenv("STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+        "max_session_bytes": int(os.getenv("SESSION_MAX_BYTES", str(1024 * 1024))),
+    }
+    if backend == "memory":
+        return InMemoryConversationStore(ttl_seconds=ttl, max_sessions=max_sessions, **budget)
+    if backend == "sharded":
+        return ShardedConversationStore(
+            ttl_seconds=ttl, max_sessions=max_sessions, shards=int(os.getenv("STORE_SHARDS", "16")), **budget
+        )
+    if backend == "sqlite":
+        return SQLiteConversationStore(
+            os.getenv("STORE_PATH", "data/sessions.db"), ttl_seconds=ttl, max_sessions=max_sessions
+        )
+    raise RuntimeError(f"unknown STORE_BACKEND: {backend}")
@@ -0,0 +1,149 @@
+"""Нагрузочный бенчмарк /api/chat против локального фейкового апстрима.
+
+    python -m bench.chat_load --target both --levels 10,50,100,200,400
+
+Поднимает bench.fake_upstream (фиксированная задержка ответа) и тестируемое
+приложение отдельными процессами uvicorn, затем на каждом уровне параллельности
+держит N одновременных клиентов и печатает RPS и перцентили латентности.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+import httpx
+
+# свободная реплика: команды вроде "старт" роутер закрывает банком вопросов без апстрима
+CHAT_MESSAGE = "Расскажи, чем процесс отличается от потока"
+
+# все клиенты бенчмарка приходят с 127.0.0.1: лимиты частоты и допуска
+# превратили бы нагрузку в 429/503, а меряем параллельность апстрима
+NO_LIMITS = {
+    "RATE_LIMIT_IP_PER_MINUTE": "0",
+    "RATE_LIMIT_SESSION_PER_MINUTE": "0",
+    "ADMISSION_MAX_IN_FLIGHT": "100000",
+}
+
+TARGETS = {
+    "sync": "bench.sync_baseline:app",
+    "async": "app.main:app",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 20.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+@contextmanager
+def serve_process(app_path: str, port: int, env: Dict[str, str]) -> Iterator[Tuple[str, subprocess.Popen]]:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env={**os.environ, **env},
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base + "/docs")
+        yield base, proc
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+@contextmanager
+def serve(app_path: str, port: int, env: Dict[str, str]) -> Iterator[str]:
+    with serve_process(app_path, port, env) as (base, _):
+        yield base
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+async def run_level(base: str, concurrency: int, rounds: int) -> Dict[str, float]:
+    payload = {"messages": [{"role": "user", "content": CHAT_MESSAGE}], "mode": "interview_coach"}
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=300.0) as http:
+
+        async def worker() -> None:
+            nonlocal errors
+            for _ in range(rounds):
+                t0 = time.perf_counter()
+                try:
+                    r = await http.post("/api/chat", json=payload)
+                    r.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else float("nan"),
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else float("nan"),
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else float("nan"),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else float("nan"),
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--levels", default="10,50,100,200,400")
+    parser.add_argument("--rounds", type=int, default=3, help="запросов на одного клиента")
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.levels.split(",")]
+    targets = ["sync", "async"] if args.target == "both" else [args.target]
+
+    upstream_port = free_port()
+    with serve("bench.fake_upstream:app", upstream_port, {"FAKE_LATENCY_MS": str(args.latency_ms)}) as upstream:
+        env = {
+            **NO_LIMITS,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_MODEL": "fake-model",
+            "OPENAI_BASE_URL": upstream + "/v1",
+        }
+        print(f"upstream latency {args.latency_ms:.0f} ms, {args.rounds} requests per client")
+        print(f"{'target':<6} {'conc':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err':>4}")
+        for target in targets:
+            with serve(TARGETS[target], free_port(), env) as base:
+                for level in levels:
+                    row = asyncio.run(run_level(base, level, args.rounds))
+                    print(
+                        f"{target:<6} {row['concurrency']:>5} {row['rps']:>8.1f} {row['p50_ms']:>8.0f} "
+                        f"{row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f} {row['errors']:>4}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Time-to-first-token: /api/chat против /api/chat/stream.
+
+    python -m bench.chat_ttft --tokens 300 --token-interval-ms 15
+
+Для /api/chat первый токен пользователь видит только вместе со всем ответом,
+для стрима — по первому событию `delta`.
+"""
+import argparse
+import time
+from typing import List
+
+import httpx
+
+from bench.chat_load import CHAT_MESSAGE, NO_LIMITS, free_port, percentile, serve
+
+
+def measure(base: str, path: str, requests: int) -> List[float]:
+    payload = {"messages": [{"role": "user", "content": CHAT_MESSAGE}], "mode": "interview_coach"}
+    out: List[float] = []
+    with httpx.Client(base_url=base, timeout=300.0) as http:
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            first = None
+            with http.stream("POST", path, json=payload) as r:
+                r.raise_for_status()
+                for line in r.iter_lines():
+                    if first is None and (not path.endswith("/stream") or line.startswith("event: delta")):
+                        first = time.perf_counter() - t0
+            out.append(first)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--token-interval-ms", type=float, default=15.0)
+    args = parser.parse_args()
+
+    upstream_env = {
+        "FAKE_LATENCY_MS": str(args.latency_ms),
+        "FAKE_TOKENS": str(args.tokens),
+        "FAKE_TOKEN_INTERVAL_MS": str(args.token_interval_ms),
+    }
+    with serve("bench.fake_upstream:app", free_port(), upstream_env) as upstream:
+        env = {
+            **NO_LIMITS,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_MODEL": "fake-model",
+            "OPENAI_BASE_URL": upstream + "/v1",
+        }
+        with serve("app.main:app", free_port(), env) as base:
+            print(
+                f"upstream: first token after {args.latency_ms:.0f} ms, "
+                f"{args.tokens} tokens every {args.token_interval_ms:.0f} ms"
+            )
+            print(f"{'endpoint':<18} {'p50 ms':>8} {'p95 ms':>8}")
+            for path in ["/api/chat", "/api/chat/stream"]:
+                ttft = measure(base, path, args.requests)
+                print(f"{path:<18} {percentile(ttft, 50) * 1000:>8.0f} {percentile(ttft, 95) * 1000:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# LATENCY_MS — время до первого токена, TOKEN_INTERVAL_MS — пауза между токенами;
+# без stream ответ приходит целиком через LATENCY_MS + TOKENS * TOKEN_INTERVAL_MS.
+LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "500"))
+# Распределение задержки первого токена: fixed — ровно LATENCY_MS, uniform — LATENCY_MS ± JITTER_MS,
+# lognormal — медиана LATENCY_MS и разброс SIGMA (длинный правый хвост, как у настоящих LLM API),
+# exp — экспонента со средним LATENCY_MS.
+LATENCY_DIST = os.getenv("FAKE_LATENCY_DIST", "fixed")
+LATENCY_JITTER_MS = float(os.getenv("FAKE_LATENCY_JITTER_MS", "0"))
+LATENCY_SIGMA = float(os.getenv("FAKE_LATENCY_SIGMA", "0.5"))
+TOKENS = int(os.getenv("FAKE_TOKENS", "0"))
+TOKEN_INTERVAL_MS = float(os.getenv("FAKE_TOKEN_INTERVAL_MS", "0"))
+REPLY = os.getenv("FAKE_REPLY", "Ок, вот следующий вопрос: чем отличается процесс от потока?")
+# Инъекция сбоев: доля ответов с ошибкой FAKE_ERROR_STATUS (и Retry-After, если задан)
+# и доля «медленных хвостов», которые отвечают через FAKE_SLOW_MS вместо LATENCY_MS.
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+ERROR_STATUS = int(os.getenv("FAKE_ERROR_STATUS", "503"))
+RETRY_AFTER = os.getenv("FAKE_RETRY_AFTER")
+SLOW_RATE = float(os.getenv("FAKE_SLOW_RATE", "0"))
+SLOW_MS = float(os.getenv("FAKE_SLOW_MS", "5000"))
+# доля стримов, которые обрываются на середине без [DONE]
+DISCONNECT_RATE = float(os.getenv("FAKE_DISCONNECT_RATE", "0"))
+# ответ на запрос оценки (JSON): балл случайный, чтобы адаптация уровня в сценариях работала
+EVALUATION = (
+    '{{"score": {score}, "feedback": "Неплохо, но не хватает примера.", '
+    '"improved_answer": "Определение, пример, итог."}}'
+)
+rng = random.Random(int(os.getenv("FAKE_SEED", "0")))
+
+app = FastAPI()
+
+
+class _QuietDisconnects(logging.Filter):
+    # обрыв стрима — часть сценария, а не ошибка фейкового сервера
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not (record.exc_info and self._injected(record.exc_info[1]))
+
+    def _injected(self, exc) -> bool:
+        # Starlette заворачивает исключение стрима в ExceptionGroup
+        return isinstance(exc, InjectedDisconnect) or any(self._injected(e) for e in getattr(exc, "exceptions", ()))
+
+
+class InjectedDisconnect(ConnectionResetError):
+    pass
+
+
+logging.getLogger("uvicorn.error").addFilter(_QuietDisconnects())
+
+
+def injected_error():
+    if rng.random() >= ERROR_RATE:
+        return None
+    headers = {"retry-after": RETRY_AFTER} if RETRY_AFTER else None
+    return JSONResponse(
+        status_code=ERROR_STATUS,
+        content={"error": {"message": f"injected {ERROR_STATUS}", "type": "server_error"}},
+        headers=headers,
+    )
+
+
+def first_token_ms() -> float:
+    if rng.random() < SLOW_RATE:
+        return SLOW_MS
+    if LATENCY_DIST == "uniform":
+        return max(0.0, rng.uniform(LATENCY_MS - LATENCY_JITTER_MS, LATENCY_MS + LATENCY_JITTER_MS))
+    if LATENCY_DIST == "lognormal":
+        return LATENCY_MS * math.exp(rng.gauss(0, LATENCY_SIGMA))
+    if LATENCY_DIST == "exp":
+        return rng.expovariate(1 / LATENCY_MS) if LATENCY_MS > 0 else 0.0
+    return LATENCY_MS
+
+
+def wants_json(body) -> bool:
+    messages = body.get("messages") or []
+    return bool(body.get("response_format")) or bool(messages and "JSON" in str(messages[-1].get("content")))
+
+
+def reply_tokens(body=None):
+    if body is not None and wants_json(body):
+        return [EVALUATION.format(score=rng.randint(2, 9))]
+    words = REPLY.split(" ")
+    if TOKENS <= 0:
+        return [w + " " for w in words]
+    return [words[i % len(words)] + " " for i in range(TOKENS)]
+
+
+async def stream_chunks(model: str, body):
+    chunk_id = "chatcmpl-" + uuid.uuid4().hex
+    tokens = reply_tokens(body)
+    cut = len(tokens) // 2 if rng.random() < DISCONNECT_RATE else None
+    await asyncio.sleep(first_token_ms() / 1000)
+    for i, token in enumerate(tokens):
+        if i == cut:
+            raise InjectedDisconnect("injected disconnect")
+        if i:
+            await asyncio.sleep(TOKEN_INTERVAL_MS / 1000)
+        chunk = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+    error = injected_error()
+    if error is not None:
+        return error
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(model, body), media_type="text/event-stream")
+    tokens = reply_tokens(body)
+    await asyncio.sleep((first_token_ms() + max(0, len(tokens) - 1) * TOKEN_INTERVAL_MS) / 1000)
+    return {
+        "id": "chatcmpl-" + uuid.uuid4().hex,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": len(tokens), "total_tokens": 10 + len(tokens)},
+    }
+
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    await asyncio.sleep(LATENCY_MS / 1000)
+    return {
+        "id": "resp_" + uuid.uuid4().hex,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": body.get("model", "fake"),
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": "msg_" + uuid.uuid4().hex,
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": REPLY, "annotations": []}],
+            }
+        ],
+    }
@@ -0,0 +1,98 @@
+"""Токены на ход диалога: роутер команд против "всё через чат".
+
+    python -m bench.intents --sessions 200
+
+Без апстрима: провайдер-счётчик записывает каждый вызов (входные токены по
+TokenCounter, лимит max_output_tokens) и отвечает шаблоном. Сценарий сессии —
+нажатия кнопок фронтенда вперемешку с ответами кандидата. off — каждый ход идёт
+в achat (как до роутера), on — arespond с банком вопросов и предрасчётом.
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+from typing import Dict, List
+
+from app.context import TokenCounter
+from app.interview import InterviewCoachService
+from app.precompute import PrecomputedAnswers
+from app.questions import build_question_bank_from_env
+from app.schemas import ChatMessage
+
+ANSWERS = [
+    "Это способ изолировать состояние: каждый вызов получает свою копию, поэтому гонок нет.",
+    "Нужно смотреть на сложность: поиск по хэшу O(1), по списку O(n), отсюда и выбор структуры.",
+    "Я бы начал с метрик, потом профилирование, и только потом кэш или индексы.",
+]
+# одна сессия: выбор трека, три вопроса с подсказкой, оценкой и эталоном
+QUESTION_ROUND = [
+    "старт",
+    "дай подсказку к последнему вопросу",
+    None,  # ответ кандидата
+    "оцени мой последний ответ по 10-балльной шкале и дай фидбек",
+    "покажи эталонный ответ к последнему вопросу",
+]
+SCRIPT = ["Python"] + QUESTION_ROUND * 3
+
+
+class CountingLLM:
+    model = "bench"
+
+    def __init__(self):
+        self.counter = TokenCounter()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_budget = 0
+
+    async def agenerate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls += 1
+        self.input_tokens += self.counter.count_all(messages)
+        self.output_budget += max_output_tokens
+        text = json.dumps({"score": 6, "feedback": "ок", "improved_answer": "лучше"}, ensure_ascii=False)
+        return (text if "JSON" in messages[-1].content else "Вопрос: что такое замыкание?"), {"model": self.model}
+
+
+async def run_session(service: InterviewCoachService, routed: bool, rng: random.Random) -> None:
+    history: List[ChatMessage] = []
+    state: Dict = {}
+    for text in SCRIPT:
+        history.append(ChatMessage(role="user", content=text or rng.choice(ANSWERS)))
+        if routed:
+            reply, _ = await service.arespond(history, state)
+        else:
+            reply, _ = await service.achat(history)
+        history.append(ChatMessage(role="assistant", content=reply))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    args = parser.parse_args()
+
+    bank = build_question_bank_from_env()
+    with tempfile.TemporaryDirectory() as tmp:
+        # предрасчёт, как после python -m app.precompute: подсказки и эталоны для всего банка
+        precomputed = PrecomputedAnswers(f"{tmp}/precomputed.db")
+        for q in bank.by_id.values():
+            precomputed.put("hint", q, "v", "- пункт 1\n- пункт 2", "bench")
+            precomputed.put("reference", q, "v", "Эталон: определение, пример, ограничения.", "bench")
+
+        turns = len(SCRIPT) * args.sessions
+        print(f"{args.sessions} sessions x {len(SCRIPT)} turns")
+        print(f"{'router':<7} {'llm calls/turn':>15} {'input tok/turn':>15} {'max out/turn':>13}")
+        for routed in (False, True):
+            llm = CountingLLM()
+            service = InterviewCoachService(llm=llm, bank=bank, precomputed=precomputed)
+            rng = random.Random(0)
+            for _ in range(args.sessions):
+                asyncio.run(run_session(service, routed, rng))
+            print(
+                f"{'on' if routed else 'off':<7} {llm.calls / turns:>15.2f} "
+                f"{llm.input_tokens / turns:>15.0f} {llm.output_budget / turns:>13.0f}"
+            )
+        precomputed.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Устойчивость к сбоям апстрима: голый провайдер против ResilientProvider.
+
+    python -m bench.resilience --requests 400 --concurrency 20 --error-rate 0.1 --slow-rate 0.02
+
+Поднимает bench.fake_upstream с инъекцией ошибок и медленных хвостов и гоняет
+OpenAIChatProvider напрямую (без HTTP-слоя приложения) в трёх конфигурациях:
+bare — без обёртки, retry — повторы с джиттером и брейкер, hedge — плюс
+дублирующий запрос после p95.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from openai import AsyncOpenAI
+
+from app.llm import OpenAIChatProvider, build_async_http_client
+from app.resilience import Resilience, ResilientProvider
+from app.schemas import ChatMessage
+from bench.chat_load import CHAT_MESSAGE, free_port, percentile, serve
+
+MESSAGES = [ChatMessage(role="user", content=CHAT_MESSAGE)]
+
+
+def build(mode: str, base: str, attempt_timeout: float):
+    client = AsyncOpenAI(api_key="sk-bench", base_url=base + "/v1", max_retries=0, http_client=build_async_http_client())
+    provider = OpenAIChatProvider(async_client=client, model="fake-model", json_mode=False)
+    if mode == "bare":
+        return provider
+    resilience = Resilience(
+        attempt_timeout=attempt_timeout,
+        deadline=30.0,
+        retries=3,
+        base_delay=0.05,
+        max_delay=1.0,
+        failure_threshold=50,
+        hedge=mode == "hedge",
+        hedge_min_samples=20,
+    )
+    return ResilientProvider(provider, resilience)
+
+
+async def run(provider, requests: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    hedged = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        nonlocal errors, hedged
+        async with limit:
+            t0 = time.perf_counter()
+            try:
+                _, meta = await provider.agenerate_text(MESSAGES, max_output_tokens=50)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+            hedged += bool(meta.get("hedged"))
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return {
+        "ok": len(latencies) / requests * 100,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else float("nan"),
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else float("nan"),
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else float("nan"),
+        "hedged": hedged,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.02)
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--attempt-timeout", type=float, default=10.0)
+    parser.add_argument("--modes", default="bare,retry,hedge")
+    args = parser.parse_args()
+    logging.getLogger("app.resilience").setLevel(logging.ERROR)
+
+    env = {
+        "FAKE_LATENCY_MS": str(args.latency_ms),
+        "FAKE_ERROR_RATE": str(args.error_rate),
+        "FAKE_SLOW_RATE": str(args.slow_rate),
+        "FAKE_SLOW_MS": str(args.slow_ms),
+    }
+    print(
+        f"latency {args.latency_ms:.0f} ms, errors {args.error_rate:.0%}, "
+        f"slow {args.slow_rate:.0%} x {args.slow_ms:.0f} ms, {args.requests} requests x {args.concurrency}"
+    )
+    print(f"{'mode':<6} {'ok %':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'hedged':>7}")
+    with serve("bench.fake_upstream:app", free_port(), env) as base:
+        for mode in args.modes.split(","):
+            provider = build(mode, base, args.attempt_timeout)
+            row = asyncio.run(run(provider, args.requests, args.concurrency))
+            print(
+                f"{mode:<6} {row['ok']:>6.1f} {row['p50_ms']:>8.0f} {row['p95_ms']:>8.0f} "
+                f"{row['p99_ms']:>8.0f} {row['hedged']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Нагрузка сессиями интервью: многоходовые диалоги через /api/chat против фейкового апстрима.
+
+    python -m bench.sessions --levels 5,20,50 --scenario mixed --stream \\
+        --latency-dist lognormal --error-rate 0.02 --out bench/results/current.json
+    python -m bench.sessions --levels 5,20,50 --compare bench/results/baseline.json
+
+Каждый виртуальный пользователь проходит --sessions сессий по сценарию (выбор
+трека, старт, ответы, подсказки, оценка) с паузами "на подумать". На каждом
+уровне параллельности печатаются ходы в секунду, перцентили латентности хода и
+TTFT, ошибки по кодам и память процесса приложения. Результат сохраняется в
+JSON; --compare сравнивает с прошлым прогоном и завершается с кодом 1, если
+что-то ухудшилось больше чем на --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.chat_load import free_port, percentile, serve, serve_process
+
+ANSWER = None  # в сценарии — место для ответа кандидата
+ANSWERS = [
+    "Это способ изолировать состояние: каждый вызов получает свою копию, поэтому гонок нет.",
+    "Поиск по хэшу O(1), по списку O(n), поэтому для частых проверок членства нужен set.",
+    "Я бы начал с метрик и профилирования, и только потом добавлял кэш или индексы.",
+    "Не знаю",
+]
+SCENARIOS: Dict[str, List[Optional[str]]] = {
+    # кнопки фронтенда вперемешку с ответами: часть ходов закрывают банк и роутер команд
+    "interview": [
+        "Python",
+        "старт",
+        ANSWER,
+        "дай подсказку к последнему вопросу",
+        ANSWER,
+        "оцени мой последний ответ по 10-балльной шкале и дай фидбек",
+        "следующий вопрос",
+        ANSWER,
+        "покажи эталонный ответ к последнему вопросу",
+    ],
+    # свободный диалог: каждый ход — вызов LLM с растущей историей
+    "chat": ["привет, давай потренируемся", ANSWER, ANSWER, ANSWER, ANSWER, ANSWER],
+}
+# клиенты бенчмарка ходят с одного адреса — лимиты на IP и сессию выключены,
+# иначе меряется rate limiter, а не приложение
+APP_ENV = {
+    "RATE_LIMIT_IP_PER_MINUTE": "0",
+    "RATE_LIMIT_SESSION_PER_MINUTE": "0",
+    "PRECOMPUTED_PATH": "",
+}
+# метрика -> больше значит лучше
+COMPARED = {
+    "rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "ttft_p95_ms": False,
+    "rss_peak_mb": False,
+}
+# доля ошибок сравнивается по абсолютной разнице: от нуля относительное изменение бессмысленно
+ERROR_RATE_SLACK = 0.01
+
+
+class StreamError(Exception):
+    pass
+
+
+def rss_mb(pid: int, field: str = "VmRSS") -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler:
+    # RSS процесса приложения раз в interval секунд; /proc есть только на Linux
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            rss = rss_mb(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0.0, rss)
+            if self._stop.wait(self.interval):
+                return
+
+
+async def turn(
+    http: httpx.AsyncClient, stream: bool, session_id: Optional[str], text: str
+) -> Tuple[Optional[str], float, float]:
+    # -> (session_id, ttft, полное время хода)
+    payload = {"session_id": session_id, "messages": [{"role": "user", "content": text}], "mode": "interview_coach"}
+    t0 = time.perf_counter()
+    if not stream:
+        r = await http.post("/api/chat", json=payload)
+        r.raise_for_status()
+        elapsed = time.perf_counter() - t0
+        return r.json()["session_id"], elapsed, elapsed
+
+    ttft = None
+    event = None
+    async with http.stream("POST", "/api/chat/stream", json=payload) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                if event == "delta" and ttft is None:
+                    ttft = time.perf_counter() - t0
+            elif line.startswith("data: ") and event in ("done", "error"):
+                data = json.loads(line[len("data: "):])
+                if event == "error":
+                    raise StreamError(data.get("error"))
+                session_id = data["session_id"]
+    elapsed = time.perf_counter() - t0
+    return session_id, ttft if ttft is not None else elapsed, elapsed
+
+
+async def run_level(
+    base: str, concurrency: int, sessions: int, scenario: str, stream: bool, think_ms: float, seed: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=300.0) as http:
+
+        async def user(i: int) -> None:
+            rng = random.Random(seed * 100_003 + i)
+            for _ in range(sessions):
+                script = SCENARIOS[rng.choice(sorted(SCENARIOS))] if scenario == "mixed" else SCENARIOS[scenario]
+                session_id = None
+                for step in script:
+                    if think_ms > 0:
+                        await asyncio.sleep(rng.expovariate(1000 / think_ms))
+                    text = step if step is not None else rng.choice(ANSWERS)
+                    try:
+                        session_id, ttft, elapsed = await turn(http, stream, session_id, text)
+                    except httpx.HTTPStatusError as e:
+                        code = str(e.response.status_code)
+                    except StreamError:
+                        code = "stream"
+                    except httpx.HTTPError as e:
+                        code = type(e).__name__
+                    else:
+                        latencies.append(elapsed)
+                        ttfts.append(ttft)
+                        continue
+                    errors[code] = errors.get(code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    def ms(values: List[float], p: float) -> Optional[float]:
+        return round(percentile(values, p) * 1000, 1) if values else None
+
+    total = len(latencies) + sum(errors.values())
+    return {
+        "concurrency": concurrency,
+        "turns": total,
+        "seconds": round(elapsed, 2),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": ms(latencies, 50),
+        "p95_ms": ms(latencies, 95),
+        "p99_ms": ms(latencies, 99),
+        "ttft_p50_ms": ms(ttfts, 50),
+        "ttft_p95_ms": ms(ttfts, 95),
+        "ttft_p99_ms": ms(ttfts, 99),
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "errors": errors,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    # уровни сопоставляются по concurrency; возвращает список ухудшений
+    regressions: List[str] = []
+    before = {row["concurrency"]: row for row in baseline["levels"]}
+    print(f"\ncompare with {baseline['meta'].get('git')} ({baseline['meta'].get('started')}), tolerance {tolerance:.0%}")
+    print(f"{'conc':>5} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for row in current["levels"]:
+        old = before.get(row["concurrency"])
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            a, b = old.get(metric), row.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > tolerance else ""
+            print(f"{row['concurrency']:>5} {metric:<12} {a:>10.1f} {b:>10.1f} {change:>+8.0%}{flag}")
+            if flag:
+                regressions.append(f"conc={row['concurrency']} {metric}: {a} -> {b}")
+        a, b = old.get("error_rate", 0.0), row.get("error_rate", 0.0)
+        flag = " !" if b - a > ERROR_RATE_SLACK else ""
+        print(f"{row['concurrency']:>5} {'error_rate':<12} {a:>10.2%} {b:>10.2%} {b - a:>+8.2%}{flag}")
+        if flag:
+            regressions.append(f"conc={row['concurrency']} error_rate: {a} -> {b}")
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", default="5,20,50")
+    parser.add_argument("--sessions", type=int, default=2, help="сессий на одного пользователя")
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "mixed"], default="mixed")
+    parser.add_argument("--stream", action="store_true", help="ходы через /api/chat/stream")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="средняя пауза между ходами")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal", "exp"], default="lognormal")
+    parser.add_argument("--latency-jitter-ms", type=float, default=100.0, help="для uniform")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="для lognormal")
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--token-interval-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="доля стримов, оборванных апстримом")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="переменные приложения")
+    parser.add_argument("--out", help="сохранить результат в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    upstream_env = {
+        "FAKE_LATENCY_MS": str(args.latency_ms),
+        "FAKE_LATENCY_DIST": args.latency_dist,
+        "FAKE_LATENCY_JITTER_MS": str(args.latency_jitter_ms),
+        "FAKE_LATENCY_SIGMA": str(args.latency_sigma),
+        "FAKE_TOKENS": str(args.tokens),
+        "FAKE_TOKEN_INTERVAL_MS": str(args.token_interval_ms),
+        "FAKE_ERROR_RATE": str(args.error_rate),
+        "FAKE_ERROR_STATUS": str(args.error_status),
+        "FAKE_SLOW_RATE": str(args.slow_rate),
+        "FAKE_SLOW_MS": str(args.slow_ms),
+        "FAKE_DISCONNECT_RATE": str(args.disconnect_rate),
+        "FAKE_SEED": str(args.seed),
+    }
+    app_env = {**APP_ENV, **dict(kv.split("=", 1) for kv in args.app_env)}
+    result: Dict[str, Any] = {
+        "meta": {
+            "git": git_revision(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "app_env": app_env,
+        },
+        "levels": [],
+    }
+
+    print(
+        f"{args.scenario} sessions, {'stream' if args.stream else 'plain'}, upstream {args.latency_dist} "
+        f"{args.latency_ms:.0f} ms + {args.tokens} tokens x {args.token_interval_ms:.0f} ms, "
+        f"errors {args.error_rate:.0%}, slow {args.slow_rate:.0%}, disconnects {args.disconnect_rate:.0%}"
+    )
+    print(
+        f"{'conc':>5} {'turns':>6} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'ttft50':>7} {'ttft95':>7} {'err %':>6} {'rss MB':>7}"
+    )
+    with serve("bench.fake_upstream:app", free_port(), upstream_env) as upstream:
+        env = {"OPENAI_API_KEY": "sk-bench", "OPENAI_MODEL": "fake-model", "OPENAI_BASE_URL": upstream + "/v1"}
+        with serve_process("app.main:app", free_port(), {**env, **app_env}) as (base, proc):
+            result["meta"]["rss_start_mb"] = rss_mb(proc.pid)
+            for level in (int(x) for x in args.levels.split(",")):
+                with MemorySampler(proc.pid) as memory:
+                    row = asyncio.run(
+                        run_level(base, level, args.sessions, args.scenario, args.stream, args.think_ms, args.seed)
+                    )
+                row["rss_peak_mb"] = round(memory.peak, 1) if memory.peak is not None else None
+                result["levels"].append(row)
+
+                def fmt(value: Optional[float], width: int) -> str:
+                    return f"{value:>{width}.0f}" if value is not None else f"{'-':>{width}}"
+
+                print(
+                    f"{level:>5} {row['turns']:>6} {row['rps']:>7.1f} {fmt(row['p50_ms'], 8)} "
+                    f"{fmt(row['p95_ms'], 8)} {fmt(row['p99_ms'], 8)} {fmt(row['ttft_p50_ms'], 7)} "
+                    f"{fmt(row['ttft_p95_ms'], 7)} {row['error_rate'] * 100:>6.1f} {fmt(row['rss_peak_mb'], 7)}"
+                )
+                if row["errors"]:
+                    print(f"{'':>5} errors: {row['errors']}")
+            # пиковая память процесса за весь прогон — ловит утечки между уровнями
+            result["meta"]["rss_hwm_mb"] = rss_mb(proc.pid, "VmHWM")
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"saved {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, result, args.tolerance)
+        if regressions:
+            print("regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
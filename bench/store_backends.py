@@ -0,0 +1,100 @@
+"""Сравнение бэкендов ConversationStore: скорость записи и p99 чтения.
+
+    python -m bench.store_backends --sessions 2000 --turns 10 --processes 4
+
+append — по одному сообщению на транзакцию, extend — ход целиком (user + assistant)
+одной транзакцией, как пишет app.main. Для SQLite дополнительно — несколько процессов
+пишут в один файл одновременно.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from app.schemas import ChatMessage
+from app.store import ConversationStore, InMemoryConversationStore, SQLiteConversationStore
+
+USER = ChatMessage(role="user", content="Мой ответ: процесс — это изолированное адресное пространство. " * 4)
+ASSISTANT = ChatMessage(role="assistant", content="Хорошо. Следующий вопрос: что такое GIL и когда он мешает? " * 6)
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def write_load(store: ConversationStore, sessions: int, turns: int, batched: bool) -> float:
+    ids = [store.get_or_create(None) for _ in range(sessions)]
+    t0 = time.perf_counter()
+    for _ in range(turns):
+        for sid in ids:
+            if batched:
+                store.extend(sid, [USER, ASSISTANT])
+            else:
+                store.append(sid, USER)
+                store.append(sid, ASSISTANT)
+    return sessions * turns * 2 / (time.perf_counter() - t0)
+
+
+def read_load(store: ConversationStore, sessions: int, turns: int, reads: int) -> Dict[str, float]:
+    ids = [store.get_or_create(None) for _ in range(sessions)]
+    for sid in ids:
+        store.extend(sid, [USER, ASSISTANT] * turns)
+    rnd = random.Random(0)
+    lat = []
+    for _ in range(reads):
+        sid = ids[rnd.randrange(len(ids))]
+        t0 = time.perf_counter()
+        store.get_messages(sid)
+        lat.append(time.perf_counter() - t0)
+    return {"p50_us": percentile(lat, 50) * 1e6, "p99_us": percentile(lat, 99) * 1e6}
+
+
+def _worker(path: str, sessions: int, turns: int, out) -> None:
+    store = SQLiteConversationStore(path, max_sessions=10**9)
+    out.put(write_load(store, sessions, turns, batched=True))
+
+
+def multiprocess_writes(path: str, processes: int, sessions: int, turns: int) -> float:
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, sessions, turns, out)) for _ in range(processes)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+    return processes * sessions * turns * 2 / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--reads", type=int, default=20000)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        factories: Dict[str, Callable[[str], ConversationStore]] = {
+            "memory": lambda name: InMemoryConversationStore(max_sessions=10**9),
+            "sqlite": lambda name: SQLiteConversationStore(os.path.join(tmp, name + ".db"), max_sessions=10**9),
+        }
+        print(f"{args.sessions} sessions x {args.turns} turns, {args.reads} reads of {args.turns * 2}-message sessions")
+        print(f"{'backend':<8} {'append msg/s':>13} {'extend msg/s':>13} {'read p50 us':>12} {'read p99 us':>12}")
+        for name, make in factories.items():
+            single = write_load(make(name + "_single"), args.sessions, args.turns, batched=False)
+            batched = write_load(make(name + "_batched"), args.sessions, args.turns, batched=True)
+            reads = read_load(make(name + "_read"), args.sessions, args.turns, args.reads)
+            print(f"{name:<8} {single:>13.0f} {batched:>13.0f} {reads['p50_us']:>12.1f} {reads['p99_us']:>12.1f}")
+
+        rate = multiprocess_writes(os.path.join(tmp, "shared.db"), args.processes, args.sessions // 4, args.turns)
+        print(f"sqlite, {args.processes} processes -> one file, extend: {rate:.0f} msg/s total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Микробенчмарк InMemoryConversationStore: стоимость операции при N живых сессиях.
+
+    python -m bench.store_bench --sizes 10000,100000,1000000
+
+`legacy` — исходный _gc() (полный проход по сессиям + сортировка при переполнении),
+`current` — app.store. Стор заполняется до max_sessions, затем измеряется смесь
+append в существующие сессии и get_or_create(None), каждое создание вытесняет одну сессию.
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Tuple
+
+from app.schemas import ChatMessage
+from app.store import InMemoryConversationStore, SessionData
+
+
+class LegacyConversationStore(InMemoryConversationStore):
+    def __init__(self, ttl_seconds: int = 21600, max_sessions: int = 5000):
+        super().__init__(ttl_seconds, max_sessions)
+        self._sessions = dict(self._sessions)
+
+    def _touch(self, session_id: str) -> SessionData:
+        s = self._sessions.setdefault(session_id, SessionData())
+        s.updated_at = time.time()
+        return s
+
+    def _gc(self) -> None:
+        now = time.time()
+        dead = [sid for sid, s in self._sessions.items() if (now - s.updated_at) > self.ttl]
+        for sid in dead:
+            self._sessions.pop(sid, None)
+        if len(self._sessions) > self.max_sessions:
+            items: List[Tuple[str, SessionData]] = sorted(self._sessions.items(), key=lambda kv: kv[1].updated_at)
+            for sid, _ in items[: len(self._sessions) - self.max_sessions]:
+                self._sessions.pop(sid, None)
+
+
+def fill(store: InMemoryConversationStore, n: int) -> List[str]:
+    base = time.time() - n * 1e-3
+    ids = []
+    for i in range(n):
+        sid = f"sess_{i:08d}"
+        store._sessions[sid] = SessionData(created_at=base + i * 1e-3, updated_at=base + i * 1e-3)
+        ids.append(sid)
+    return ids
+
+
+def run(store_cls, n: int, ops: int) -> Dict[str, float]:
+    store = store_cls(ttl_seconds=10**9, max_sessions=n)
+    ids = fill(store, n)
+    msg = ChatMessage(role="user", content="ответ")
+    rnd = random.Random(1)
+    t0 = time.perf_counter()
+    for i in range(ops):
+        if i % 10 == 0:
+            ids.append(store.get_or_create(None))
+        else:
+            sid = ids[rnd.randrange(len(ids))]
+            store.append(sid, msg)
+    elapsed = time.perf_counter() - t0
+    return {"us_per_op": elapsed / ops * 1e6, "sessions": len(store)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--legacy-ops", type=int, default=50, help="legacy слишком медленный для --ops")
+    args = parser.parse_args()
+
+    print(f"{'impl':<8} {'sessions':>9} {'ops':>6} {'us/op':>12}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        for name, cls, ops in [
+            ("legacy", LegacyConversationStore, args.legacy_ops),
+            ("current", InMemoryConversationStore, args.ops),
+        ]:
+            row = run(cls, n, ops)
+            print(f"{name:<8} {n:>9} {ops:>6} {row['us_per_op']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
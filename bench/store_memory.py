@@ -0,0 +1,102 @@
+"""Память под историю: список pydantic ChatMessage против компактных записей стора.
+
+    python -m bench.store_memory --messages 100000 --sessions 1000
+
+Стор заполняется ходами (user + assistant) как из /api/chat: сообщение приходит
+моделью ChatMessage и дальше живёт только в сторе. `legacy` — прежнее хранение
+списков ChatMessage, `compact` — app.store.InMemoryConversationStore.
+Память — прирост по tracemalloc после заполнения, в пересчёте на 100k сообщений;
+`accounted` — оценка стора (nbytes), по которой работают лимиты.
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+from app.schemas import ChatMessage
+from app.store import ConversationStore, InMemoryConversationStore
+
+WORDS = (
+    "поток процесс память кэш индекс транзакция очередь блокировка сериализация "
+    "замыкание интерфейс наследование сложность запрос ответ пример итог GIL asyncio O(n)"
+).split()
+
+
+class LegacyStore:
+    # прежняя схема: сессия -> список моделей ChatMessage как есть
+    def __init__(self) -> None:
+        self._sessions: "OrderedDict[str, List[ChatMessage]]" = OrderedDict()
+
+    def get_or_create(self, session_id: Any) -> str:
+        sid = ConversationStore.new_session_id(self)
+        self._sessions[sid] = []
+        return sid
+
+    def extend(self, session_id: str, messages: List[ChatMessage]) -> None:
+        self._sessions[session_id].extend(messages)
+
+    def get_messages(self, session_id: str) -> List[ChatMessage]:
+        return list(self._sessions[session_id])
+
+
+def text(rng: random.Random, user: bool) -> str:
+    # ответы кандидата короче разборов ассистента
+    words = rng.randint(5, 60) if user else rng.randint(40, 200)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def run(factory: Callable[[], Any], messages: int, sessions: int) -> Dict[str, Any]:
+    rng = random.Random(1)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    store = factory()
+    sids = [store.get_or_create(None) for _ in range(sessions)]
+    t0 = time.perf_counter()
+    for i in range(messages // 2):
+        turn = [
+            ChatMessage(role="user", content=text(rng, True)),
+            ChatMessage(role="assistant", content=text(rng, False)),
+        ]
+        store.extend(sids[i % sessions], turn)
+    extend_s = time.perf_counter() - t0
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    for sid in sids:
+        store.get_messages(sid)
+    get_s = time.perf_counter() - t0
+    scale = 100_000 / messages
+    return {
+        "mb_per_100k": used * scale / 2**20,
+        "accounted_mb_per_100k": getattr(store, "nbytes", 0) * scale / 2**20,
+        "extend_us": extend_s / (messages // 2) * 1e6,
+        "get_us": get_s / sessions * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'impl':<8} {'MB/100k':>8} {'accounted':>10} {'extend us':>10} {'get us':>8}")
+    for name, factory in [
+        ("legacy", LegacyStore),
+        ("compact", lambda: InMemoryConversationStore(max_sessions=10**9, max_bytes=2**62, max_session_bytes=2**62)),
+    ]:
+        row = run(factory, args.messages, args.sessions)
+        accounted = f"{row['accounted_mb_per_100k']:.1f}" if name == "compact" else "-"
+        print(
+            f"{name:<8} {row['mb_per_100k']:>8.1f} {accounted:>10} {row['extend_us']:>10.1f} {row['get_us']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Стор сессий под потоками: один глобальный lock против ShardedConversationStore.
+
+    python -m bench.store_shards --threads 1,4,16,64 --sessions 10000 --turns 2000
+
+Каждый поток делает ходы как /api/chat (get_messages, get_state, extend, set_state)
+в случайные сессии; каждый десятый ход — новая сессия. `global` — InMemoryConversationStore
+за одним threading.Lock, `sharded` — app.store.ShardedConversationStore.
+"""
+import argparse
+import random
+import threading
+import time
+from typing import Any, Dict, List
+
+from app.schemas import ChatMessage
+from app.store import ConversationStore, InMemoryConversationStore, ShardedConversationStore
+
+
+class GlobalLockStore(InMemoryConversationStore):
+    # наивный вариант потокобезопасности: все операции за одним lock
+    def __init__(self, ttl_seconds: int = 21600, max_sessions: int = 5000):
+        super().__init__(ttl_seconds, max_sessions)
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id):
+        with self._lock:
+            return super().get_or_create(session_id)
+
+    def extend(self, session_id, messages):
+        with self._lock:
+            super().extend(session_id, messages)
+
+    def get_messages(self, session_id):
+        with self._lock:
+            return super().get_messages(session_id)
+
+    def get_state(self, session_id):
+        with self._lock:
+            return super().get_state(session_id)
+
+    def set_state(self, session_id, state):
+        with self._lock:
+            super().set_state(session_id, state)
+
+
+def run(store: ConversationStore, threads: int, sessions: int, turns: int) -> Dict[str, Any]:
+    sids = [store.get_or_create(None) for _ in range(sessions)]
+    turn = [ChatMessage(role="user", content="ответ"), ChatMessage(role="assistant", content="оценка")]
+    latencies: List[float] = []
+    start = threading.Barrier(threads + 1)
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        local: List[float] = []
+        start.wait()
+        for i in range(turns):
+            t0 = time.perf_counter()
+            sid = store.get_or_create(None) if i % 10 == 0 else rng.choice(sids)
+            store.get_messages(sid)
+            state = store.get_state(sid)
+            store.extend(sid, turn)
+            state["level"] = i % 5
+            store.set_state(sid, state)
+            local.append(time.perf_counter() - t0)
+        latencies.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "turns_per_s": threads * turns / elapsed,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", default="1,4,16,64")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=2000, help="ходов на поток")
+    parser.add_argument("--shards", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{'impl':<8} {'threads':>7} {'turns/s':>9} {'p50 us':>8} {'p99 us':>8}")
+    for threads in [int(x) for x in args.threads.split(",")]:
+        for name, factory in [
+            ("global", lambda: GlobalLockStore(max_sessions=args.sessions * 2)),
+            ("sharded", lambda: ShardedConversationStore(max_sessions=args.sessions * 2, shards=args.shards)),
+        ]:
+            row = run(factory(), threads, args.sessions, args.turns)
+            print(f"{name:<8} {threads:>7} {row['turns_per_s']:>9.0f} {row['p50_us']:>8.1f} {row['p99_us']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+from fastapi import FastAPI
+from pydantic import BaseModel
+from openai import OpenAI
+
+# Копия исходного /api/chat: sync-обработчик и блокирующий клиент,
+# каждый запрос держит поток из threadpool Starlette на всё время ответа LLM.
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL"),
+)
+openai_model = os.getenv("OPENAI_MODEL")
+
+app = FastAPI()
+
+
+class ChatRequest(BaseModel):
+    messages: list[dict]
+    mode: str | None = None
+
+
+@app.post("/api/chat")
+def chat(req: ChatRequest):
+    response = client.chat.completions.create(
+        model=openai_model,
+        messages=req.messages,
+        temperature=0.7,
+    )
+    return {"reply": response.choices[0].message.content}
@@ -0,0 +1,103 @@
+"""Масштабирование по воркерам: python -m app.serve с 1..N процессами.
+
+    python -m bench.workers --workers 1,2,4 --levels 20,100 --sessions 4
+
+Для каждого числа воркеров приложение поднимается заново через app.serve
+(сессии, лимиты и кэш ответов — в общих SQLite-файлах во временном каталоге),
+дальше нагрузка сценарием bench.sessions без пауз на подумать. Апстрим — быстрый
+фейк, так что упираемся в CPU приложения: JSON, pydantic, стор. Печатаются
+время до первого ответа после запуска, ходы в секунду, перцентили и ошибки;
+ошибки 404 значили бы, что сессия не нашлась в соседнем воркере.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+import httpx
+
+from bench.chat_load import free_port, serve, wait_ready
+from bench.sessions import APP_ENV, SCENARIOS, run_level
+
+
+@contextmanager
+def serve_workers(workers: int, server: str, env: Dict[str, str]) -> Iterator[Tuple[str, float]]:
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "app.serve", "--port", str(port), "--host", "127.0.0.1",
+            "--workers", str(workers), "--server", server, "--log-level", "warning",
+        ],
+        env={**os.environ, **env},
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base + "/docs", timeout=60.0)
+        yield base, time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def startup_ms(base: str) -> Dict[str, float]:
+    # /metrics отдаёт один из воркеров — его фазы старта
+    out: Dict[str, float] = {}
+    for line in httpx.get(base + "/metrics").text.splitlines():
+        if line.startswith("coach_startup_seconds{"):
+            phase = line.split('"')[1]
+            out[phase] = float(line.rsplit(" ", 1)[1]) * 1000
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--levels", default="20,100")
+    parser.add_argument("--sessions", type=int, default=4, help="сессий на одного пользователя")
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "mixed"], default="mixed")
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    upstream_env = {"FAKE_LATENCY_MS": str(args.latency_ms), "FAKE_TOKENS": str(args.tokens)}
+    print(f"{os.cpu_count()} cpus, {args.server}, {args.scenario} sessions, upstream {args.latency_ms:.0f} ms")
+    print(
+        f"{'workers':>7} {'ready ms':>8} {'import ms':>9} {'conc':>5} {'rps':>7} "
+        f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'errors':>6}"
+    )
+    with serve("bench.fake_upstream:app", free_port(), upstream_env) as upstream:
+        for workers in (int(x) for x in args.workers.split(",")):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {
+                    **APP_ENV,
+                    "OPENAI_API_KEY": "sk-bench",
+                    "OPENAI_MODEL": "fake-model",
+                    "OPENAI_BASE_URL": upstream + "/v1",
+                    # общие бэкенды и при одном воркере — сравниваем только число процессов
+                    "STORE_BACKEND": "sqlite",
+                    "STORE_PATH": os.path.join(tmp, "sessions.db"),
+                    "RATE_LIMIT_BACKEND": "sqlite",
+                    "RATE_LIMIT_PATH": os.path.join(tmp, "ratelimit.db"),
+                    "RESPONSE_CACHE_PATH": os.path.join(tmp, "responses.db"),
+                }
+                with serve_workers(workers, args.server, env) as (base, ready):
+                    phases = startup_ms(base)
+                    for level in (int(x) for x in args.levels.split(",")):
+                        row = asyncio.run(run_level(base, level, args.sessions, args.scenario, False, 0.0, 0))
+                        errors: List[str] = [f"{code}:{n}" for code, n in sorted(row["errors"].items())]
+                        print(
+                            f"{workers:>7} {ready * 1000:>8.0f} {phases.get('import', 0):>9.0f} {level:>5} "
+                            f"{row['rps']:>7.1f} {row['p50_ms']:>7.0f} {row['p95_ms']:>7.0f} {row['p99_ms']:>7.0f} "
+                            f"{sum(row['errors'].values()):>6}" + (f"  {' '.join(errors)}" if errors else "")
+                        )
+
+
+if __name__ == "__main__":
+    main()
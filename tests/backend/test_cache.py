@@ -0,0 +1,154 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from app.cache import CachedProvider, ResponseCache, cache_key
+
+
+@dataclass
+class ChatMessage:
+    role: str
+    content: str
+
+
+class CountingLLM:
+    model = "m"
+
+    def __init__(self, text: str = "ответ"):
+        self.text = text
+        self.calls: List[Dict[str, Any]] = []
+
+    def generate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls.append({"messages": messages, "temperature": temperature})
+        return self.text, {"model": self.model}
+
+    async def agenerate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        return self.generate_text(messages, temperature=temperature, max_output_tokens=max_output_tokens)
+
+    async def astream_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls.append({"messages": messages, "temperature": temperature})
+        for piece in ["от", "вет"]:
+            yield piece, {}
+        yield "", {"model": self.model}
+
+
+def msgs(*contents):
+    return [ChatMessage(role="user", content=c) for c in contents]
+
+
+def test_cache_key_normalizes_whitespace_and_separates_params():
+    base = cache_key("m", msgs("дай  подсказку\n"), 0.2, 600)
+    assert base == cache_key("m", msgs("дай подсказку"), 0.2, 600)
+    assert base != cache_key("m", msgs("дай подсказку"), 0.3, 600)
+    assert base != cache_key("m", msgs("дай подсказку"), 0.2, 700)
+    assert base != cache_key("other", msgs("дай подсказку"), 0.2, 600)
+    assert base != cache_key("m", [ChatMessage(role="system", content="дай подсказку")], 0.2, 600)
+
+
+def test_response_cache_lru_eviction_and_stats():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "A", {})
+    cache.put("b", "B", {})
+    assert cache.get("a") == ("A", {})
+    cache.put("c", "C", {})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == ("A", {})
+    assert cache.get("c") == ("C", {})
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2, "hit_rate": 0.75}
+
+
+def test_response_cache_ttl(monkeypatch):
+    import app.cache as mod
+    now = {"t": 100.0}
+    monkeypatch.setattr(mod.time, "time", lambda: now["t"])
+
+    cache = ResponseCache(ttl_seconds=10)
+    cache.put("k", "v", {"x": 1})
+    now["t"] += 5
+    assert cache.get("k") == ("v", {"x": 1})
+    now["t"] += 6
+    assert cache.get("k") is None
+    assert len(cache) == 0
+
+
+def test_response_cache_persists_to_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(path=path)
+    first.put("k", "сохранённый ответ", {"model": "m"})
+
+    second = ResponseCache(path=path)
+    assert second.get("k") == ("сохранённый ответ", {"model": "m"})
+    assert len(second) == 1
+
+
+def test_response_cache_async_reads_and_writes_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def run():
+        await ResponseCache(path=path).aput("k", "ответ", {"model": "m"})
+        second = ResponseCache(path=path)
+        return await second.aget("k"), await second.aget("other"), second.stats()
+
+    hit, miss, stats = asyncio.run(run())
+
+    assert hit == ("ответ", {"model": "m"})
+    assert miss is None
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_response_cache_prunes_disk(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), max_entries=100, max_disk_entries=3, prune_every=5)
+    for i in range(5):
+        cache.put(f"k{i}", str(i), {})
+
+    (count,) = cache.db.conn().execute("SELECT COUNT(*) FROM responses").fetchone()
+    assert count == 3
+
+
+def test_cached_provider_sync_hit_skips_inner():
+    llm = CountingLLM()
+    provider = CachedProvider(llm, ResponseCache())
+
+    text1, meta1 = provider.generate_text(msgs("q"), temperature=0.2, max_output_tokens=600)
+    text2, meta2 = provider.generate_text(msgs("q"), temperature=0.2, max_output_tokens=600)
+
+    assert text1 == text2 == "ответ"
+    assert meta1 == {"model": "m", "cache": "miss"}
+    assert meta2 == {"model": "m", "cache": "hit"}
+    assert len(llm.calls) == 1
+
+
+def test_cached_provider_async_and_stream_share_entries():
+    llm = CountingLLM()
+    provider = CachedProvider(llm, ResponseCache())
+
+    async def run():
+        streamed = [item async for item in provider.astream_text(msgs("q"))]
+        text, meta = await provider.agenerate_text(msgs("q"))
+        replay = [item async for item in provider.astream_text(msgs("q"))]
+        return streamed, text, meta, replay
+
+    streamed, text, meta, replay = asyncio.run(run())
+
+    assert streamed == [("от", {}), ("вет", {}), ("", {"model": "m", "cache": "miss"})]
+    assert text == "ответ"
+    assert meta["cache"] == "hit"
+    assert replay == [("ответ", {}), ("", {"model": "m", "cache": "hit"})]
+    assert len(llm.calls) == 1
+
+
+def test_service_evaluate_uses_cache(monkeypatch):
+    import json
+
+    from app.interview import InterviewCoachService
+
+    llm = CountingLLM(json.dumps({"score": 7, "feedback": "ok", "improved_answer": "лучше"}))
+    service = InterviewCoachService(llm=llm, cache=ResponseCache())
+
+    first = service.evaluate("Что такое GIL?", "Глобальная блокировка интерпретатора")
+    second = service.evaluate("Что такое GIL?", "Глобальная блокировка интерпретатора")
+
+    assert first == second
+    assert first.score == 7
+    assert len(llm.calls) == 1
@@ -0,0 +1,195 @@
+import asyncio
+
+import pytest
+
+from app.coalesce import CoalescingProvider, IdempotencyCache, IdempotencyConflict, SingleFlight
+from app.schemas import ChatMessage
+
+
+class SlowLLM:
+    model = "m"
+
+    def __init__(self, pieces=("a", "b", "c"), fail: bool = False):
+        self.pieces = pieces
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+        # стрим отдаёт по чанку на каждый steps.release()
+        self.steps = asyncio.Semaphore(0)
+
+    async def agenerate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return messages[-1].content.upper(), {"model": self.model}
+
+    async def astream_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls += 1
+        for piece in self.pieces:
+            await self.steps.acquire()
+            yield piece, {}
+        if self.fail:
+            raise RuntimeError("upstream down")
+        yield "", {"model": self.model}
+
+
+MSGS = [ChatMessage(role="user", content="hi")]
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    async def scenario():
+        llm = SlowLLM()
+        flights = SingleFlight()
+        provider = CoalescingProvider(llm, flights)
+        tasks = [asyncio.create_task(provider.agenerate_text(MSGS)) for _ in range(3)]
+        other = asyncio.create_task(provider.agenerate_text(MSGS, temperature=0.9))
+        await asyncio.sleep(0)
+        llm.release.set()
+        return llm, flights, await asyncio.gather(*tasks), await other
+
+    llm, flights, results, other = asyncio.run(scenario())
+    assert llm.calls == 2
+    assert [r[0] for r in results] == ["HI"] * 3
+    assert [r[1]["coalesced"] for r in results] == [False, True, True]
+    assert other[1]["coalesced"] is False
+    assert (flights.leaders, flights.joined) == (2, 2)
+    assert flights.flights == {}
+
+
+def test_scopes_are_not_coalesced():
+    async def scenario():
+        llm = SlowLLM()
+        flights = SingleFlight()
+        tasks = [
+            asyncio.create_task(CoalescingProvider(llm, flights, scope).agenerate_text(MSGS))
+            for scope in ("sess_a", "sess_b")
+        ]
+        await asyncio.sleep(0)
+        llm.release.set()
+        await asyncio.gather(*tasks)
+        return llm
+
+    assert asyncio.run(scenario()).calls == 2
+
+
+def test_error_is_delivered_to_every_subscriber():
+    async def scenario():
+        llm = SlowLLM(fail=True)
+        provider = CoalescingProvider(llm, SingleFlight())
+        tasks = [asyncio.create_task(provider.agenerate_text(MSGS)) for _ in range(2)]
+        await asyncio.sleep(0)
+        llm.release.set()
+        return llm, await asyncio.gather(*tasks, return_exceptions=True)
+
+    llm, results = asyncio.run(scenario())
+    assert llm.calls == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_upstream_is_cancelled_only_when_every_subscriber_leaves():
+    async def scenario():
+        llm = SlowLLM()
+        provider = CoalescingProvider(llm, SingleFlight())
+        first = asyncio.create_task(provider.agenerate_text(MSGS))
+        second = asyncio.create_task(provider.agenerate_text(MSGS))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not llm.cancelled
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return llm
+
+    assert asyncio.run(scenario()).cancelled
+
+
+def test_stream_fans_out_to_late_subscriber():
+    async def scenario():
+        llm = SlowLLM()
+        flights = SingleFlight()
+        provider = CoalescingProvider(llm, flights)
+
+        async def collect():
+            return [chunk async for chunk in provider.astream_text(MSGS)]
+
+        first = asyncio.create_task(collect())
+        llm.steps.release()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        # второй подписчик приходит, когда часть чанков уже отдана
+        second = asyncio.create_task(collect())
+        await asyncio.sleep(0)
+        for _ in range(2):
+            llm.steps.release()
+        return llm, flights, await first, await second
+
+    llm, flights, first, second = asyncio.run(scenario())
+    assert llm.calls == 1
+    assert "".join(d for d, _ in first) == "".join(d for d, _ in second) == "abc"
+    assert first[-1][1] == {"model": "m", "coalesced": False}
+    assert second[-1][1] == {"model": "m", "coalesced": True}
+    assert flights.joined == 1
+
+
+def test_stream_error_reaches_all_subscribers():
+    async def scenario():
+        llm = SlowLLM(fail=True)
+        provider = CoalescingProvider(llm, SingleFlight())
+
+        async def collect():
+            return [chunk async for chunk in provider.astream_text(MSGS)]
+
+        tasks = [asyncio.create_task(collect()) for _ in range(2)]
+        await asyncio.sleep(0)
+        for _ in range(3):
+            llm.steps.release()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(scenario()))
+
+
+def test_idempotency_replays_result_and_rejects_other_body():
+    async def scenario():
+        cache = IdempotencyCache()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return "reply"
+
+        first = await cache.run("k", "body-1", work)
+        second = await cache.run("k", "body-1", work)
+        with pytest.raises(IdempotencyConflict):
+            await cache.run("k", "body-2", work)
+        return cache, calls, first, second
+
+    cache, calls, first, second = asyncio.run(scenario())
+    assert calls == [1]
+    assert first == ("reply", False)
+    assert second == ("reply", True)
+    assert cache.replays == 1
+
+
+def test_idempotency_does_not_remember_failures():
+    async def scenario():
+        cache = IdempotencyCache()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("boom")
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await cache.run("k", "body", flaky)
+        return await cache.run("k", "body", flaky)
+
+    assert asyncio.run(scenario()) == ("ok", False)
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+
+from app.context import MESSAGE_OVERHEAD_TOKENS, ContextWindow, TokenCounter
+
+
+@dataclass
+class ChatMessage:
+    role: str
+    content: str
+
+
+def make_history(turns: int):
+    history = []
+    for i in range(turns):
+        history.append(ChatMessage(role="assistant", content=f"Вопрос {i}: расскажи про тему номер {i}?"))
+        history.append(ChatMessage(role="user", content=f"Ответ {i}: " + "подробности " * 30))
+    return history
+
+
+def test_token_counter_counts_and_caches(monkeypatch):
+    counter = TokenCounter()
+
+    assert counter.count_text("") == 0
+    assert counter.count_text("abcd efgh") == 2
+    assert counter.count_text("abcdefgh,") == 3
+
+    import app.context as mod
+    calls = {"n": 0}
+    real = mod._PIECE
+
+    class CountingPattern:
+        def findall(self, text):
+            calls["n"] += 1
+            return real.findall(text)
+
+    monkeypatch.setattr(mod, "_PIECE", CountingPattern())
+
+    msg = ChatMessage(role="user", content="одно и то же сообщение")
+    first = counter.count(msg)
+    second = counter.count(msg)
+    assert first == second
+    assert first == counter.count_text(msg.content) + MESSAGE_OVERHEAD_TOKENS
+    assert calls["n"] == 1
+
+
+def test_token_counter_cache_is_bounded():
+    counter = TokenCounter(max_entries=2)
+    for text in ["a", "b", "c"]:
+        counter.count_text(text)
+    assert list(counter._cache) == ["b", "c"]
+
+
+def test_fit_keeps_everything_under_budget():
+    window = ContextWindow(max_tokens=10_000)
+    system = [ChatMessage(role="system", content="sys")]
+    history = make_history(3)
+
+    assert window.fit(system, history) == [*system, *history]
+
+
+def test_fit_drops_old_turns_and_stays_under_budget():
+    window = ContextWindow(max_tokens=400, summary_tokens=80)
+    system = [ChatMessage(role="system", content="sys")]
+    history = make_history(20) + [ChatMessage(role="user", content="последний ответ")]
+
+    out = window.fit(system, history)
+
+    assert out[0] == system[0]
+    assert out[-1] == history[-1]
+    assert out[1].role == "system"
+    assert "опущены" in out[1].content
+    assert window.counter.count_all(out) <= 400
+    # хвост — непрерывный суффикс истории
+    tail = out[2:]
+    assert tail == history[len(history) - len(tail):]
+
+
+def test_fit_pins_current_question_outside_window():
+    window = ContextWindow(max_tokens=300, summary_tokens=60)
+    system = [ChatMessage(role="system", content="sys")]
+    question = ChatMessage(role="assistant", content="Как работает GIL?")
+    long_answers = [ChatMessage(role="user", content="часть ответа " * 40) for _ in range(5)]
+    history = make_history(3) + [question, *long_answers]
+
+    out = window.fit(system, history)
+
+    assert question in out
+    assert out.index(question) == 2
+    assert out[-1] == long_answers[-1]
+
+
+def test_fit_always_keeps_last_message():
+    window = ContextWindow(max_tokens=50, summary_tokens=10)
+    huge = ChatMessage(role="user", content="слово " * 500)
+
+    out = window.fit([ChatMessage(role="system", content="s")], make_history(2) + [huge])
+
+    assert out[-1] == huge
+
+
+def test_summary_lists_dropped_questions():
+    window = ContextWindow(max_tokens=250, summary_tokens=120)
+    history = make_history(10) + [ChatMessage(role="user", content="ok")]
+
+    out = window.fit([ChatMessage(role="system", content="s")], history)
+
+    lines = out[1].content.splitlines()[1:]
+    # в заметку попадают самые свежие из опущенных вопросов, в хронологическом порядке
+    assert lines[-1] == "- Вопрос 8: расскажи про тему номер 8?"
+    assert lines == sorted(lines)
+    assert window.counter.count_text(out[1].content) <= 120
@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from app.intents import CHAT, EVALUATE, HINT, REFERENCE, START, TRACK, Intent, classify
+from app.interview import NO_ANSWER_REPLY, InterviewCoachService
+from app.questions import Question, QuestionBank
+from app.schemas import ChatMessage
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("старт", Intent(START)),
+        ("Старт python", Intent(START, "Python")),
+        ("следующий вопрос", Intent(START)),
+        ("дай подсказку к последнему вопросу", Intent(HINT)),
+        ("покажи эталонный ответ к последнему вопросу", Intent(REFERENCE)),
+        ("оцени мой последний ответ по 10-балльной шкале и дай фидбек", Intent(EVALUATE)),
+        ("Java", Intent(TRACK, "Java")),
+        ("давай по kubernetes", Intent(TRACK, "DevOps")),
+        ("рестарт подов", Intent(CHAT)),
+        ("", Intent(CHAT)),
+        # длинный ответ кандидата со словом "пример" — не команда
+        ("Например, list изменяемый, а tuple нет, поэтому tuple можно использовать как ключ словаря, "
+         "а для эталонный случай подходит list", Intent(CHAT)),
+    ],
+)
+def test_classify(text, expected):
+    assert classify(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text,free,awaiting",
+    [
+        # ключевые слова внутри других слов — не команды
+        ("Type hints и mypy", Intent(CHAT), Intent(CHAT)),
+        ("Через Docker volumes", Intent(TRACK, "DevOps"), Intent(CHAT)),
+        ("Использую React hooks", Intent(TRACK, "Frontend"), Intent(CHAT)),
+        ("Передача по reference", Intent(REFERENCE), Intent(CHAT)),
+        ("Нужно оценить сложность: O(n log n)", Intent(EVALUATE), Intent(CHAT)),
+        ("Start with a hash map", Intent(START), Intent(CHAT)),
+        # кнопки и команды целиком работают и в ожидании ответа
+        ("дай подсказку к последнему вопросу", Intent(HINT), Intent(HINT)),
+        ("Эталонный ответ!", Intent(REFERENCE), Intent(REFERENCE)),
+        ("оцени мой последний ответ по 10-балльной шкале и дай фидбек", Intent(EVALUATE), Intent(EVALUATE)),
+        ("Ещё вопрос", Intent(START), Intent(START)),
+    ],
+)
+def test_classify_while_question_awaits_answer(text, free, awaiting):
+    assert classify(text) == free
+    assert classify(text, awaiting_answer=True) == awaiting
+
+
+class CountingLLM:
+    model = "m"
+
+    def __init__(self, reply="ответ модели"):
+        self.reply = reply
+        self.calls = []
+
+    async def agenerate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls.append(max_output_tokens)
+        return self.reply, {"model": self.model}
+
+    async def astream_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls.append(max_output_tokens)
+        yield self.reply, {}
+        yield "", {"model": self.model}
+
+
+BANK = QuestionBank([Question("py-1", "Python", 1, "Что такое GIL?"), Question("gen-1", "Общее", 1, "Расскажи о себе")])
+
+
+def respond(service, state, text):
+    return asyncio.run(service.arespond([ChatMessage(role="user", content=text)], state))
+
+
+def test_session_flow_uses_tight_paths():
+    llm = CountingLLM('{"score": 9, "feedback": "хорошо", "improved_answer": "ещё лучше"}')
+    service = InterviewCoachService(llm=llm, bank=BANK)
+    state = {}
+
+    text, meta = respond(service, state, "python")
+    assert meta["intent"] == TRACK and state["track"] == "Python"
+
+    text, meta = respond(service, state, "старт")
+    assert "Что такое GIL?" in text
+    assert (meta["intent"], meta["source"], meta["question_id"]) == (START, "bank", "py-1")
+    assert llm.calls == []
+
+    respond(service, state, "GIL не даёт двум потокам одновременно исполнять байткод")
+    assert state["answer"].startswith("GIL не даёт")
+    assert llm.calls == [900]
+
+    _, meta = respond(service, state, "подсказка")
+    assert meta["intent"] == HINT
+    assert llm.calls[-1] == 300
+
+    text, meta = respond(service, state, "оцени мой ответ")
+    assert meta["score"] == 9
+    assert "9/10" in text
+    assert state["scores"] == [9]
+    assert llm.calls[-1] == 600
+
+
+def test_answer_is_scored_only_once():
+    llm = CountingLLM('{"score": 9, "feedback": "хорошо", "improved_answer": "ещё лучше"}')
+    service = InterviewCoachService(llm=llm, bank=BANK)
+    state = {}
+    respond(service, state, "старт python")
+    respond(service, state, "GIL не даёт двум потокам одновременно исполнять байткод")
+
+    _, meta = respond(service, state, "оценить")
+    assert meta["score"] == 9
+    text, meta = respond(service, state, "оценить")
+
+    assert text == NO_ANSWER_REPLY
+    assert meta["source"] == "router"
+    assert state["scores"] == [9]
+
+
+@pytest.mark.parametrize("answer", ["Через Docker volumes", "Передача по reference", "Start with a hash map"])
+def test_short_answer_to_pending_question_is_recorded(answer):
+    llm = CountingLLM()
+    service = InterviewCoachService(llm=llm, bank=BANK)
+    state = {}
+    respond(service, state, "старт python")
+
+    _, meta = respond(service, state, answer)
+
+    assert meta["intent"] == CHAT
+    assert state["answer"] == answer
+    assert state["track"] == "Python"
+    assert state["question_id"] == "py-1"
+
+
+def test_commands_without_question_do_not_call_llm():
+    llm = CountingLLM()
+    service = InterviewCoachService(llm=llm, bank=BANK)
+
+    for command in ("подсказка", "эталонный ответ", "оцени"):
+        _, meta = respond(service, {}, command)
+        assert meta["source"] == "router"
+    _, meta = respond(service, {"question_id": "py-1"}, "оцени")
+    assert meta["source"] == "router"
+    assert llm.calls == []
+
+
+def test_start_without_bank_falls_back_to_llm_and_remembers_question():
+    llm = CountingLLM("Вопрос: что такое замыкание?")
+    service = InterviewCoachService(llm=llm)
+    state = {}
+
+    text, meta = respond(service, state, "старт")
+
+    assert meta["intent"] == START
+    assert state["question_text"] == text
+    assert service.current_question(state) == text
+
+
+def test_stream_respond_routes_commands():
+    llm = CountingLLM()
+    service = InterviewCoachService(llm=llm, bank=BANK)
+    state = {"track": "Python"}
+
+    async def collect(text):
+        return [chunk async for chunk in service.astream_respond([ChatMessage(role="user", content=text)], state)]
+
+    chunks = asyncio.run(collect("старт"))
+    assert "Что такое GIL?" in chunks[0][0]
+    assert chunks[-1][1]["intent"] == START
+
+    chunks = asyncio.run(collect("мой ответ про GIL"))
+    assert chunks[-1][1]["intent"] == CHAT
+    assert state["answer"] == "мой ответ про GIL"
+    assert llm.calls == [900]
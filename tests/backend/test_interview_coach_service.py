@@ -127,7 +127,7 @@ def test_evaluate_fallback_when_not_json(monkeypatch):
     assert "Определи суть" in result.improved_answer
 
 
-def test_evaluate_invalid_json_missing_fields_raises(monkeypatch):
+def test_evaluate_missing_fields_triggers_single_repair(monkeypatch):
     fake_llm = FakeLLM()
     fake_llm.set_next(json.dumps({"score": 3}))
 
@@ -137,5 +137,242 @@ def test_evaluate_invalid_json_missing_fields_raises(monkeypatch):
 
     service = InterviewCoachService(llm=fake_llm)
 
-    with pytest.raises(TypeError):
-        service.evaluate("Вопрос", "Ответ")
\ No newline at end of file
+    result = service.evaluate("Вопрос", "Ответ")
+
+    assert len(fake_llm.calls) == 2
+    repair = fake_llm.calls[1]
+    assert repair["temperature"] == 0.0
+    assert '{"score": 3}' in repair["messages"][-1].content
+    assert "Ответ" not in repair["messages"][-1].content.split("Оценка:")[0]
+    assert result.score == 5
+
+
+def test_chat_trims_history_to_context_budget(monkeypatch):
+    from app.context import ContextWindow
+
+    fake_llm = FakeLLM()
+    fake_llm.set_next("ok")
+
+    import app.interview as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    window = ContextWindow(max_tokens=1000, summary_tokens=50)
+    service = InterviewCoachService(llm=fake_llm, context=window)
+
+    history = [ChatMessage(role="user", content="ответ " * 50) for _ in range(40)]
+    service.chat(history)
+
+    sent = fake_llm.calls[0]["messages"]
+    assert sent[0].content == SYSTEM_PROMPT
+    assert sent[-1] == history[-1]
+    assert len(sent) < len(history)
+    assert window.counter.count_all(sent) <= window.max_tokens
+
+
+def test_aevaluate_uses_async_provider(monkeypatch):
+    import asyncio
+
+    class AsyncFakeLLM:
+        def __init__(self):
+            self.calls = []
+
+        async def agenerate_text(self, messages, temperature: float, max_output_tokens: int):
+            self.calls.append(max_output_tokens)
+            return json.dumps({"score": 8, "feedback": "f", "improved_answer": "i"}), {}
+
+    import app.interview as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+    monkeypatch.setattr(mod, "EvaluateResponse", EvaluateResponse)
+
+    llm = AsyncFakeLLM()
+    result = asyncio.run(InterviewCoachService(llm=llm).aevaluate("Вопрос", "Ответ"))
+
+    assert result == EvaluateResponse(score=8, feedback="f", improved_answer="i")
+    assert llm.calls == [600]
+
+
+
+class ScriptedLLM(FakeLLM):
+    def __init__(self, *texts):
+        super().__init__()
+        self.texts = list(texts)
+
+    def generate_text(self, messages, temperature: float, max_output_tokens: int):
+        self.set_next(self.texts.pop(0))
+        return super().generate_text(messages, temperature, max_output_tokens)
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        '```json\n{"score": 7, "feedback": "ok", "improved_answer": "i"}\n```',
+        'Вот оценка: {"score": 7, "feedback": "ok", "improved_answer": "i"} — удачи!',
+        '{"score": "7/10", "feedback": "ok", "improved_answer": "i"}',
+        '{"score": 6.6, "feedback": "ok", "improved_answer": "i"}',
+    ],
+)
+def test_evaluate_tolerates_wrapped_json(monkeypatch, raw):
+    from app.parsing import evaluation_stats
+
+    import app.interview as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+    monkeypatch.setattr(evaluation_stats, "parsed", 0)
+
+    fake_llm = ScriptedLLM(raw)
+    result = InterviewCoachService(llm=fake_llm).evaluate("Вопрос", "Ответ")
+
+    assert result.score == 7
+    assert result.feedback == "ok"
+    assert len(fake_llm.calls) == 1
+    assert evaluation_stats.parsed == 1
+
+
+def test_evaluate_repair_succeeds_and_is_counted(monkeypatch):
+    from app.parsing import ParseStats
+
+    import app.interview as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+    stats = ParseStats()
+    monkeypatch.setattr(mod, "evaluation_stats", stats)
+
+    fake_llm = ScriptedLLM(
+        "Оценка 8 из 10, хорошо",
+        '{"score": 8, "feedback": "хорошо", "improved_answer": "i"}',
+    )
+    result = InterviewCoachService(llm=fake_llm).evaluate("Вопрос", "Ответ")
+
+    assert result.score == 8
+    assert len(fake_llm.calls) == 2
+    assert stats.snapshot() == {"parsed": 0, "repaired": 1, "failed": 0, "retries": 1, "failure_rate": 1.0}
+
+
+def test_unparseable_evaluation_is_not_replayed_from_cache(monkeypatch):
+    from app.cache import ResponseCache
+    from app.parsing import ParseStats
+
+    import app.interview as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+    stats = ParseStats()
+    monkeypatch.setattr(mod, "evaluation_stats", stats)
+
+    class CacheableLLM(ScriptedLLM):
+        # CachedProvider всегда передаёт extra
+        def generate_text(self, messages, temperature: float, max_output_tokens: int, extra=None):
+            return super().generate_text(messages, temperature, max_output_tokens)
+
+    good = '{"score": 8, "feedback": "хорошо", "improved_answer": "i"}'
+    fake_llm = CacheableLLM("Оценка 8", "всё ещё не JSON", good)
+    service = InterviewCoachService(llm=fake_llm, cache=ResponseCache())
+
+    assert service.evaluate("Вопрос", "Ответ").score == 5
+    # битые ответы в кэш не попали: второй раз идём в апстрим и получаем настоящую оценку
+    assert service.evaluate("Вопрос", "Ответ").score == 8
+    assert len(fake_llm.calls) == 3
+    # третий раз — из кэша, статистика разбора его не считает
+    assert service.evaluate("Вопрос", "Ответ").score == 8
+    assert len(fake_llm.calls) == 3
+    assert stats.snapshot() == {"parsed": 1, "repaired": 0, "failed": 1, "retries": 1, "failure_rate": 0.5}
+
+
+def test_evaluate_requests_json_mode_when_provider_supports_it(monkeypatch):
+    import app.interview as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    class JsonModeLLM:
+        json_mode = {"response_format": {"type": "json_object"}}
+
+        def __init__(self):
+            self.extras = []
+
+        def generate_text(self, messages, temperature: float, max_output_tokens: int, extra=None):
+            self.extras.append(extra)
+            return json.dumps({"score": 4, "feedback": "f", "improved_answer": "i"}), {}
+
+    llm = JsonModeLLM()
+    InterviewCoachService(llm=llm).evaluate("Вопрос", "Ответ")
+
+    assert llm.extras == [{"response_format": {"type": "json_object"}}]
+
+
+def test_actions_use_their_own_routes(monkeypatch):
+    import app.interview as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    class RouterLLM:
+        def __init__(self, action="chat", log=None):
+            self.action = action
+            self.log = [] if log is None else log
+
+        def for_action(self, action):
+            return RouterLLM(action, self.log)
+
+        def generate_text(self, messages, temperature: float, max_output_tokens: int):
+            self.log.append(self.action)
+            if self.action == "evaluate":
+                return json.dumps({"score": 6, "feedback": "f", "improved_answer": "i"}), {}
+            return f"{self.action}: {messages[-1].content}", {"route": self.action}
+
+    llm = RouterLLM()
+    service = InterviewCoachService(llm=llm)
+
+    hint, meta = service.hint("Что такое GIL?")
+    reference, _ = service.reference_answer("Что такое GIL?")
+    service.chat([ChatMessage(role="user", content="старт")])
+    service.evaluate("Вопрос", "Ответ")
+
+    assert hint.startswith("hint: ") and "Что такое GIL?" in hint
+    assert meta == {"route": "hint"}
+    assert reference.startswith("reference: ")
+    assert llm.log == ["hint", "reference", "chat", "evaluate"]
+
+
+def test_chat_puts_track_preamble_after_shared_system_prompt(monkeypatch):
+    fake_llm = FakeLLM()
+    fake_llm.set_next("ok")
+
+    import app.interview as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    service = InterviewCoachService(llm=fake_llm)
+    service.chat([ChatMessage(role="user", content="старт")], meta={"track": "backend", "level": 2})
+    service.chat([ChatMessage(role="user", content="старт")], meta={"track": "Backend ", "level": "2"})
+
+    first, second = (call["messages"] for call in fake_llm.calls)
+    assert first == second
+    assert [m.role for m in first] == ["system", "system", "user"]
+    assert first[0].content == SYSTEM_PROMPT
+    assert "Backend" in first[1].content
+
+
+def test_evaluate_skips_llm_for_empty_answer_when_prescorer_is_set(monkeypatch):
+    from app.prescore import Prescorer
+
+    fake_llm = FakeLLM()
+    service = InterviewCoachService(llm=fake_llm, prescorer=Prescorer())
+
+    result = service.evaluate("Что такое GIL?", "не знаю")
+
+    assert fake_llm.calls == []
+    assert result.score == 1
+    assert result.feedback
+
+
+def test_prescored_evaluation_looks_up_reference_once(monkeypatch):
+    from app.prescore import Prescorer
+
+    class CountingPrecomputed:
+        def __init__(self):
+            self.lookups = []
+
+        def get(self, kind, question):
+            self.lookups.append(kind)
+            return "Эталон про GIL", {"source": "precomputed"}
+
+    precomputed = CountingPrecomputed()
+    service = InterviewCoachService(llm=FakeLLM(), prescorer=Prescorer(), precomputed=precomputed)
+
+    result = service.evaluate("Что такое GIL?", "не знаю")
+
+    assert result.improved_answer == "Эталон про GIL"
+    # второй поиск посчитался бы лишним попаданием в coach_precomputed_hits_total
+    assert precomputed.lookups == ["reference"]
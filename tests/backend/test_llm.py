@@ -180,4 +180,252 @@ def test_generate_text_passes_extra_kwargs(monkeypatch):
 
     call = dummy_client.responses.calls[0]
     assert call["timeout"] == 10
-    assert call["metadata"] == {"a": 1}
\ No newline at end of file
+    assert call["metadata"] == {"a": 1}
+
+def test_agenerate_text_uses_async_client(monkeypatch):
+    import asyncio
+
+    monkeypatch.setenv("OPENAI_API_KEY", "env_key")
+
+    mod = import_llm_module(monkeypatch)
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    class OpenAIStub:
+        def __init__(self, api_key):
+            self.responses = DummyResponses()
+
+    async_calls: List[Dict[str, Any]] = []
+
+    class AsyncResponses:
+        async def create(self, **kwargs):
+            async_calls.append(dict(kwargs))
+            return DummyRespWithText("async hello", resp_id="resp_a")
+
+    class AsyncOpenAIStub:
+        def __init__(self, api_key, http_client):
+            self.api_key = api_key
+            self.http_client = http_client
+            self.responses = AsyncResponses()
+
+    monkeypatch.setattr(mod, "OpenAI", OpenAIStub)
+    monkeypatch.setattr(mod, "AsyncOpenAI", AsyncOpenAIStub)
+
+    provider = mod.OpenAIResponsesProvider(model="test-model", api_key="k")
+
+    text, meta = asyncio.run(
+        provider.agenerate_text([ChatMessage(role="user", content="hi")], max_output_tokens=50)
+    )
+
+    assert text == "async hello"
+    assert meta == {"response_id": "resp_a", "model": "test-model"}
+    assert async_calls[0]["max_output_tokens"] == 50
+    assert async_calls[0]["input"] == [{"role": "user", "content": "hi"}]
+    assert provider.async_client is provider.async_client
+    assert provider.async_client.http_client is mod.shared_async_http_client()
+    assert provider.client.responses.calls == []
+
+
+def test_default_agenerate_text_runs_sync_provider_in_thread():
+    import asyncio
+    import threading
+
+    mod = import_llm_module(None)
+
+    seen = {}
+
+    class SyncOnly(mod.LLMProvider):
+        def generate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+            seen["thread"] = threading.current_thread()
+            seen["kwargs"] = {"temperature": temperature, "max_output_tokens": max_output_tokens, "extra": extra}
+            return "sync", {}
+
+    text, _ = asyncio.run(SyncOnly().agenerate_text([], temperature=0.1, max_output_tokens=7))
+
+    assert text == "sync"
+    assert seen["thread"] is not threading.main_thread()
+    assert seen["kwargs"] == {"temperature": 0.1, "max_output_tokens": 7, "extra": None}
+
+
+def test_async_http_client_pool_limits_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_CONNECTIONS", "321")
+    monkeypatch.setenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "64")
+
+    mod = import_llm_module(monkeypatch)
+    http_client = mod.build_async_http_client()
+
+    pool = http_client._transport._pool
+    assert pool._max_connections == 321
+    assert pool._max_keepalive_connections == 64
+
+
+def test_astream_text_yields_deltas_then_meta(monkeypatch):
+    import asyncio
+
+    monkeypatch.setenv("OPENAI_API_KEY", "env_key")
+
+    mod = import_llm_module(monkeypatch)
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    def event(type_, **fields):
+        return type("Event", (), {"type": type_, **fields})()
+
+    captured = {}
+
+    class AsyncResponses:
+        async def create(self, **kwargs):
+            captured.update(kwargs)
+
+            async def gen():
+                yield event("response.created")
+                yield event("response.output_text.delta", delta="при")
+                yield event("response.output_text.delta", delta="вет")
+                yield event("response.completed", response=type("R", (), {"id": "resp_s"})())
+
+            return gen()
+
+    class AsyncOpenAIStub:
+        def __init__(self, api_key, http_client):
+            self.responses = AsyncResponses()
+
+    monkeypatch.setattr(mod, "OpenAI", lambda api_key: None)
+    monkeypatch.setattr(mod, "AsyncOpenAI", AsyncOpenAIStub)
+
+    provider = mod.OpenAIResponsesProvider(model="test-model", api_key="k")
+
+    async def collect():
+        return [item async for item in provider.astream_text([ChatMessage(role="user", content="hi")])]
+
+    items = asyncio.run(collect())
+
+    assert items == [("при", {}), ("вет", {}), ("", {"response_id": "resp_s", "model": "test-model"})]
+    assert captured["stream"] is True
+
+
+def test_default_astream_text_yields_whole_text():
+    import asyncio
+
+    mod = import_llm_module(None)
+
+    class SyncOnly(mod.LLMProvider):
+        def generate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+            return "целиком", {"model": "m"}
+
+    async def collect():
+        return [item async for item in SyncOnly().astream_text([])]
+
+    assert asyncio.run(collect()) == [("целиком", {}), ("", {"model": "m"})]
+
+
+class DummyChatCompletions:
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+
+    async def create(self, **kwargs):
+        self.calls.append(dict(kwargs))
+        if kwargs.get("stream"):
+            async def gen():
+                for piece in ["a", None, "b"]:
+                    delta = type("Delta", (), {"content": piece})()
+                    yield type("Chunk", (), {"id": "chatcmpl_s", "choices": [type("C", (), {"delta": delta})()]})()
+
+            return gen()
+        message = type("Message", (), {"content": "chat reply"})()
+        return type("Resp", (), {"id": "chatcmpl_1", "choices": [type("C", (), {"message": message})()]})()
+
+
+def make_chat_provider(mod):
+    completions = DummyChatCompletions()
+    async_client = type("AsyncClient", (), {"chat": type("Chat", (), {"completions": completions})()})()
+    return mod.OpenAIChatProvider(async_client=async_client, model="router-model"), completions
+
+
+def test_chat_provider_agenerate_text_maps_to_chat_completions(monkeypatch):
+    import asyncio
+
+    mod = import_llm_module(monkeypatch)
+    provider, completions = make_chat_provider(mod)
+
+    text, meta = asyncio.run(
+        provider.agenerate_text([ChatMessage(role="user", content="hi")], temperature=0.2, max_output_tokens=42)
+    )
+
+    assert text == "chat reply"
+    assert meta == {"response_id": "chatcmpl_1", "model": "router-model"}
+    assert completions.calls[0] == {
+        "model": "router-model",
+        "messages": [{"role": "user", "content": "hi"}],
+        "temperature": 0.2,
+        "max_tokens": 42,
+    }
+
+
+def test_chat_provider_astream_text(monkeypatch):
+    import asyncio
+
+    mod = import_llm_module(monkeypatch)
+    provider, _ = make_chat_provider(mod)
+
+    async def collect():
+        return [item async for item in provider.astream_text([ChatMessage(role="user", content="hi")])]
+
+    assert asyncio.run(collect()) == [
+        ("a", {}),
+        ("b", {}),
+        ("", {"response_id": "chatcmpl_s", "model": "router-model"}),
+    ]
+
+
+def test_chat_provider_sync_requires_client(monkeypatch):
+    mod = import_llm_module(monkeypatch)
+    provider, _ = make_chat_provider(mod)
+
+    with pytest.raises(RuntimeError):
+        provider.generate_text([ChatMessage(role="user", content="hi")])
+
+
+def test_usage_meta_reports_cached_prompt_tokens(monkeypatch):
+    mod = import_llm_module(monkeypatch)
+
+    chat_usage = type(
+        "Usage",
+        (),
+        {
+            "prompt_tokens": 1500,
+            "completion_tokens": 80,
+            "prompt_tokens_details": type("D", (), {"cached_tokens": 1280})(),
+        },
+    )()
+    responses_usage = type(
+        "Usage",
+        (),
+        {"input_tokens": 900, "output_tokens": 10, "input_tokens_details": type("D", (), {"cached_tokens": 0})()},
+    )()
+
+    assert mod.usage_meta(None) == {}
+    assert mod.usage_meta(chat_usage) == {"prompt_tokens": 1500, "completion_tokens": 80, "cached_tokens": 1280}
+    assert mod.usage_meta(responses_usage) == {"prompt_tokens": 900, "completion_tokens": 10, "cached_tokens": 0}
+
+
+def test_chat_provider_meta_includes_usage(monkeypatch):
+    import asyncio
+
+    mod = import_llm_module(monkeypatch)
+    provider, completions = make_chat_provider(mod)
+
+    usage = type("Usage", (), {"prompt_tokens": 10, "completion_tokens": 2, "prompt_tokens_details": None})()
+    message = type("Message", (), {"content": "x"})()
+    response = type("Resp", (), {"id": "c1", "usage": usage, "choices": [type("C", (), {"message": message})()]})()
+
+    async def create(**kwargs):
+        return response
+
+    completions.create = create
+    _, meta = asyncio.run(provider.agenerate_text([ChatMessage(role="user", content="hi")]))
+
+    assert meta == {
+        "response_id": "c1",
+        "model": "router-model",
+        "prompt_tokens": 10,
+        "completion_tokens": 2,
+        "cached_tokens": 0,
+    }
@@ -1,3 +1,6 @@
+import asyncio
+import json
+import pytest
 from fastapi.testclient import TestClient
 import importlib
 
@@ -5,12 +8,13 @@ class DummyCompletions:
     def __init__(self, text_to_return: str):
         self._text_to_return = text_to_return
 
-    def create(self, model, messages, temperature=0.7):
+    async def create(self, model, messages, temperature=0.7, max_tokens=None):
         # Мини-проверки, что эндпоинт прокидывает данные
         assert isinstance(model, str)
         assert model != ""
         assert isinstance(messages, list)
-        assert temperature == 0.7
+        assert temperature == 0.3
+        assert max_tokens == 900
 
         # Возвращаем объект, похожий на ответ openai-клиента
         message_obj = type("Message", (), {"content": self._text_to_return})()
@@ -55,7 +59,10 @@ def test_chat_returns_reply(monkeypatch):
 
     response = client.post("/api/chat", json=payload)
     assert response.status_code == 200
-    assert response.json() == {"reply": "Тестовый ответ!"}
+    data = response.json()
+    assert data["reply"] == "Тестовый ответ!"
+    assert data["session_id"].startswith("sess_")
+    assert data["meta"]["model"] == "mistralai/mistral-7b-instruct"
 
 
 def test_chat_uses_messages_from_request(monkeypatch):
@@ -64,9 +71,9 @@ def test_chat_uses_messages_from_request(monkeypatch):
     captured = {"messages": None}
 
     class CapturingCompletions(DummyCompletions):
-        def create(self, model, messages, temperature=0.7):
+        async def create(self, model, messages, temperature=0.7, max_tokens=None):
             captured["messages"] = messages
-            return super().create(model, messages, temperature)
+            return await super().create(model, messages, temperature, max_tokens)
 
     class CapturingClient:
         def __init__(self):
@@ -85,7 +92,13 @@ def test_chat_uses_messages_from_request(monkeypatch):
     response = client.post("/api/chat", json=payload)
     assert response.status_code == 200
     assert response.json()["reply"] == "ok"
-    assert captured["messages"] == payload["messages"]
+
+    # Клиентский system заменяется серверным SYSTEM_PROMPT
+    from app.interview import SYSTEM_PROMPT
+    assert captured["messages"] == [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": "Скажи привет"},
+    ]
 
 
 def test_chat_validation_error_without_messages(monkeypatch):
@@ -117,4 +130,568 @@ def test_index_route_exists(monkeypatch):
     # Поэтому проверяем корректнее: что роут существует в app.routes,
     # а не "файл реально лежит в FS".
     paths = [r.path for r in main_module.app.routes]
-    assert "/" in paths
\ No newline at end of file
+    assert "/" in paths
+    # рендер ленты и хранилище истории — отдельные файлы рядом с index.html, там же бенчмарк рендера
+    assert "/chat-view.js" in paths
+    assert "/chat-store.js" in paths
+    assert "/bench.html" in paths
+
+def test_chat_endpoint_is_async(monkeypatch):
+    import asyncio
+
+    main_module = load_main_module(monkeypatch)
+
+    assert asyncio.iscoroutinefunction(main_module.chat)
+    assert main_module.get_client().__class__.__name__ == "AsyncOpenAI"
+    # сбор метрик читает состояние event loop — в пул потоков его отдавать нельзя
+    assert asyncio.iscoroutinefunction(main_module.prometheus_metrics)
+
+
+def test_lifespan_creates_client_and_reports_startup(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+    # на импорте клиента ещё нет: его создаёт воркер, уже после fork
+    assert main_module.client is None
+    assert main_module.startup_seconds["import"] > 0
+
+    with TestClient(main_module.app) as client:
+        assert main_module.client.__class__.__name__ == "AsyncOpenAI"
+        body = client.get("/metrics").text
+        assert 'coach_startup_seconds{phase="import"}' in body
+        assert 'coach_startup_seconds{phase="lifespan"}' in body
+
+
+class DummyStreamingCompletions:
+    def __init__(self, pieces):
+        self._pieces = pieces
+        self.calls = []
+
+    async def create(self, model, messages, temperature=0.7, max_tokens=None, stream=False, stream_options=None):
+        self.calls.append({"model": model, "messages": messages, "stream": stream, "stream_options": stream_options})
+
+        async def gen():
+            for piece in self._pieces:
+                delta = type("Delta", (), {"content": piece})()
+                choice = type("Choice", (), {"delta": delta})()
+                yield type("Chunk", (), {"choices": [choice]})()
+            details = type("Details", (), {"cached_tokens": 128})()
+            usage = type("Usage", (), {"prompt_tokens": 200, "completion_tokens": 3, "prompt_tokens_details": details})()
+            yield type("Chunk", (), {"choices": [], "usage": usage})()
+
+        return gen()
+
+
+def parse_sse(text: str):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_forwards_deltas_and_reports_ttft(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+
+    completions = DummyStreamingCompletions(["Прив", None, "ет", "!"])
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": completions})()})()
+
+    client = TestClient(main_module.app)
+    payload = {"messages": [{"role": "user", "content": "Привет"}]}
+
+    response = client.post("/api/chat/stream", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    assert [e for e in events if e[0] == "delta"] == [
+        ("delta", {"delta": "Прив"}),
+        ("delta", {"delta": "ет"}),
+        ("delta", {"delta": "!"}),
+    ]
+    name, data = events[-1]
+    assert name == "done"
+    assert data["session_id"].startswith("sess_")
+    assert data["meta"]["ttft_ms"] is not None
+    assert data["meta"]["ttft_ms"] <= data["meta"]["total_ms"]
+    assert completions.calls[0]["stream"] is True
+    assert completions.calls[0]["stream_options"] == {"include_usage": True}
+    assert data["meta"]["cached_tokens"] == 128
+    assert data["meta"]["prompt_tokens"] == 200
+    assert completions.calls[0]["messages"][1:] == payload["messages"]
+
+    assert [m.content for m in main_module.store.get_messages(data["session_id"])] == ["Привет", "Привет!"]
+
+
+def test_chat_stream_reports_upstream_error_as_event(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+
+    class BrokenCompletions:
+        async def create(self, model, messages, temperature=0.7, max_tokens=None, stream=False, stream_options=None):
+            async def gen():
+                delta = type("Delta", (), {"content": "частично"})()
+                yield type("Chunk", (), {"choices": [type("Choice", (), {"delta": delta})()]})()
+                raise RuntimeError("upstream closed")
+
+            return gen()
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": BrokenCompletions()})()})()
+
+    client = TestClient(main_module.app)
+    response = client.post("/api/chat/stream", json={"messages": [{"role": "user", "content": "x"}]})
+
+    events = parse_sse(response.text)
+    assert events[0] == ("delta", {"delta": "частично"})
+    assert events[-1] == ("error", {"error": "upstream closed"})
+
+
+def test_chat_session_keeps_history_server_side(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+
+    seen = []
+
+    class RecordingCompletions:
+        async def create(self, model, messages, temperature=0.7, max_tokens=None):
+            seen.append(messages)
+            message_obj = type("Message", (), {"content": f"ответ {len(seen)}"})()
+            return type("Response", (), {"choices": [type("Choice", (), {"message": message_obj})()]})()
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": RecordingCompletions()})()})()
+
+    client = TestClient(main_module.app)
+    # "старт" теперь отвечает банк вопросов без LLM, поэтому диалог начинается с обычной реплики
+    first = client.post("/api/chat", json={"messages": [{"role": "user", "content": "привет"}]}).json()
+    second = client.post(
+        "/api/chat",
+        json={"session_id": first["session_id"], "messages": [{"role": "user", "content": "мой ответ"}]},
+    ).json()
+
+    assert second["session_id"] == first["session_id"]
+    assert second["reply"] == "ответ 2"
+    assert [m["content"] for m in seen[1][1:]] == ["привет", "ответ 1", "мой ответ"]
+
+
+def test_chat_unknown_session_returns_409(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+    main_module.client = DummyClient("не должен вызываться")
+
+    client = TestClient(main_module.app)
+    response = client.post(
+        "/api/chat",
+        json={"session_id": "sess_missing", "messages": [{"role": "user", "content": "x"}]},
+    )
+
+    assert response.status_code == 409
+
+
+def test_chat_failed_upstream_does_not_store_turn(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+
+    class FailingCompletions:
+        async def create(self, model, messages, temperature=0.7, max_tokens=None):
+            raise RuntimeError("upstream down")
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": FailingCompletions()})()})()
+
+    first_sid = main_module.store.get_or_create(None)
+    client = TestClient(main_module.app, raise_server_exceptions=False)
+    response = client.post(
+        "/api/chat",
+        json={"session_id": first_sid, "messages": [{"role": "user", "content": "x"}]},
+    )
+
+    assert response.status_code == 500
+    assert main_module.store.get_messages(first_sid) == []
+
+
+def test_evaluate_batch_streams_results_with_bounded_concurrency(monkeypatch):
+    import asyncio
+
+    main_module = load_main_module(monkeypatch)
+
+    state = {"in_flight": 0, "peak": 0}
+
+    class EvaluatingCompletions:
+        async def create(self, model, messages, temperature=0.7, max_tokens=None, response_format=None):
+            assert response_format == {"type": "json_object"}
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            try:
+                await asyncio.sleep(0.01)
+                prompt = messages[-1]["content"]
+                if "сломай" in prompt:
+                    raise RuntimeError("upstream 500")
+                score = int(prompt.split("балл ")[1][0])
+                content = json.dumps({"score": score, "feedback": "ok", "improved_answer": "лучше"})
+            finally:
+                state["in_flight"] -= 1
+            message_obj = type("Message", (), {"content": content})()
+            return type("Response", (), {"choices": [type("Choice", (), {"message": message_obj})()]})()
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": EvaluatingCompletions()})()})()
+
+    items = [{"question": f"Вопрос {i}", "answer": f"балл {i}"} for i in range(6)]
+    items[3]["answer"] = "сломай"
+
+    client = TestClient(main_module.app)
+    response = client.post("/api/evaluate/batch", json={"items": items, "concurrency": 2})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.strip().split("\n")]
+
+    assert rows[-1] == {"done": True, "total": 6, "failed": 1}
+    by_index = {row["index"]: row for row in rows[:-1]}
+    assert sorted(by_index) == list(range(6))
+    assert by_index[3] == {"index": 3, "error": "upstream 500"}
+    assert by_index[5]["result"] == {"score": 5, "feedback": "ok", "improved_answer": "лучше"}
+    assert state["peak"] == 2
+
+
+def test_evaluate_batch_validates_size(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+
+    client = TestClient(main_module.app)
+    assert client.post("/api/evaluate/batch", json={"items": []}).status_code == 422
+    too_many = [{"question": "q", "answer": "a"}] * 51
+    assert client.post("/api/evaluate/batch", json={"items": too_many}).status_code == 422
+
+
+def test_chat_maps_exhausted_upstream_to_503(monkeypatch):
+    monkeypatch.setenv("LLM_RETRIES", "1")
+    monkeypatch.setenv("LLM_RETRY_BASE_DELAY", "0")
+    main_module = load_main_module(monkeypatch)
+
+    class RateLimitedCompletions:
+        calls = 0
+
+        async def create(self, model, messages, temperature=0.7, max_tokens=None):
+            RateLimitedCompletions.calls += 1
+            error = RuntimeError("rate limited")
+            error.status_code = 429
+            error.response = type("Response", (), {"headers": {"retry-after": "0"}})()
+            raise error
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": RateLimitedCompletions()})()})()
+
+    client = TestClient(main_module.app)
+    response = client.post("/api/chat", json={"messages": [{"role": "user", "content": "x"}]})
+
+    assert response.status_code == 503
+    assert "rate limited" in response.json()["detail"]
+    assert RateLimitedCompletions.calls == 2
+
+
+def test_hint_routes_to_configured_model_and_falls_back(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTES", json.dumps({"hint": ["small-model", "big-model"]}))
+    monkeypatch.setenv("LLM_RETRIES", "0")
+    main_module = load_main_module(monkeypatch, model_name="big-model")
+
+    seen = []
+
+    class RoutedCompletions:
+        async def create(self, model, messages, temperature=0.7, max_tokens=None):
+            seen.append(model)
+            if model == "small-model":
+                error = RuntimeError("small overloaded")
+                error.status_code = 503
+                raise error
+            message_obj = type("Message", (), {"content": f"подсказка от {model}"})()
+            return type("Response", (), {"choices": [type("Choice", (), {"message": message_obj})()]})()
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": RoutedCompletions()})()})()
+
+    client = TestClient(main_module.app)
+    response = client.post("/api/hint", json={"question": "Что такое GIL?"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["text"] == "подсказка от big-model"
+    assert data["meta"]["model"] == "big-model"
+    assert data["meta"]["fallbacks"] == 1
+    assert seen == ["small-model", "big-model"]
+    assert main_module.model_stats.snapshot()["small-model"]["errors"] == 1
+
+
+def test_metrics_endpoint_exposes_request_and_llm_metrics(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+
+    class UsageCompletions:
+        async def create(self, model, messages, temperature=0.7, max_tokens=None):
+            usage = type("Usage", (), {"prompt_tokens": 300, "completion_tokens": 5, "prompt_tokens_details": None})()
+            message_obj = type("Message", (), {"content": "ok"})()
+            choice = type("Choice", (), {"message": message_obj})()
+            return type("Response", (), {"id": "c1", "usage": usage, "choices": [choice]})()
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": UsageCompletions()})()})()
+
+    client = TestClient(main_module.app)
+    response = client.post("/api/chat", json={"messages": [{"role": "user", "content": "x"}], "meta": {"timing": True}})
+    assert response.status_code == 200
+    timing = response.json()["meta"]["timing"]
+    assert set(timing) == {"queue_ms", "store_ms", "upstream_ms"}
+
+    scrape = client.get("/metrics")
+    assert scrape.status_code == 200
+    assert scrape.headers["content-type"].startswith("text/plain")
+    body = scrape.text
+    assert 'coach_http_request_duration_seconds_count{route="/api/chat",status="200"} 1' in body
+    assert 'coach_request_phase_seconds_count{route="/api/chat",phase="serialize"} 1' in body
+    assert 'coach_llm_tokens_total{model="mistralai/mistral-7b-instruct",kind="prompt"} 300' in body
+    assert "coach_store_sessions 1" in body
+    assert "coach_store_bytes " in body
+    assert "coach_store_trimmed_messages_total 0" in body
+    assert "coach_response_cache_misses_total 0" in body
+
+
+def test_chat_rate_limited_per_session_returns_429(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_SESSION_PER_MINUTE", "1")
+    monkeypatch.setenv("RATE_LIMIT_SESSION_BURST", "2")
+    main_module = load_main_module(monkeypatch)
+    main_module.client = DummyClient("ok")
+
+    client = TestClient(main_module.app)
+    first = client.post("/api/chat", json={"messages": [{"role": "user", "content": "x"}]}).json()
+    payload = {"session_id": first["session_id"], "messages": [{"role": "user", "content": "y"}]}
+
+    assert client.post("/api/chat", json=payload).status_code == 200
+    assert client.post("/api/chat", json=payload).status_code == 200
+    limited = client.post("/api/chat", json=payload)
+
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    # другая сессия с того же адреса не страдает
+    assert client.post("/api/chat", json={"messages": [{"role": "user", "content": "x"}]}).status_code == 200
+    assert 'coach_rejected_total{reason="RateLimited"} 1' in client.get("/metrics").text
+
+
+def test_chat_rejected_when_admission_queue_is_full(monkeypatch):
+    monkeypatch.setenv("ADMISSION_MAX_IN_FLIGHT", "1")
+    monkeypatch.setenv("ADMISSION_MAX_QUEUE", "0")
+    main_module = load_main_module(monkeypatch)
+    main_module.client = DummyClient("ok")
+
+    main_module.admission.in_flight["chat"] = 1
+    client = TestClient(main_module.app)
+    response = client.post("/api/chat", json={"messages": [{"role": "user", "content": "x"}]})
+
+    assert response.status_code == 429
+    assert "overloaded" in response.json()["detail"]
+
+
+def test_admission_wait_is_reported_as_queue_phase(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+    main_module.client = DummyClient("ok")
+    acquire = main_module.admission.acquire
+
+    async def slow_acquire(kind="chat"):
+        await asyncio.sleep(0.05)
+        return await acquire(kind)
+
+    monkeypatch.setattr(main_module.admission, "acquire", slow_acquire)
+    client = TestClient(main_module.app)
+    response = client.post("/api/chat", json={"messages": [{"role": "user", "content": "x"}], "meta": {"timing": True}})
+
+    # ожидание слота апстрима — очередь, а не serialize
+    assert response.json()["meta"]["timing"]["queue_ms"] >= 50
+    sums = {
+        line.split('phase="')[1].split('"')[0]: float(line.rsplit(" ", 1)[1])
+        for line in client.get("/metrics").text.splitlines()
+        if line.startswith('coach_request_phase_seconds_sum{route="/api/chat"')
+    }
+    assert sums["queue"] >= 0.05
+    assert sums["serialize"] < 0.05
+
+
+def test_chat_idempotency_key_replays_reply(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+    calls = []
+
+    class CountingCompletions(DummyCompletions):
+        async def create(self, model, messages, temperature=0.7, max_tokens=None):
+            calls.append(messages)
+            return await super().create(model, messages, temperature, max_tokens)
+
+    main_module.client = DummyClient("ok")
+    main_module.client.chat.completions = CountingCompletions("ответ")
+
+    client = TestClient(main_module.app)
+    payload = {"messages": [{"role": "user", "content": "привет"}]}
+    headers = {"Idempotency-Key": "k-1"}
+    first = client.post("/api/chat", json=payload, headers=headers)
+    second = client.post("/api/chat", json=payload, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert len(calls) == 1
+    assert second.json() == first.json()
+    assert "Idempotent-Replayed" not in first.headers
+    assert second.headers["Idempotent-Replayed"] == "true"
+    # в сторе один ход, а не два
+    assert len(main_module.store.get_messages(first.json()["session_id"])) == 2
+
+    conflict = client.post("/api/chat", json={"messages": [{"role": "user", "content": "другое"}]}, headers=headers)
+    assert conflict.status_code == 422
+    assert "coach_idempotent_replays_total 1" in client.get("/metrics").text
+
+
+def test_question_comes_from_bank_without_llm(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+
+    class FailingCompletions:
+        async def create(self, *args, **kwargs):
+            raise AssertionError("question must not call the LLM")
+
+    main_module.client = DummyClient("unused")
+    main_module.client.chat.completions = FailingCompletions()
+    client = TestClient(main_module.app)
+
+    first = client.post("/api/question", json={"track": "python", "level": 2})
+    assert first.status_code == 200
+    data = first.json()
+    assert data["question"]["track"] == "Python"
+    assert data["question"]["level"] == 2
+    assert data["question"]["text"] in data["reply"]
+
+    second = client.post("/api/question", json={"session_id": data["session_id"], "score": 9}).json()
+    assert second["question"]["id"] != data["question"]["id"]
+    history = main_module.store.get_messages(data["session_id"])
+    assert [m.content for m in history] == [data["reply"], second["reply"]]
+
+    assert client.post("/api/question", json={"session_id": "sess_missing"}).status_code == 409
+    assert 'coach_bank_questions_total{track="Python"} 2' in client.get("/metrics").text
+
+
+def test_evaluate_batch_prescores_trivial_answers_without_llm(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+    calls = []
+
+    class EvaluatingCompletions:
+        async def create(self, model, messages, temperature=0.7, max_tokens=None, response_format=None):
+            calls.append(messages)
+            content = json.dumps({"score": 7, "feedback": "ok", "improved_answer": "лучше"})
+            message_obj = type("Message", (), {"content": content})()
+            return type("Response", (), {"choices": [type("Choice", (), {"message": message_obj})()]})()
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": EvaluatingCompletions()})()})()
+    items = [
+        {"question": "Что такое GIL?", "answer": "   "},
+        {"question": "Что такое GIL?", "answer": "не знаю"},
+        {"question": "Что такое GIL?", "answer": "Блокировка интерпретатора, мешает потокам"},
+    ]
+
+    client = TestClient(main_module.app)
+    response = client.post("/api/evaluate/batch", json={"items": items})
+    rows = [json.loads(line) for line in response.text.strip().split("\n")]
+
+    assert len(calls) == 1
+    assert rows[0]["source"] == rows[1]["source"] == "prescore"
+    assert (rows[0]["result"]["score"], rows[1]["result"]["score"]) == (0, 1)
+    # предварительный балл приходит раньше полной оценки
+    assert rows[2] == {"index": 2, "provisional": {"score": 3, "reason": "heuristic", "coverage": None}}
+    assert rows[3] == {"index": 2, "result": {"score": 7, "feedback": "ok", "improved_answer": "лучше"}}
+    assert rows[-1] == {"done": True, "total": 3, "failed": 0}
+    assert 'coach_prescore_total{reason="dont_know"} 1' in client.get("/metrics").text
+
+
+def test_chat_routes_commands_through_intents(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+    calls = []
+
+    class EvaluatingCompletions:
+        async def create(self, model, messages, temperature=0.7, max_tokens=None, response_format=None):
+            calls.append(max_tokens)
+            content = json.dumps({"score": 8, "feedback": "неплохо", "improved_answer": "лучше"})
+            message_obj = type("Message", (), {"content": content})()
+            return type("Response", (), {"choices": [type("Choice", (), {"message": message_obj})()]})()
+
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": EvaluatingCompletions()})()})()
+    client = TestClient(main_module.app)
+
+    def say(text, session_id=None):
+        return client.post(
+            "/api/chat", json={"session_id": session_id, "messages": [{"role": "user", "content": text}]}
+        ).json()
+
+    first = say("старт python")
+    sid = first["session_id"]
+    assert first["meta"]["intent"] == "start" and first["meta"]["source"] == "bank"
+    assert calls == []
+
+    say("GIL мешает потокам исполнять байткод параллельно", sid)
+    evaluated = say("оцени мой последний ответ", sid)
+
+    assert evaluated["meta"]["intent"] == "evaluate"
+    assert "8/10" in evaluated["reply"]
+    assert calls == [900, 600]
+    assert main_module.store.get_state(sid)["scores"] == [8]
+    assert 'coach_chat_intent_total{intent="start"} 1' in client.get("/metrics").text
+
+
+def test_chat_prompt_uses_session_track_and_level(monkeypatch):
+    main_module = load_main_module(monkeypatch)
+    sent = []
+
+    class CapturingCompletions(DummyCompletions):
+        async def create(self, model, messages, temperature=0.7, max_tokens=None):
+            sent.append(messages)
+            return await super().create(model, messages, temperature, max_tokens)
+
+    main_module.client = DummyClient("ok")
+    main_module.client.chat.completions = CapturingCompletions("ответ")
+    client = TestClient(main_module.app)
+
+    def say(text, session_id=None, meta=None):
+        payload = {"session_id": session_id, "messages": [{"role": "user", "content": text}], "meta": meta or {}}
+        return client.post("/api/chat", json=payload).json()
+
+    sid = say("python")["session_id"]
+    state = main_module.store.get_state(sid)
+    main_module.store.set_state(sid, {**state, "level": 3})
+    say("расскажи, как устроен сборщик мусора", sid)
+
+    # фронтенд не шлёт meta.track/level — преамбула берётся из состояния сессии
+    system = [m["content"] for m in sent[-1] if m["role"] == "system"]
+    assert "Направление собеседования: Python.\nУровень сложности вопросов: 3 из 5." in system
+
+    say("а что с циклическими ссылками?", sid, meta={"track": "java"})
+    system = [m["content"] for m in sent[-1] if m["role"] == "system"]
+    assert "Направление собеседования: Java.\nУровень сложности вопросов: 3 из 5." in system
+
+
+@pytest.mark.parametrize("backend, off_loop", [("memory", False), ("sqlite", True)])
+def test_store_and_limiter_io_runs_off_loop_only_for_sqlite(monkeypatch, tmp_path, backend, off_loop):
+    monkeypatch.setenv("STORE_BACKEND", backend)
+    monkeypatch.setenv("STORE_PATH", str(tmp_path / "sessions.db"))
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", backend)
+    monkeypatch.setenv("RATE_LIMIT_PATH", str(tmp_path / "ratelimit.db"))
+    main_module = load_main_module(monkeypatch)
+    main_module.client = DummyClient("ok")
+    calls = []
+
+    def spy(obj, name):
+        original = getattr(obj, name)
+
+        def wrapper(*args, **kwargs):
+            try:
+                on_loop = asyncio.get_running_loop() is not None
+            except RuntimeError:
+                on_loop = False
+            calls.append((name, on_loop))
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(obj, name, wrapper)
+
+    for name in ("get_or_create", "extend", "set_state"):
+        spy(main_module.store, name)
+    spy(main_module.rate_limiter, "check")
+
+    client = TestClient(main_module.app)
+    sid = client.post("/api/chat", json={"messages": [{"role": "user", "content": "x"}]}).json()["session_id"]
+    client.post("/api/question", json={"session_id": sid})
+    completions = DummyStreamingCompletions(["о", "к"])
+    main_module.client = type("Client", (), {"chat": type("Chat", (), {"completions": completions})()})()
+    payload = {"session_id": sid, "messages": [{"role": "user", "content": "y"}]}
+    assert parse_sse(client.post("/api/chat/stream", json=payload).text)[-1][0] == "done"
+
+    # SQLite ждёт блокировку до busy_timeout — такие вызовы в пуле потоков asyncio.to_thread;
+    # стор и лимитер в памяти не потокобезопасны и остаются на event loop
+    assert {name for name, _ in calls} == {"get_or_create", "extend", "set_state", "check"}
+    assert {on_loop for _, on_loop in calls} == {not off_loop}
@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.metrics import MetricsMiddleware, Registry, mark_handler_start, phase, timing_meta
+
+
+def test_counter_and_callback_render_in_prometheus_format():
+    registry = Registry()
+    requests = registry.counter("demo_requests_total", "Requests", ("route",))
+    requests.labels("/a").inc()
+    requests.labels("/a").inc(2)
+    requests.labels('/b"x').inc()
+    registry.callback("demo_size", "Size", "gauge", lambda: 7)
+
+    text = registry.render()
+
+    assert "# TYPE demo_requests_total counter" in text
+    assert 'demo_requests_total{route="/a"} 3' in text
+    assert 'demo_requests_total{route="/b\\"x"} 1' in text
+    assert "# TYPE demo_size gauge\ndemo_size 7\n" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("demo_seconds", "Latency", ("route",))
+    child = latency.labels("/a")
+    for seconds in (0.003, 0.2, 0.2, 7.0, 120.0):
+        child.observe(seconds)
+
+    lines = registry.render().splitlines()
+
+    assert 'demo_seconds_bucket{route="/a",le="0.005"} 1' in lines
+    assert 'demo_seconds_bucket{route="/a",le="0.25"} 3' in lines
+    assert 'demo_seconds_bucket{route="/a",le="10"} 4' in lines
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 5' in lines
+    assert 'demo_seconds_count{route="/a"} 5' in lines
+    assert any(line.startswith('demo_seconds_sum{route="/a"} 127.40') for line in lines)
+
+
+def test_duplicate_metric_names_are_rejected():
+    registry = Registry()
+    registry.counter("x_total", "x")
+    with pytest.raises(ValueError):
+        registry.callback("x_total", "x", "counter", lambda: 1)
+
+
+def test_middleware_splits_request_into_phases():
+    registry = Registry()
+    requests = registry.histogram("req_seconds", "r", ("route", "status"))
+    phases = registry.histogram("phase_seconds", "p", ("route", "phase"))
+    seen = {}
+
+    async def app(scope, receive, send):
+        state = SimpleNamespace(**scope["state"])
+        mark_handler_start(state)
+        with phase(state, "upstream"):
+            await asyncio.sleep(0.02)
+        seen.update(timing_meta(state))
+        scope["route"] = SimpleNamespace(path="/api/x")
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    middleware = MetricsMiddleware(app, requests, phases)
+    asyncio.run(middleware({"type": "http"}, None, send))
+
+    assert set(seen) == {"queue_ms", "upstream_ms"}
+    assert seen["upstream_ms"] >= 20
+    assert requests.labels("/api/x", "201").count == 1
+    assert {labels[1] for labels in phases.collect()} == {"queue", "upstream", "serialize"}
+    assert phases.labels("/api/x", "upstream").sum >= 0.02
+
+
+def test_phase_is_noop_outside_middleware():
+    state = SimpleNamespace()
+    mark_handler_start(state)
+    with phase(state, "upstream"):
+        pass
+    assert timing_meta(state) == {}
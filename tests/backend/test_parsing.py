@@ -0,0 +1,37 @@
+from app.parsing import ParseStats, coerce_score, extract_json_object
+
+
+def test_extract_plain_object():
+    assert extract_json_object('{"score": 7}') == {"score": 7}
+
+
+def test_extract_from_fenced_block():
+    text = 'Ответ:\n```json\n{"score": 7, "feedback": "ok"}\n```'
+    assert extract_json_object(text) == {"score": 7, "feedback": "ok"}
+
+
+def test_extract_skips_prose_and_stray_braces():
+    text = 'Формат {вот такой}. Итог: {"score": 4, "feedback": "a}b"} спасибо'
+    assert extract_json_object(text) == {"score": 4, "feedback": "a}b"}
+
+
+def test_extract_returns_none_for_non_objects():
+    assert extract_json_object("[1, 2, 3]") is None
+    assert extract_json_object("оценка 7 из 10") is None
+    assert extract_json_object('{"score": 7') is None
+
+
+def test_coerce_score_variants():
+    assert coerce_score({"score": "8"})["score"] == 8
+    assert coerce_score({"score": "7/10"})["score"] == 7
+    assert coerce_score({"score": "6,5"})["score"] == 6
+    assert coerce_score({"score": 8.6})["score"] == 9
+    assert coerce_score({"score": "нет"})["score"] == "нет"
+
+
+def test_parse_stats_failure_rate():
+    stats = ParseStats()
+    assert stats.snapshot()["failure_rate"] == 0.0
+    stats.parsed = 3
+    stats.failed = 1
+    assert stats.snapshot()["failure_rate"] == 0.25
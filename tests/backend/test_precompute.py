@@ -0,0 +1,93 @@
+import asyncio
+
+from app.interview import InterviewCoachService
+from app.precompute import PrecomputedAnswers, precompute, question_key, task_version
+from app.questions import Question
+
+
+class CountingGenerator:
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+
+    async def __call__(self, question: str):
+        self.calls.append(question)
+        if question in self.fail_on:
+            raise RuntimeError("upstream down")
+        return f"ответ: {question}", {"model": "m"}
+
+
+QUESTIONS = [Question("a", "Python", 1, "Что такое GIL?"), Question("b", "Python", 2, "Что такое asyncio?")]
+
+
+def run(questions, answers, gen, version="v1", **kwargs):
+    return asyncio.run(precompute(questions, answers, {"hint": (gen, version)}, **kwargs))
+
+
+def test_question_key_ignores_whitespace_and_case():
+    assert question_key("Что такое  GIL?\n") == question_key("что такое gil?")
+    assert question_key("Что такое GIL?") != question_key("Что такое GC?")
+
+
+def test_task_version_changes_with_model_and_task():
+    assert task_version("hint", "t", "m1") == task_version("hint", "t", "m1")
+    assert task_version("hint", "t", "m1") != task_version("hint", "t", "m2")
+    assert task_version("hint", "t", "m1") != task_version("hint", "t2", "m1")
+
+
+def test_incremental_run_regenerates_only_new_and_changed(tmp_path):
+    answers = PrecomputedAnswers(str(tmp_path / "pre.db"))
+    gen = CountingGenerator()
+    assert run(QUESTIONS, answers, gen) == {"generated": 2, "skipped": 0, "failed": 0}
+    assert run(QUESTIONS, answers, gen) == {"generated": 0, "skipped": 2, "failed": 0}
+
+    changed = [QUESTIONS[0], Question("b", "Python", 2, "Что такое event loop?"), Question("c", "Java", 1, "JIT?")]
+    gen.calls.clear()
+    assert run(changed, answers, gen)["generated"] == 2
+    assert sorted(gen.calls) == ["JIT?", "Что такое event loop?"]
+
+    # новая версия промпта или модели — пересчитывается всё
+    assert run(changed, answers, gen, version="v2")["generated"] == 3
+    assert run(changed, answers, gen, version="v2", full=True)["generated"] == 3
+
+    assert answers.prune(question_key(q.text) for q in changed) == 1
+    assert len(answers) == 3
+
+
+def test_failed_generation_is_retried_next_run(tmp_path):
+    answers = PrecomputedAnswers(str(tmp_path / "pre.db"))
+    stats = run(QUESTIONS, answers, CountingGenerator(fail_on={"Что такое GIL?"}))
+    assert stats == {"generated": 1, "skipped": 0, "failed": 1}
+    assert answers.get("hint", "Что такое GIL?") is None
+    assert run(QUESTIONS, answers, CountingGenerator())["generated"] == 1
+
+
+class AsyncFakeLLM:
+    model = "live"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def agenerate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls += 1
+        return "живой ответ", {"model": self.model}
+
+
+def test_service_serves_bank_questions_from_precomputed(tmp_path):
+    answers = PrecomputedAnswers(str(tmp_path / "pre.db"))
+    run(QUESTIONS, answers, CountingGenerator())
+    llm = AsyncFakeLLM()
+    service = InterviewCoachService(llm=llm, precomputed=answers)
+
+    text, meta = asyncio.run(service.ahint(" что такое GIL? "))
+    assert text == "ответ: Что такое GIL?"
+    assert meta == {"model": "m", "question_id": "a", "source": "precomputed"}
+    assert llm.calls == 0
+
+    # свободный вопрос — живая генерация
+    text, _ = asyncio.run(service.ahint("Расскажи про Rust"))
+    assert text == "живой ответ"
+    # эталоны не считали — тоже вживую
+    asyncio.run(service.areference_answer("Что такое GIL?"))
+    assert llm.calls == 2
+    assert (answers.hits, answers.misses) == (1, 2)
@@ -0,0 +1,73 @@
+import pytest
+
+from app.prescore import Prescorer, stem, terms
+
+REFERENCE = (
+    "GIL — глобальная блокировка интерпретатора CPython: байткод в процессе исполняет один поток. "
+    "Мешает CPU-bound задачам в потоках; для них берут multiprocessing или расширения на C, "
+    "которые отпускают блокировку. Для I/O-bound потоки и asyncio работают нормально."
+)
+
+
+def test_terms_drop_stopwords_and_stem():
+    assert terms("Это потоки и потоков, 42") == ["поток", "поток"]
+    assert stem("gil") == "gil"
+
+
+@pytest.mark.parametrize("answer", ["", "   ", "...", "?!"])
+def test_empty_answer_is_final_zero(answer):
+    pre = Prescorer().score("Что такое GIL?", answer)
+    assert (pre.score, pre.final, pre.reason) == (0, True, "empty")
+    assert pre.feedback
+
+
+@pytest.mark.parametrize("answer", ["42", "O(1)", "Нет", "Да, можно"])
+def test_number_or_stopword_answer_is_not_empty(answer):
+    # terms() от них ничего не оставляет, но это ответ: балл ставит LLM
+    pre = Prescorer.fit([REFERENCE]).score("Что такое GIL?", answer, REFERENCE)
+    assert pre.reason != "empty"
+    assert pre.final is False
+
+
+@pytest.mark.parametrize("answer", ["не знаю", "Честно, без понятия", "хз, если честно"])
+def test_dont_know_is_final(answer):
+    pre = Prescorer().score("Что такое GIL?", answer)
+    assert (pre.score, pre.final, pre.reason) == (1, True, "dont_know")
+
+
+@pytest.mark.parametrize("answer", ["Потоки не знают о GIL", "Объекты, не знающие о GIL", "хзш"])
+def test_dont_know_needs_whole_words(answer):
+    # "не знают" — не "не знаю": короткий настоящий ответ не закрываем единицей без LLM
+    pre = Prescorer().score("Что такое GIL?", answer)
+    assert pre.reason != "dont_know"
+    assert pre.final is False
+
+
+def test_long_answer_mentioning_dont_know_goes_to_llm():
+    answer = "Не знаю точно, но думаю, что GIL это блокировка, которая мешает потокам исполнять байткод параллельно"
+    assert Prescorer().score("Что такое GIL?", answer).final is False
+
+
+def test_without_reference_falls_back_to_length_heuristic():
+    short = Prescorer().score("Что такое GIL?", "Блокировка интерпретатора")
+    longer = Prescorer().score("Что такое GIL?", "Блокировка интерпретатора, например мешает потокам. " * 3)
+    assert (short.score, short.reason) == (3, "heuristic")
+    assert longer.score > short.score
+    assert not short.final and short.coverage is None
+
+
+def test_coverage_of_reference_terms_ranks_answers():
+    scorer = Prescorer.fit([REFERENCE, "Список — изменяемый, кортеж — нет.", "Процесс и поток отличаются памятью."])
+    good = scorer.score(
+        "Что такое GIL?",
+        "Это блокировка интерпретатора CPython: байткод исполняет один поток, поэтому CPU-bound задачи "
+        "в потоках не ускоряются — берут multiprocessing; для I/O-bound потоки и asyncio подходят.",
+        REFERENCE,
+    )
+    off_topic = scorer.score(
+        "Что такое GIL?", "Это способ хранить данные в базе, чтобы запросы выполнялись быстрее и надёжнее.", REFERENCE
+    )
+    assert good.reason == off_topic.reason == "coverage"
+    assert good.coverage > off_topic.coverage
+    assert good.score > off_topic.score
+    assert 0 <= off_topic.score <= good.score <= 10
@@ -0,0 +1,35 @@
+import hashlib
+
+from app.prompts import PROMPT_VERSION, SYSTEM_PROMPT, normalize_track, system_prefix
+
+# Хэш префикса по умолчанию. Если тест упал — текст промпта изменился:
+# поднимите PROMPT_VERSION и обновите оба значения.
+EXPECTED = ("coach-v1", "9101c5160547a7748e4366ce301ca960255b21d4842bcb5d36054432a937f409")
+
+
+def digest(prefix):
+    return hashlib.sha256("\x00".join(prefix).encode("utf-8")).hexdigest()
+
+
+def test_default_prefix_is_pinned_to_version():
+    assert (PROMPT_VERSION, digest(system_prefix())) == EXPECTED
+
+
+def test_prefix_is_byte_stable_across_equivalent_meta():
+    a = system_prefix({"track": "python ", "level": "3", "client": "web"})
+    b = system_prefix({"track": "  PYTHON", "level": 3})
+
+    assert a == b
+    assert a[0] == SYSTEM_PROMPT
+    assert a[1] == "Направление собеседования: Python.\nУровень сложности вопросов: 3 из 5."
+
+
+def test_prefix_without_track_is_system_prompt_only():
+    assert system_prefix(None) == (SYSTEM_PROMPT,)
+    assert system_prefix({"session": "x"}) == (SYSTEM_PROMPT,)
+
+
+def test_normalize_track_clamps_and_ignores_garbage():
+    assert normalize_track({"level": 99}) == (None, 5)
+    assert normalize_track({"level": "hard"}) == (None, None)
+    assert normalize_track({"track": "x" * 100})[0] == "X" + "x" * 39
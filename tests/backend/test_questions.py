@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from app.questions import (
+    DEFAULT_BANK_PATH,
+    Question,
+    QuestionBank,
+    adapt_level,
+    load_questions,
+    parse_question,
+    record_score,
+)
+
+
+def make_bank(per_level: int = 4, levels=(1, 2, 3)) -> QuestionBank:
+    questions = [
+        Question(f"py-{level}-{i}", "Python", level, f"q{level}.{i}", tags=("gil",) if i == 0 else ())
+        for level in levels
+        for i in range(per_level)
+    ]
+    questions.append(Question(id="gen-1", track="Общее", level=1, text="общий"))
+    return QuestionBank(questions)
+
+
+def test_shipped_bank_loads_and_covers_tracks():
+    bank = QuestionBank(load_questions(DEFAULT_BANK_PATH))
+    assert len(bank) >= 40
+    assert {"python", "frontend", "system design", "общее"} <= set(bank.tracks)
+
+
+def test_parse_question_normalizes_fields():
+    q = parse_question({"text": "  Что такое GIL? ", "track": " python ", "level": 9, "tags": ["GIL", " ", "gil"]})
+    assert q.text == "Что такое GIL?"
+    assert q.level == 5
+    assert q.tags == ("gil",)
+    assert q.id == parse_question({"text": "Что такое GIL?", "track": "python"}).id
+
+
+def test_load_questions_accepts_plain_list(tmp_path):
+    path = tmp_path / "bank.json"
+    path.write_text(json.dumps([{"id": "a", "text": "x"}]), encoding="utf-8")
+    assert load_questions(str(path)) == [Question(id="a", track="Общее", level=1, text="x")]
+
+
+def test_duplicate_ids_are_rejected():
+    with pytest.raises(ValueError):
+        QuestionBank([Question("a", "Python", 1, "x"), Question("a", "Python", 2, "y")])
+
+
+def test_select_never_repeats_until_track_is_exhausted():
+    bank = make_bank()
+    state = {"level": 2}
+    picked = [bank.select(state, track="PYTHON").id for _ in range(12)]
+
+    assert len(set(picked)) == 12
+    # сначала весь текущий уровень, потом ближайшие
+    assert {qid.split("-")[1] for qid in picked[:4]} == {"2"}
+    assert state["track"] == "Python"
+    # трек пройден — второй круг без ошибок
+    assert bank.select(state).track == "Python"
+
+
+def test_sessions_get_different_orders():
+    bank = make_bank(per_level=20, levels=(1,))
+    orders = {tuple(bank.select(s, track="python").id for _ in range(5)) for s in ({"seed": 1}, {"seed": 2**20 + 7})}
+    assert len(orders) == 2
+
+
+def test_tag_filter_and_cross_bucket_dedupe():
+    bank = make_bank()
+    state = {"level": 1}
+    tagged = bank.select(state, track="python", tag="GIL")
+    assert tagged.id == "py-1-0"
+    rest = [bank.select(state, track="python").id for _ in range(3)]
+    assert "py-1-0" not in rest
+
+
+def test_unknown_track_falls_back_to_general():
+    assert make_bank().select({}, track="Cobol").id == "gen-1"
+
+
+@pytest.mark.parametrize(
+    "level,scores,expected",
+    [(2, [9, 8], 3), (2, [3, 4], 1), (2, [9], 2), (2, [6, 7], 2), (5, [10, 10], 5), (1, [0, 0], 1)],
+)
+def test_adapt_level(level, scores, expected):
+    assert adapt_level(level, scores) == expected
+
+
+def test_record_score_needs_fresh_series_after_level_change():
+    state = {"level": 2}
+    for score in (9, 9):
+        record_score(state, score)
+    assert state["level"] == 3
+    record_score(state, 9)
+    assert state["level"] == 3
+    record_score(state, 10)
+    assert state["level"] == 4
@@ -0,0 +1,208 @@
+import asyncio
+import multiprocessing
+
+import pytest
+
+import app.ratelimit as mod
+from app.ratelimit import (
+    AdmissionController,
+    InMemoryRateLimiter,
+    Limit,
+    Overloaded,
+    RateLimited,
+    SQLiteRateLimiter,
+)
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(mod.time, "monotonic", clock)
+    monkeypatch.setattr(mod.time, "time", clock)
+    return clock
+
+
+LIMIT = Limit(rate=1.0, burst=3)
+
+
+def test_per_minute_zero_disables_limit():
+    assert Limit.per_minute(0, 10) is None
+    assert Limit.per_minute(120, 10) == Limit(2.0, 10)
+
+
+@pytest.mark.parametrize("make", [lambda tmp: InMemoryRateLimiter(), lambda tmp: SQLiteRateLimiter(str(tmp / "rl.db"))])
+def test_bucket_allows_burst_then_refills(clock, tmp_path, make):
+    limiter = make(tmp_path)
+    checks = [("ip:1", LIMIT)]
+
+    assert [limiter.acquire(checks) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire(checks) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert limiter.acquire(checks) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.acquire(checks) == 0
+    assert limiter.acquire([("ip:2", LIMIT)]) == 0
+
+
+def test_all_buckets_are_charged_atomically(clock):
+    limiter = InMemoryRateLimiter()
+    session = Limit(rate=1.0, burst=1)
+
+    assert limiter.acquire([("ip:1", LIMIT), ("session:a", session)]) == 0
+    assert limiter.acquire([("ip:1", LIMIT), ("session:a", session)]) > 0
+    # отказ по сессии не должен был списать токен с ip
+    assert [limiter.acquire([("ip:1", LIMIT)]) for _ in range(2)] == [0, 0]
+    assert limiter.acquire([("ip:1", LIMIT)]) > 0
+
+
+def test_cost_above_burst_drains_bucket(clock):
+    limiter = InMemoryRateLimiter()
+
+    assert limiter.acquire([("ip:1", LIMIT)], cost=50) == 0
+    assert limiter.acquire([("ip:1", LIMIT)]) == pytest.approx(1.0)
+
+
+def test_check_raises_with_retry_after(clock):
+    limiter = InMemoryRateLimiter()
+    limiter.check([("ip:1", Limit(rate=0.5, burst=1))])
+
+    with pytest.raises(RateLimited) as exc:
+        limiter.check([("ip:1", Limit(rate=0.5, burst=1))])
+    assert exc.value.retry_after == pytest.approx(2.0)
+
+
+def _hammer(path: str, n: int, queue) -> None:
+    limiter = SQLiteRateLimiter(path)
+    granted = sum(limiter.acquire([("ip:shared", Limit(rate=0.001, burst=40))]) == 0 for _ in range(n))
+    queue.put(granted)
+
+
+def test_sqlite_limiter_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "rl.db")
+    SQLiteRateLimiter(path)
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_hammer, args=(path, 25, queue)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=30)
+
+    assert sum(queue.get(timeout=5) for _ in procs) == 40
+
+
+def test_admission_caps_in_flight_and_queues():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=2, max_queue=10, queue_timeout=1)
+        first = await admission.acquire()
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+        assert not waiter.done()
+
+        first.release()
+        first.release()
+        third = await waiter
+        return admission, third
+
+    admission, third = asyncio.run(scenario())
+    assert admission.total_in_flight == 2
+    assert admission.queued == 0
+    assert third.kind == "chat"
+
+
+def test_admission_rejects_fast_when_queue_is_full():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+        await admission.acquire()
+        queued = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+        queued.cancel()
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.rejected == 1
+
+
+def test_admission_queue_timeout():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, queue_timeout=0.01)
+        await admission.acquire()
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.queued == 0
+
+
+def test_evaluations_are_capped_by_share_and_chat_goes_first():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=4, shares={"evaluate": 0.5})
+        evals = [await admission.acquire("evaluate") for _ in range(2)]
+        blocked_eval = asyncio.create_task(admission.acquire("evaluate"))
+        chats = [await admission.acquire("chat") for _ in range(2)]
+        await asyncio.sleep(0)
+        assert not blocked_eval.done()
+
+        waiting_chat = asyncio.create_task(admission.acquire("chat"))
+        await asyncio.sleep(0)
+        evals[0].release()
+        await asyncio.sleep(0)
+        # освободившийся слот достаётся чату, хотя оценка ждала дольше
+        assert waiting_chat.done() and not blocked_eval.done()
+
+        chats[0].release()
+        await asyncio.sleep(0)
+        assert blocked_eval.done()
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.in_flight == {"chat": 2, "evaluate": 2}
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, queue_timeout=5)
+        held = await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        held.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.total_in_flight == 0
+
+
+def test_slot_granted_in_the_same_tick_as_timeout_is_kept():
+    async def scenario():
+        # queue_timeout=0: таймаут ставится в очередь loop сразу при входе в ожидание
+        admission = AdmissionController(max_in_flight=1, queue_timeout=0)
+        held = await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        # слот отдаётся ждущему раньше, чем сработает уже запланированный таймаут
+        held.release()
+        slot = await waiter
+        assert admission.total_in_flight == 1
+        slot.release()
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.total_in_flight == 0
+    assert admission.rejected == 0
@@ -0,0 +1,278 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import pytest
+
+from app.resilience import (
+    CircuitBreaker,
+    Resilience,
+    ResilientProvider,
+    UpstreamUnavailable,
+    is_retryable,
+    retry_after_seconds,
+)
+
+
+@dataclass
+class ChatMessage:
+    role: str
+    content: str
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int, headers: Dict[str, str] | None = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+class ScriptedUpstream:
+    # Каждый элемент сценария — исключение, число (задержка в секундах) или текст ответа.
+    model = "m"
+
+    def __init__(self, *script: Any):
+        self.script = list(script)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def agenerate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls += 1
+        step = self.script.pop(0) if self.script else "ok"
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, (int, float)):
+            try:
+                await asyncio.sleep(step)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return f"slow {self.calls}", {"model": self.model}
+        return step, {"model": self.model}
+
+    async def astream_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls += 1
+        step = self.script.pop(0) if self.script else "ok"
+        if isinstance(step, Exception):
+            raise step
+        for piece in step.split(" "):
+            yield piece, {}
+        yield "", {"model": self.model}
+
+
+def fast(**overrides) -> Resilience:
+    params = {"attempt_timeout": 1.0, "deadline": 5.0, "retries": 2, "base_delay": 0.001, "max_delay": 0.01}
+    return Resilience(**{**params, **overrides})
+
+
+MESSAGES = [ChatMessage(role="user", content="x")]
+
+
+def test_retryable_classification():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(RuntimeError("boom"))
+
+
+def test_retry_after_header_variants():
+    assert retry_after_seconds(StatusError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after_seconds(StatusError(429, {"retry-after-ms": "150"})) == 0.15
+    assert retry_after_seconds(StatusError(429)) is None
+    assert retry_after_seconds(RuntimeError("x")) is None
+
+
+def test_retries_transient_errors_then_succeeds():
+    upstream = ScriptedUpstream(StatusError(503), StatusError(429), "готово")
+    provider = ResilientProvider(upstream, fast())
+
+    text, meta = asyncio.run(provider.agenerate_text(MESSAGES))
+
+    assert text == "готово"
+    assert meta["attempts"] == 3
+    assert upstream.calls == 3
+
+
+def test_non_retryable_error_is_raised_immediately():
+    upstream = ScriptedUpstream(StatusError(400))
+    provider = ResilientProvider(upstream, fast())
+
+    with pytest.raises(StatusError):
+        asyncio.run(provider.agenerate_text(MESSAGES))
+    assert upstream.calls == 1
+
+
+def test_gives_up_after_retries():
+    upstream = ScriptedUpstream(StatusError(500), StatusError(500), StatusError(500), "поздно")
+    provider = ResilientProvider(upstream, fast(retries=2))
+
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(provider.agenerate_text(MESSAGES))
+    assert upstream.calls == 3
+
+
+def test_retry_after_longer_than_deadline_fails_fast():
+    upstream = ScriptedUpstream(StatusError(429, {"retry-after": "30"}), "ok")
+    provider = ResilientProvider(upstream, fast(deadline=1.0))
+
+    started = time.monotonic()
+    with pytest.raises(UpstreamUnavailable) as exc:
+        asyncio.run(provider.agenerate_text(MESSAGES))
+
+    assert time.monotonic() - started < 0.5
+    assert exc.value.retry_after == 30.0
+    assert upstream.calls == 1
+
+
+def test_backoff_honors_retry_after():
+    r = fast(max_delay=0.01)
+    assert r.backoff(0, StatusError(429, {"retry-after": "3"})) == 3.0
+    assert 0 <= r.backoff(5, StatusError(503)) <= 0.01
+
+
+def test_attempt_timeout_cancels_slow_call_and_retries():
+    upstream = ScriptedUpstream(10, "быстро")
+    provider = ResilientProvider(upstream, fast(attempt_timeout=0.05))
+
+    text, meta = asyncio.run(provider.agenerate_text(MESSAGES))
+
+    assert text == "быстро"
+    assert meta["attempts"] == 2
+    assert upstream.cancelled == 1
+
+
+def test_circuit_opens_per_model_and_rejects_without_calling_upstream():
+    resilience = fast(retries=0, failure_threshold=2, reset_seconds=60)
+    upstream = ScriptedUpstream(StatusError(502), StatusError(502))
+    provider = ResilientProvider(upstream, resilience)
+
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailable):
+            asyncio.run(provider.agenerate_text(MESSAGES))
+    assert resilience.breaker("m").state == "open"
+
+    with pytest.raises(UpstreamUnavailable) as exc:
+        asyncio.run(provider.agenerate_text(MESSAGES))
+    assert "circuit open" in str(exc.value)
+    assert exc.value.retry_after > 0
+    assert upstream.calls == 2
+
+    other = ScriptedUpstream("ok")
+    other.model = "other"
+    assert asyncio.run(ResilientProvider(other, resilience).agenerate_text(MESSAGES))[0] == "ok"
+
+
+def test_circuit_half_open_allows_single_probe(monkeypatch):
+    clock = {"now": 100.0}
+    monkeypatch.setattr(time, "monotonic", lambda: clock["now"])
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock["now"] += 10
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock["now"] += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_cancelled_half_open_probe_releases_breaker(monkeypatch):
+    clock = {"now": 100.0}
+    monkeypatch.setattr(time, "monotonic", lambda: clock["now"])
+    resilience = fast(retries=0, failure_threshold=1, reset_seconds=10)
+    breaker = resilience.breaker("m")
+    breaker.record_failure()
+    clock["now"] += 10
+    upstream = ScriptedUpstream(60, "ok")
+    provider = ResilientProvider(upstream, resilience)
+
+    async def cancel_probe() -> None:
+        task = asyncio.create_task(provider.agenerate_text(MESSAGES))
+        while upstream.calls == 0:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert upstream.cancelled == 1
+    # отменённая проба не вердикт: брейкер остаётся half-open и пускает следующую
+    assert breaker.state == "half_open"
+    assert asyncio.run(provider.agenerate_text(MESSAGES))[0] == "ok"
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    clock["now"] += 10
+
+    async def leave_stream() -> None:
+        stream = provider.astream_text(MESSAGES)
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(leave_stream())
+    assert breaker.allow()
+
+
+def test_hedges_after_p95_and_cancels_loser():
+    resilience = fast(hedge=True, hedge_min_samples=3)
+    for _ in range(3):
+        resilience.latency("m").add(0.02)
+    upstream = ScriptedUpstream(1.0, 0.01)
+    provider = ResilientProvider(upstream, resilience)
+
+    started = time.monotonic()
+    text, meta = asyncio.run(provider.agenerate_text(MESSAGES))
+
+    assert time.monotonic() - started < 0.5
+    assert text == "slow 2"
+    assert meta["hedged"] is True
+    assert upstream.calls == 2
+    assert upstream.cancelled == 1
+
+
+def test_no_hedge_without_enough_samples():
+    upstream = ScriptedUpstream(0.05)
+    provider = ResilientProvider(upstream, fast(hedge=True, hedge_min_samples=20))
+
+    _, meta = asyncio.run(provider.agenerate_text(MESSAGES))
+
+    assert meta["hedged"] is False
+    assert upstream.calls == 1
+
+
+def test_stream_retries_only_before_first_chunk():
+    upstream = ScriptedUpstream(StatusError(503), "при вет")
+    provider = ResilientProvider(upstream, fast())
+
+    async def collect():
+        return [item async for item in provider.astream_text(MESSAGES)]
+
+    items = asyncio.run(collect())
+
+    assert [d for d, _ in items if d] == ["при", "вет"]
+    assert items[-1][1]["attempts"] == 2
+    assert upstream.calls == 2
+
+
+def test_stream_does_not_feed_hedge_latency_window():
+    resilience = fast()
+    provider = ResilientProvider(ScriptedUpstream("при вет"), resilience)
+
+    async def collect():
+        return [item async for item in provider.astream_text(MESSAGES)]
+
+    asyncio.run(collect())
+
+    # TTFT стрима короче полного ответа и занизил бы задержку хеджа для agenerate_text
+    assert len(resilience.latency("m")) == 0
@@ -0,0 +1,136 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+
+from app.routing import LatencyHistogram, ModelStats, Route, RoutingProvider, parse_routes
+
+
+@dataclass
+class ChatMessage:
+    role: str
+    content: str
+
+
+class FakeModel:
+    def __init__(self, model: str, fail: bool = False, json_mode=None):
+        self.model = model
+        self.fail = fail
+        self.json_mode = json_mode
+        self.calls = 0
+
+    def generate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.model} down")
+        return f"от {self.model}", {"model": self.model}
+
+    async def agenerate_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        return self.generate_text(messages)
+
+    async def astream_text(self, messages, *, temperature=0.3, max_output_tokens=800, extra=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.model} down")
+        yield "от ", {}
+        yield self.model, {}
+        yield "", {"model": self.model}
+
+
+MESSAGES = [ChatMessage(role="user", content="x")]
+
+
+def make(routes, *models):
+    providers = {m.model: m for m in models}
+    return RoutingProvider(providers, routes, ModelStats())
+
+
+def test_histogram_quantiles_use_bucket_bounds():
+    h = LatencyHistogram(buckets=(0.1, 1.0, 10.0))
+    for _ in range(90):
+        h.observe(0.05)
+    for _ in range(10):
+        h.observe(5.0)
+
+    assert h.quantile(0.5) == 0.1
+    assert h.quantile(0.95) == 10.0
+    assert h.snapshot()["count"] == 100
+    assert LatencyHistogram().quantile(0.95) is None
+
+
+def test_parse_routes_defaults_and_overrides():
+    routes = parse_routes('{"hint": ["small", "big"], "reference": {"models": ["big"], "max_p95_ms": 9000}}', "base")
+
+    assert routes["chat"] == Route(["base"])
+    assert routes["evaluate"] == Route(["base"])
+    assert routes["hint"] == Route(["small", "big"])
+    assert routes["reference"] == Route(["big"], max_p95_ms=9000)
+
+    with pytest.raises(ValueError):
+        parse_routes('{"unknown": ["x"]}', "base")
+
+
+def test_for_action_picks_models_per_action():
+    small, big = FakeModel("small"), FakeModel("big", json_mode={"response_format": {"type": "json_object"}})
+    router = make({"chat": Route(["big"]), "hint": Route(["small", "big"])}, small, big)
+
+    assert router.generate_text(MESSAGES)[0] == "от big"
+    hint = router.for_action("hint")
+    text, meta = hint.generate_text(MESSAGES)
+
+    assert text == "от small"
+    assert meta == {"model": "small", "route": "hint", "fallbacks": 0}
+    assert hint.model == "small|big"
+    assert hint.json_mode is None
+    assert router.json_mode == {"response_format": {"type": "json_object"}}
+
+
+def test_falls_back_to_next_model_and_records_errors():
+    small, big = FakeModel("small", fail=True), FakeModel("big")
+    router = make({"chat": Route(["small", "big"])}, small, big)
+
+    text, meta = asyncio.run(router.agenerate_text(MESSAGES))
+
+    assert text == "от big"
+    assert meta["fallbacks"] == 1
+    snapshot = router.stats.snapshot()
+    assert snapshot["small"]["errors"] == 1
+    assert snapshot["big"]["count"] == 1
+
+
+def test_raises_last_error_when_all_models_fail():
+    router = make({"chat": Route(["a", "b"])}, FakeModel("a", fail=True), FakeModel("b", fail=True))
+
+    with pytest.raises(RuntimeError, match="b down"):
+        router.generate_text(MESSAGES)
+
+
+def test_slow_models_are_demoted_by_observed_p95():
+    small, big = FakeModel("small"), FakeModel("big")
+    router = make({"chat": Route(["small", "big"], max_p95_ms=1000)}, small, big)
+    assert router.candidates() == ["small", "big"]
+
+    for _ in range(20):
+        router.stats.histogram("small").observe(4.0)
+    router.stats.histogram("big").observe(0.2)
+
+    assert router.candidates() == ["big", "small"]
+    assert router.generate_text(MESSAGES)[0] == "от big"
+
+
+def test_stream_falls_back_before_first_chunk():
+    small, big = FakeModel("small", fail=True), FakeModel("big")
+    router = make({"chat": Route(["small", "big"])}, small, big)
+
+    async def collect():
+        return [item async for item in router.astream_text(MESSAGES)]
+
+    items = asyncio.run(collect())
+
+    assert "".join(d for d, _ in items) == "от big"
+    assert items[-1][1] == {"model": "big", "route": "chat", "fallbacks": 1}
+
+
+def test_unknown_model_in_route_is_rejected():
+    with pytest.raises(ValueError):
+        make({"chat": Route(["missing"])}, FakeModel("a"))
@@ -88,4 +88,17 @@ def test_evaluate_response_requires_strings():
         EvaluateResponse(score=5, feedback=123, improved_answer="i")
 
     with pytest.raises(ValidationError):
-        EvaluateResponse(score=5, feedback="f", improved_answer=123)
\ No newline at end of file
+        EvaluateResponse(score=5, feedback="f", improved_answer=123)
+
+def test_evaluate_batch_request_bounds():
+    from app.schemas import EvaluateBatchRequest
+
+    req = EvaluateBatchRequest(items=[{"question": "q", "answer": "a"}])
+    assert req.concurrency is None
+    assert req.items[0].question == "q"
+
+    with pytest.raises(ValidationError):
+        EvaluateBatchRequest(items=[])
+
+    with pytest.raises(ValidationError):
+        EvaluateBatchRequest(items=[{"question": "q", "answer": "a"}], concurrency=0)
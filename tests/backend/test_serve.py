@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+from app import serve
+
+
+def test_shared_env_only_for_several_workers():
+    assert serve.shared_env({}, 1) == {}
+    assert serve.shared_env({}, 4) == serve.SHARED_DEFAULTS
+
+
+def test_shared_env_keeps_explicit_settings(caplog):
+    env = {"STORE_BACKEND": "memory", "RESPONSE_CACHE_PATH": ""}
+    assert serve.shared_env(env, 2) == {"RATE_LIMIT_BACKEND": "sqlite"}
+    # память процесса при нескольких воркерах — ошибка конфигурации, о ней предупреждаем
+    assert "STORE_BACKEND=memory" in caplog.text
+
+
+def test_main_runs_uvicorn_with_shared_backends(monkeypatch):
+    import uvicorn
+
+    for key in serve.SHARED_DEFAULTS:
+        # setenv перед delenv — чтобы monkeypatch вернул окружение после main()
+        monkeypatch.setenv(key, "")
+        monkeypatch.delenv(key)
+    calls = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: calls.append((app, kwargs)))
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    monkeypatch.delenv("PRELOAD", raising=False)
+    monkeypatch.delenv("SERVER", raising=False)
+
+    serve.main(["--port", "9000", "--graceful-timeout", "5"])
+
+    assert calls == [
+        (
+            "app.main:app",
+            {"host": "0.0.0.0", "port": 9000, "workers": 3, "timeout_graceful_shutdown": 5, "log_level": "info"},
+        )
+    ]
+    assert os.environ["STORE_BACKEND"] == "sqlite"
+    assert os.environ["RATE_LIMIT_BACKEND"] == "sqlite"
+
+
+def test_gunicorn_options_and_missing_dependency(monkeypatch):
+    args = serve.argparse.Namespace(
+        host="127.0.0.1", port=8000, workers=4, preload=True, graceful_timeout=30, max_requests=1000, log_level="info"
+    )
+    options = serve.gunicorn_options(args)
+    assert options["bind"] == "127.0.0.1:8000"
+    assert options["preload_app"] is True
+    assert options["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert options["max_requests_jitter"] == 100
+
+    monkeypatch.setitem(sys.modules, "gunicorn.app.base", None)
+    with pytest.raises(RuntimeError, match="pip install gunicorn"):
+        serve.run_gunicorn(args)
+
+
+def test_preload_defaults_on_for_gunicorn_and_warns_under_uvicorn(monkeypatch, caplog):
+    import uvicorn
+
+    monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: None)
+    args = serve.argparse.Namespace(
+        host="127.0.0.1", port=8000, workers=1, preload=None, graceful_timeout=30, max_requests=0, log_level="info"
+    )
+    assert serve.gunicorn_options(args)["preload_app"] is True
+    serve.run_uvicorn(args)
+    assert "preload" not in caplog.text
+
+    args.preload = False
+    assert serve.gunicorn_options(args)["preload_app"] is False
+    # uvicorn preload не умеет — явный запрос не должен молча игнорироваться
+    args.preload = True
+    serve.run_uvicorn(args)
+    assert "preload needs --server gunicorn" in caplog.text
@@ -1,10 +1,14 @@
+import random
+import sys
+import threading
 import time
+from collections import Counter
 from dataclasses import dataclass
 from typing import List
 
 import pytest
 
-from app.store import InMemoryConversationStore
+from app.store import InMemoryConversationStore, ShardedConversationStore
 
 
 @dataclass
@@ -165,4 +169,329 @@ def test_gc_max_sessions_keeps_most_recent(monkeypatch):
     assert count_non_empty == 2
 
     assert store.get_messages(sid_c) == [ChatMessage(role="user", content="c")]
-    assert store.get_messages(sid_a) == []
\ No newline at end of file
+    assert store.get_messages(sid_a) == []
+
+def test_has_reports_known_sessions():
+    store = InMemoryConversationStore()
+    sid = store.get_or_create(None)
+    assert store.has(sid)
+    assert not store.has("sess_missing")
+    store.reset(sid)
+    assert not store.has(sid)
+
+
+def test_gc_max_sessions_evicts_least_recently_updated(monkeypatch):
+    store = InMemoryConversationStore(ttl_seconds=10_000, max_sessions=2)
+
+    now = {"t": 5000.0}
+
+    import app.store as mod
+    monkeypatch.setattr(mod.time, "time", lambda: now["t"])
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    sid_a = store.get_or_create(None)
+    now["t"] += 1
+    sid_b = store.get_or_create(None)
+
+    # A создан раньше, но обновлён позже B — вытесняться должен B
+    now["t"] += 1
+    store.append(sid_a, ChatMessage(role="user", content="a"))
+
+    now["t"] += 1
+    sid_c = store.get_or_create(None)
+    store.get_or_create(sid_c)
+
+    assert store.has(sid_a)
+    assert not store.has(sid_b)
+    assert store.has(sid_c)
+    assert len(store) == 2
+
+
+def test_gc_ttl_keeps_recently_touched_sessions(monkeypatch):
+    store = InMemoryConversationStore(ttl_seconds=10, max_sessions=100)
+
+    now = {"t": 6000.0}
+
+    import app.store as mod
+    monkeypatch.setattr(mod.time, "time", lambda: now["t"])
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    old = store.get_or_create(None)
+    fresh = store.get_or_create(None)
+
+    now["t"] += 8
+    store.set_messages(fresh, [ChatMessage(role="user", content="x")])
+
+    now["t"] += 8
+    assert not store.has(old)
+    assert store.get_messages(fresh) == [ChatMessage(role="user", content="x")]
+
+
+def make_sqlite_store(tmp_path, **kwargs):
+    from app.store import SQLiteConversationStore
+
+    return SQLiteConversationStore(str(tmp_path / "sessions.db"), **kwargs)
+
+
+def test_sqlite_store_roundtrip(tmp_path, monkeypatch):
+    import app.store as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    store = make_sqlite_store(tmp_path)
+    sid = store.get_or_create(None)
+    assert sid.startswith("sess_")
+    assert store.has(sid)
+    assert store.get_or_create(sid) == sid
+    assert store.get_messages(sid) == []
+
+    store.append(sid, ChatMessage(role="user", content="привет"))
+    store.extend(sid, [ChatMessage(role="assistant", content="a"), ChatMessage(role="user", content="b")])
+    assert store.get_messages(sid) == [
+        ChatMessage(role="user", content="привет"),
+        ChatMessage(role="assistant", content="a"),
+        ChatMessage(role="user", content="b"),
+    ]
+
+    store.set_messages(sid, [ChatMessage(role="user", content="x")])
+    assert store.get_messages(sid) == [ChatMessage(role="user", content="x")]
+
+    store.reset(sid)
+    assert not store.has(sid)
+    assert store.get_messages(sid) == []
+
+
+def test_sqlite_store_survives_reopen(tmp_path, monkeypatch):
+    import app.store as mod
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    store = make_sqlite_store(tmp_path)
+    sid = store.get_or_create(None)
+    store.append(sid, ChatMessage(role="user", content="сохранится"))
+    store.close()
+
+    reopened = make_sqlite_store(tmp_path)
+    assert reopened.get_messages(sid) == [ChatMessage(role="user", content="сохранится")]
+
+
+def test_sqlite_store_ttl_and_max_sessions(tmp_path, monkeypatch):
+    import app.store as mod
+    now = {"t": 7000.0}
+    monkeypatch.setattr(mod.time, "time", lambda: now["t"])
+    monkeypatch.setattr(mod, "ChatMessage", ChatMessage)
+
+    store = make_sqlite_store(tmp_path, ttl_seconds=10, max_sessions=2, gc_interval_seconds=0)
+
+    expired = store.get_or_create(None)
+    now["t"] += 20
+    sid_a = store.get_or_create(None)
+    now["t"] += 1
+    sid_b = store.get_or_create(None)
+    now["t"] += 1
+    store.append(sid_a, ChatMessage(role="user", content="a"))
+    now["t"] += 1
+    sid_c = store.get_or_create(None)
+    store.gc()
+
+    assert not store.has(expired)
+    assert not store.has(sid_b)
+    assert store.has(sid_a)
+    assert store.has(sid_c)
+    assert len(store) == 2
+
+
+def _append_from_other_process(path: str, sid: str) -> None:
+    from app.schemas import ChatMessage as Message
+    from app.store import SQLiteConversationStore
+
+    other = SQLiteConversationStore(path)
+    for i in range(20):
+        other.append(sid, Message(role="user", content=f"child {i}"))
+
+
+def test_sqlite_store_is_shared_between_processes(tmp_path):
+    import multiprocessing
+
+    from app.schemas import ChatMessage as Message
+
+    store = make_sqlite_store(tmp_path)
+    sid = store.get_or_create(None)
+
+    ctx = multiprocessing.get_context("spawn")
+    child = ctx.Process(target=_append_from_other_process, args=(store.path, sid))
+    child.start()
+    for i in range(20):
+        store.append(sid, Message(role="assistant", content=f"parent {i}"))
+    child.join(30)
+
+    assert child.exitcode == 0
+    contents = [m.content for m in store.get_messages(sid)]
+    assert len(contents) == 40
+    assert [c for c in contents if c.startswith("child")] == [f"child {i}" for i in range(20)]
+
+
+def test_build_store_from_env(tmp_path, monkeypatch):
+    from app.store import SQLiteConversationStore, build_store_from_env
+
+    monkeypatch.delenv("STORE_BACKEND", raising=False)
+    assert isinstance(build_store_from_env(), InMemoryConversationStore)
+    monkeypatch.setenv("STORE_MAX_BYTES", "1000000")
+    monkeypatch.setenv("SESSION_MAX_BYTES", "20000")
+    store = build_store_from_env()
+    assert (store.max_bytes, store.max_session_bytes) == (1_000_000, 20_000)
+
+    monkeypatch.setenv("STORE_BACKEND", "sqlite")
+    monkeypatch.setenv("STORE_PATH", str(tmp_path / "nested" / "s.db"))
+    assert isinstance(build_store_from_env(), SQLiteConversationStore)
+
+    monkeypatch.setenv("STORE_BACKEND", "sharded")
+    monkeypatch.setenv("STORE_SHARDS", "4")
+    assert isinstance(build_store_from_env(), ShardedConversationStore)
+
+    monkeypatch.setenv("STORE_BACKEND", "redis")
+    with pytest.raises(RuntimeError):
+        build_store_from_env()
+
+
+@pytest.mark.parametrize("backend", ["memory", "sharded", "sqlite"])
+def test_session_state_roundtrip_and_reset(tmp_path, backend):
+    if backend == "sqlite":
+        store = make_sqlite_store(tmp_path)
+    else:
+        store = InMemoryConversationStore() if backend == "memory" else ShardedConversationStore(shards=4)
+    sid = store.get_or_create(None)
+    assert store.get_state(sid) == {}
+
+    state = {"level": 2, "cursors": {"python|2": 1}}
+    store.set_state(sid, state)
+    state["cursors"]["python|2"] = 5
+    # стор хранит копию: правка снаружи не должна протекать внутрь
+    assert store.get_state(sid) == {"level": 2, "cursors": {"python|2": 1}}
+
+    store.reset(sid)
+    assert store.get_state(sid) == {}
+
+
+def test_sharded_store_routes_sessions_and_limits_size():
+    store = ShardedConversationStore(ttl_seconds=10_000, max_sessions=40, shards=4)
+    sids = [store.get_or_create(None) for _ in range(200)]
+
+    assert len(store) <= 40
+    assert store.evictions == 200 - len(store)
+    alive = [sid for sid in sids if store.has(sid)]
+    # новые сессии вытесняют старые в каждом шарде: последние созданные живы
+    assert sids[-1] in alive
+    assert store.get_or_create(alive[0]) == alive[0]
+
+    store.extend(alive[0], [ChatMessage(role="user", content="a"), ChatMessage(role="assistant", content="b")])
+    assert [m.content for m in store.get_messages(alive[0])] == ["a", "b"]
+    store.reset(alive[0])
+    assert not store.has(alive[0])
+
+
+def test_sharded_store_concurrent_turns_lose_nothing():
+    store = ShardedConversationStore(ttl_seconds=10_000, max_sessions=100_000, shards=8)
+    sids = [store.get_or_create(None) for _ in range(24)]
+    turns = Counter()
+    turns_lock = threading.Lock()
+    errors = []
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        try:
+            for i in range(300):
+                sid = rng.choice(sids)
+                turn = [ChatMessage(role="user", content=str(i)), ChatMessage(role="assistant", content="ok")]
+                store.extend(sid, turn)
+                store.set_state(sid, {"level": i % 5, "seen": list(range(i % 7))})
+                store.get_messages(sid)
+                store.get_state(sid)
+                # параллельно создаются новые сессии — шарды вытесняют и растут под нагрузкой
+                store.get_or_create(None)
+                with turns_lock:
+                    turns[sid] += 1
+        except Exception as e:  # pragma: no cover - сообщение для падения ниже
+            errors.append(e)
+
+    switch = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(switch)
+
+    assert errors == []
+    for sid in sids:
+        messages = store.get_messages(sid)
+        assert len(messages) == 2 * turns[sid]
+        # ход пишется одним extend: user и assistant не разрываются чужими сообщениями
+        assert all(
+            messages[i].role == "user" and messages[i + 1].role == "assistant" for i in range(0, len(messages), 2)
+        )
+    assert len(store) == 24 + 16 * 300
+
+
+def test_memory_store_accounts_bytes_and_trims_long_sessions():
+    from app.store import MESSAGE_OVERHEAD_BYTES, SESSION_OVERHEAD_BYTES
+
+    per_message = MESSAGE_OVERHEAD_BYTES + 100
+    store = InMemoryConversationStore(max_session_bytes=SESSION_OVERHEAD_BYTES + 5 * per_message)
+    sid = store.get_or_create(None)
+    assert store.nbytes == SESSION_OVERHEAD_BYTES
+
+    # кириллица: 50 символов — 100 байт UTF-8
+    store.extend(sid, [ChatMessage(role="user", content="ю" * 50) for _ in range(4)])
+    assert store.nbytes == SESSION_OVERHEAD_BYTES + 4 * per_message
+
+    store.extend(sid, [ChatMessage(role="assistant", content=f"{i:03d}" + "x" * 97) for i in range(3)])
+    messages = store.get_messages(sid)
+    # отрезаны два самых старых сообщения, порядок и содержимое остальных прежние
+    assert store.trimmed == 2
+    assert [m.role for m in messages] == ["user", "user", "assistant", "assistant", "assistant"]
+    assert messages[-1].content == "002" + "x" * 97
+    assert store.nbytes == SESSION_OVERHEAD_BYTES + 5 * per_message
+
+    store.set_state(sid, {"level": 2})
+    assert store.nbytes == SESSION_OVERHEAD_BYTES + 5 * per_message + len('{"level": 2}')
+    store.set_messages(sid, [ChatMessage(role="user", content="a")])
+    assert store.nbytes == SESSION_OVERHEAD_BYTES + MESSAGE_OVERHEAD_BYTES + 1 + len('{"level": 2}')
+
+    store.reset(sid)
+    assert store.nbytes == 0
+
+
+def test_memory_store_keeps_last_turn_of_oversized_session():
+    store = InMemoryConversationStore(max_session_bytes=1)
+    sid = store.get_or_create(None)
+    store.extend(sid, [ChatMessage(role="user", content="q" * 1000), ChatMessage(role="assistant", content="a")])
+    store.extend(sid, [ChatMessage(role="user", content="q2"), ChatMessage(role="assistant", content="a2")])
+
+    assert [m.content for m in store.get_messages(sid)] == ["q2", "a2"]
+    assert store.trimmed == 2
+
+
+def test_memory_store_evicts_least_recent_sessions_over_byte_budget():
+    from app.store import MESSAGE_OVERHEAD_BYTES, SESSION_OVERHEAD_BYTES
+
+    session = SESSION_OVERHEAD_BYTES + MESSAGE_OVERHEAD_BYTES + 1000
+    store = InMemoryConversationStore(max_bytes=3 * session)
+    sids = [store.get_or_create(None) for _ in range(3)]
+    for sid in sids:
+        store.append(sid, ChatMessage(role="user", content="x" * 1000))
+    assert store.nbytes == 3 * session
+    assert store.evictions == 0
+
+    # свежая запись в первую сессию делает самой давней вторую
+    store.append(sids[0], ChatMessage(role="assistant", content="ok"))
+    assert not store.has(sids[1])
+    assert store.has(sids[0]) and store.has(sids[2])
+    assert store.evictions == 1
+    assert store.nbytes <= 3 * session
+
+    other = ShardedConversationStore(max_bytes=4 * session, shards=2)
+    sid = other.get_or_create(None)
+    other.append(sid, ChatMessage(role="user", content="x" * 1000))
+    assert other.nbytes == session
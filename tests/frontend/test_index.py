@@ -32,6 +32,7 @@ def test_index_html_has_localstorage_keys():
     html = read_index_html()
     assert 'LS_KEY = "interview_coach_chat_v1"' in html
     assert 'LS_DEMO = "interview_coach_demo_v1"' in html
+    assert 'LS_SESSION = "interview_coach_session_v1"' in html
 
 
 def test_index_html_calls_backend_endpoint():
@@ -45,7 +46,8 @@ def test_index_html_payload_contains_mode_and_messages():
     html = read_index_html()
     assert 'mode: "interview_coach"' in html
     assert "messages:" in html
-    assert "role:\"system\"" in html or 'role:"system"' in html
+    assert "session_id: sessionId" in html
+    assert "transcript.slice(-1)" in html
 
 
 def test_index_html_has_demo_mode_toggle():
@@ -84,4 +86,67 @@ def test_index_html_has_expected_quick_actions_texts():
 def test_index_html_has_single_api_chat_path_occurrence_in_fetch():
     html = read_index_html()
     count = len(re.findall(r'fetch\("/api/chat"', html))
-    assert count >= 1
\ No newline at end of file
+    assert count >= 1
+
+def test_index_html_streams_backend_replies():
+    html = read_index_html()
+    assert 'fetch("/api/chat/stream"' in html
+    assert "getReader()" in html
+    assert "function patchBubble" in html
+    assert "console.debug" not in html
+    assert "client_ttft_ms" in html
+
+
+def test_index_html_starts_with_bank_question_in_backend_mode():
+    html = read_index_html()
+    assert 'fetch("/api/question"' in html
+    assert "askBankQuestion()" in html
+
+
+def read_web_file(name: str) -> str:
+    root = Path(__file__).resolve().parents[2]
+    return (root / "web" / name).read_text(encoding="utf-8")
+
+
+def test_index_html_renders_incrementally():
+    html = read_index_html()
+    assert '<script src="chat-view.js"></script>' in html
+    assert "createChatView(elChat)" in html
+    assert "chatView.update(visible, scrollToBottom)" in html
+    # лента больше не пересобирается целиком
+    assert 'elChat.innerHTML = ""' not in html
+
+
+def test_chat_view_is_keyed_and_windowed():
+    js = read_web_file("chat-view.js")
+    assert "function createChatView" in js
+    assert "new WeakMap()" in js
+    assert "windowThreshold" in js
+    assert "appendData" in js
+    assert "global.createChatView = createChatView" in js
+
+
+def test_bench_page_measures_renderers():
+    html = read_web_file("bench.html")
+    assert '<script src="chat-view.js"></script>' in html
+    assert "1000,10000" in html
+    assert "requestAnimationFrame" in html
+    assert "function legacyView" in html
+
+
+def test_index_html_persists_chat_incrementally():
+    html = read_index_html()
+    assert '<script src="chat-store.js"></script>' in html
+    assert "chatStore.sync(messages)" in html
+    assert "chatStore.tail(TAIL_MESSAGES)" in html
+    assert "chatStore.before(messages[0], PAGE_MESSAGES)" in html
+    # весь массив больше не сериализуется на каждое изменение
+    assert "JSON.stringify(messages)" not in html
+
+
+def test_chat_store_uses_indexeddb_with_localstorage_fallback():
+    js = read_web_file("chat-store.js")
+    assert "indexedDB.open(dbName, 1)" in js
+    assert "class LocalStorageBackend" in js
+    assert "setTimeout(() => this.flush(), this.debounceMs)" in js
+    assert "global.openChatStore = openChatStore" in js
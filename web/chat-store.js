@@ -0,0 +1,268 @@
+// Клиентское хранилище истории чата: сообщения пишутся по одному под
+// возрастающим seq (IndexedDB, без него — чанками по CHUNK в localStorage).
+// sync() только помечает новые и изменившиеся сообщения, запись — одной
+// транзакцией раз в debounceMs. При старте читается хвост, старые сообщения
+// подгружаются страницами через before().
+(function(global){
+  const TYPING = "__TYPING__";
+  // стрим дописывает последний ответ уже после сохранения — столько
+  // последних сохранённых сообщений sync() перепроверяет на изменения
+  const RECHECK = 4;
+  const CHUNK = 50;
+
+  function request(req){
+    return new Promise((resolve, reject) => {
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+
+  function done(tx){
+    return new Promise((resolve, reject) => {
+      tx.oncomplete = () => resolve();
+      tx.onerror = tx.onabort = () => reject(tx.error);
+    });
+  }
+
+  function toRecord(seq, m){
+    const rec = { seq, role: m.role, content: m.content };
+    if (m.meta !== undefined) rec.meta = m.meta;
+    return rec;
+  }
+
+  class IndexedDBBackend {
+    constructor(db){
+      this.db = db;
+      this.name = "indexeddb";
+    }
+
+    static async open(dbName){
+      const req = indexedDB.open(dbName, 1);
+      req.onupgradeneeded = () => req.result.createObjectStore("messages", { keyPath: "seq" });
+      return new IndexedDBBackend(await request(req));
+    }
+
+    async lastSeq(){
+      const cursor = await request(this.db.transaction("messages").objectStore("messages").openCursor(null, "prev"));
+      return cursor ? cursor.key : -1;
+    }
+
+    // последние limit записей с seq < below (below = null — с самого конца), по возрастанию
+    async page(below, limit){
+      const range = below === null ? null : IDBKeyRange.upperBound(below, true);
+      const req = this.db.transaction("messages").objectStore("messages").openCursor(range, "prev");
+      const out = [];
+      await new Promise((resolve, reject) => {
+        req.onerror = () => reject(req.error);
+        req.onsuccess = () => {
+          const cursor = req.result;
+          if (!cursor || out.length >= limit) return resolve();
+          out.push(cursor.value);
+          cursor.continue();
+        };
+      });
+      return out.reverse();
+    }
+
+    async write(records){
+      const tx = this.db.transaction("messages", "readwrite");
+      const store = tx.objectStore("messages");
+      for (const rec of records) store.put(rec);
+      await done(tx);
+    }
+
+    async clear(){
+      const tx = this.db.transaction("messages", "readwrite");
+      tx.objectStore("messages").clear();
+      await done(tx);
+    }
+  }
+
+  class LocalStorageBackend {
+    // prefix:meta -> {first, next} — номера первого и следующего чанка;
+    // prefix:<n> -> массив записей с seq от n*CHUNK до (n+1)*CHUNK-1
+    constructor(prefix){
+      this.prefix = prefix;
+      this.name = "localStorage";
+    }
+
+    meta(){
+      try{
+        return JSON.parse(localStorage.getItem(this.prefix + ":meta")) || { first: 0, next: 0 };
+      } catch {
+        return { first: 0, next: 0 };
+      }
+    }
+
+    chunk(n){
+      try{
+        return JSON.parse(localStorage.getItem(this.prefix + ":" + n)) || [];
+      } catch {
+        return [];
+      }
+    }
+
+    async lastSeq(){
+      const { first, next } = this.meta();
+      for (let n = next - 1; n >= first; n--){
+        const chunk = this.chunk(n);
+        if (chunk.length) return chunk[chunk.length - 1].seq;
+      }
+      return -1;
+    }
+
+    async page(below, limit){
+      const { first, next } = this.meta();
+      let out = [];
+      for (let n = below === null ? next - 1 : Math.floor(below / CHUNK); n >= first && out.length < limit; n--){
+        const chunk = this.chunk(n).filter(rec => below === null || rec.seq < below);
+        out = chunk.concat(out);
+      }
+      return out.slice(-limit);
+    }
+
+    async write(records){
+      const byChunk = new Map();
+      for (const rec of records){
+        const n = Math.floor(rec.seq / CHUNK);
+        if (!byChunk.has(n)) byChunk.set(n, []);
+        byChunk.get(n).push(rec);
+      }
+      const meta = this.meta();
+      // после clear() seq продолжаются — начинаем отсчёт чанков с первого записанного
+      if (meta.next === 0) meta.first = Math.min(...byChunk.keys());
+      for (const [n, recs] of byChunk){
+        const merged = new Map(this.chunk(n).map(rec => [rec.seq, rec]));
+        for (const rec of recs) merged.set(rec.seq, rec);
+        const value = JSON.stringify([...merged.values()].sort((a, b) => a.seq - b.seq));
+        meta.next = Math.max(meta.next, n + 1);
+        this.setWithEviction(this.prefix + ":" + n, value, meta, n);
+      }
+      localStorage.setItem(this.prefix + ":meta", JSON.stringify(meta));
+    }
+
+    // квота кончилась — выбрасываем самые старые чанки, а не новые сообщения
+    setWithEviction(key, value, meta, current){
+      while (true){
+        try{
+          localStorage.setItem(key, value);
+          return;
+        } catch (err){
+          if (meta.first >= current) throw err;
+          localStorage.removeItem(this.prefix + ":" + meta.first);
+          meta.first++;
+        }
+      }
+    }
+
+    async clear(){
+      const { first, next } = this.meta();
+      for (let n = first; n < next; n++) localStorage.removeItem(this.prefix + ":" + n);
+      localStorage.removeItem(this.prefix + ":meta");
+    }
+  }
+
+  class ChatStore {
+    constructor(backend, nextSeq, debounceMs){
+      this.backend = backend;
+      this.debounceMs = debounceMs;
+      this.nextSeq = nextSeq;
+      this.seqs = new WeakMap();     // сообщение -> seq
+      this.written = new WeakMap();  // сообщение -> подпись последней записи
+      this.dirty = new Set();
+      this.timer = null;
+      // операции с бэкендом строго по очереди: clear() не обгонит запись и наоборот
+      this.queue = Promise.resolve();
+    }
+
+    enqueue(op){
+      const run = this.queue.then(op);
+      this.queue = run.catch(err => console.warn("chat store:", err));
+      return run;
+    }
+
+    signature(m){
+      return m.content + "\u0000" + JSON.stringify(m.meta ?? null);
+    }
+
+    adopt(records){
+      return records.map(rec => {
+        const m = { role: rec.role, content: rec.content };
+        if (rec.meta !== undefined) m.meta = rec.meta;
+        this.seqs.set(m, rec.seq);
+        this.written.set(m, this.signature(m));
+        return m;
+      });
+    }
+
+    tail(limit){
+      return this.enqueue(async () => this.adopt(await this.backend.page(null, limit)));
+    }
+
+    // страница сообщений старше m; [] — если m не из хранилища или старше ничего нет
+    before(m, limit){
+      const seq = this.seqs.get(m);
+      if (seq === undefined || seq === 0) return Promise.resolve([]);
+      return this.enqueue(async () => this.adopt(await this.backend.page(seq, limit)));
+    }
+
+    // O(новые + RECHECK), а не O(вся история): messages только дописываются в конец
+    sync(messages){
+      let i = messages.length;
+      while (i > 0 && !this.seqs.has(messages[i - 1])) i--;
+      for (let j = i; j < messages.length; j++){
+        const m = messages[j];
+        if (m.content === TYPING) continue;
+        this.seqs.set(m, this.nextSeq++);
+        this.dirty.add(m);
+      }
+      for (let j = Math.max(0, i - RECHECK); j < i; j++){
+        const m = messages[j];
+        if (this.written.get(m) !== this.signature(m)) this.dirty.add(m);
+      }
+      if (this.dirty.size && this.timer === null){
+        this.timer = setTimeout(() => this.flush(), this.debounceMs);
+      }
+    }
+
+    flush(){
+      clearTimeout(this.timer);
+      this.timer = null;
+      if (!this.dirty.size) return this.queue;
+      const batch = [...this.dirty];
+      this.dirty.clear();
+      const records = batch.map(m => toRecord(this.seqs.get(m), m));
+      for (const m of batch) this.written.set(m, this.signature(m));
+      return this.enqueue(() => this.backend.write(records));
+    }
+
+    clear(){
+      clearTimeout(this.timer);
+      this.timer = null;
+      this.dirty.clear();
+      return this.enqueue(() => this.backend.clear());
+    }
+  }
+
+  async function openChatStore({ dbName, lsPrefix, debounceMs = 300 }){
+    let backend = null;
+    if (typeof indexedDB !== "undefined"){
+      try{
+        backend = await IndexedDBBackend.open(dbName);
+      } catch (err){
+        // приватный режим Firefox, запрет в настройках и т.п.
+        console.warn("IndexedDB unavailable, falling back to localStorage:", err);
+      }
+    }
+    backend = backend || new LocalStorageBackend(lsPrefix);
+    const store = new ChatStore(backend, (await backend.lastSeq()) + 1, debounceMs);
+    // вкладку закрывают или прячут — дописываем накопленное сразу
+    addEventListener("pagehide", () => store.flush());
+    document.addEventListener("visibilitychange", () => {
+      if (document.visibilityState === "hidden") store.flush();
+    });
+    return store;
+  }
+
+  global.openChatStore = openChatStore;
+})(window);
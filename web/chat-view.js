@@ -0,0 +1,199 @@
+// Лента сообщений с инкрементальным рендером.
+// Строка сообщения создаётся один раз (ключ — сам объект сообщения) и дальше
+// только патчится: новое сообщение — одна вставка, токен стрима — дописывание
+// в текстовый узел. Когда сообщений больше windowThreshold, в DOM остаётся
+// только окно вокруг видимой области, остальное заменяют две распорки
+// с измеренной (или средней) высотой строк.
+(function(global){
+  const TYPING = "__TYPING__";
+
+  function createChatView(el, opts = {}){
+    const windowThreshold = opts.windowThreshold ?? 300;
+    // сколько строк держим сверх видимых сверху и снизу
+    const overscan = opts.overscan ?? 15;
+    const estimateHeight = opts.estimateHeight ?? 90;
+
+    const rows = new WeakMap();     // сообщение -> строка
+    const painted = new WeakMap();  // сообщение -> {content, score, text} последней отрисовки
+    const heights = new WeakMap();  // сообщение -> измеренная высота строки
+    let measuredSum = 0;
+    let measuredCount = 0;
+    let list = [];
+    let frame = 0;
+
+    const top = spacer();
+    const bottom = spacer();
+    el.replaceChildren(top, bottom);
+
+    el.addEventListener("scroll", () => {
+      if (!windowed() || frame) return;
+      frame = requestAnimationFrame(() => {
+        frame = 0;
+        reconcile(false);
+      });
+    }, { passive:true });
+
+    function spacer(){
+      const d = document.createElement("div");
+      d.setAttribute("aria-hidden", "true");
+      return d;
+    }
+
+    function windowed(){
+      return list.length > windowThreshold;
+    }
+
+    function heightOf(m){
+      return heights.get(m) ?? (measuredCount ? measuredSum / measuredCount : estimateHeight);
+    }
+
+    function nearBottom(){
+      return el.scrollHeight - el.scrollTop - el.clientHeight < 80;
+    }
+
+    function range(stick){
+      if (!windowed()) return [0, list.length];
+      const view = el.clientHeight || 800;
+      if (stick){
+        let h = 0;
+        let i = list.length;
+        while (i > 0 && h < view) h += heightOf(list[--i]);
+        return [Math.max(0, i - overscan), list.length];
+      }
+      // O(n) по массиву высот, без DOM: для 10k сообщений — доли миллисекунды
+      const from = el.scrollTop;
+      let y = 0;
+      let start = 0;
+      while (start < list.length && y + heightOf(list[start]) < from) y += heightOf(list[start++]);
+      let end = start;
+      while (end < list.length && y < from + view) y += heightOf(list[end++]);
+      return [Math.max(0, start - overscan), Math.min(list.length, end + overscan)];
+    }
+
+    function createRow(m){
+      const row = document.createElement("div");
+      row.className = "msg";
+
+      const avatar = document.createElement("div");
+      avatar.className = "avatar " + (m.role === "user" ? "user" : "ai");
+      avatar.textContent = m.role === "user" ? "🧑" : "🤖";
+
+      const bubble = document.createElement("div");
+      bubble.className = "bubble " + (m.role === "user" ? "user" : "ai");
+
+      row.appendChild(avatar);
+      row.appendChild(bubble);
+      rows.set(m, row);
+      return row;
+    }
+
+    function scoreOf(m){
+      return m.role === "assistant" && m.meta && typeof m.meta.score === "number" ? m.meta.score : null;
+    }
+
+    // -> true, если строка изменилась и её высоту надо перемерить
+    function paint(m, row){
+      const prev = painted.get(m);
+      const score = scoreOf(m);
+      if (prev && prev.content === m.content && prev.score === score) return false;
+      const bubble = row.lastChild;
+
+      if (m.content === TYPING){
+        bubble.innerHTML = `<span class="typing"><span class="dot"></span><span class="dot"></span><span class="dot"></span></span>`;
+        painted.set(m, { content:m.content, score, text:null });
+        return true;
+      }
+
+      let text = prev && prev.text;
+      if (text && prev.score === score && m.content.startsWith(prev.content)){
+        // стрим: дописываем только новый кусок
+        text.appendData(m.content.slice(prev.content.length));
+      } else {
+        text = document.createTextNode(m.content);
+        bubble.replaceChildren(text);
+        if (score !== null) bubble.appendChild(scoreBadges(score));
+      }
+      painted.set(m, { content:m.content, score, text });
+      return true;
+    }
+
+    function scoreBadges(s){
+      const meta = document.createElement("div");
+      meta.className = "meta";
+
+      const badge = document.createElement("span");
+      badge.className = "badge score " + (s <= 4 ? "low" : "");
+      badge.textContent = "score: " + s + "/10";
+
+      const hint = document.createElement("span");
+      hint.className = "badge";
+      hint.textContent = "feedback";
+
+      meta.appendChild(badge);
+      meta.appendChild(hint);
+      return meta;
+    }
+
+    function measure(dirty){
+      // все чтения после всех записей — один пересчёт layout на проход
+      for (const m of dirty){
+        const h = rows.get(m).offsetHeight;
+        const old = heights.get(m);
+        if (old === undefined) measuredCount++;
+        else measuredSum -= old;
+        measuredSum += h;
+        heights.set(m, h);
+      }
+    }
+
+    function reconcile(stick){
+      const [start, end] = range(stick);
+      const dirty = [];
+      let cursor = top.nextSibling;
+      for (let i = start; i < end; i++){
+        const m = list[i];
+        const row = rows.get(m) || createRow(m);
+        if (paint(m, row) || (windowed() && !heights.has(m))) dirty.push(m);
+        if (row === cursor) cursor = cursor.nextSibling;
+        else el.insertBefore(row, cursor);
+      }
+      while (cursor !== bottom){
+        const next = cursor.nextSibling;
+        cursor.remove();
+        cursor = next;
+      }
+      if (windowed()) measure(dirty);
+
+      let above = 0;
+      let below = 0;
+      if (windowed()){
+        for (let i = 0; i < start; i++) above += heightOf(list[i]);
+        for (let i = end; i < list.length; i++) below += heightOf(list[i]);
+      }
+      top.style.height = above + "px";
+      bottom.style.height = below + "px";
+    }
+
+    return {
+      // messages — уже отфильтрованный список; сравнение по ссылкам на объекты
+      update(messages, scrollToBottom = false){
+        const stick = scrollToBottom || nearBottom();
+        list = messages;
+        reconcile(stick);
+        if (stick) el.scrollTop = el.scrollHeight;
+      },
+      // точечное обновление одного сообщения (токены стрима); false — строки нет в DOM
+      patch(m){
+        const row = rows.get(m);
+        if (!row || !row.isConnected) return false;
+        if (paint(m, row) && windowed()) measure([m]);
+        return true;
+      },
+      get rendered(){
+        return el.childElementCount - 2;
+      },
+    };
+  }
+
+  global.createChatView = createChatView;
+})(window);